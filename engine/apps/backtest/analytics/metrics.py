@@ -1,9 +1,69 @@
-from copy import deepcopy
-from numpy import array, asarray, mean, nan, percentile, sqrt, std
-from polars import col, DataFrame, Datetime, lit, when
-from sklearn.linear_model import LinearRegression
+from numpy import (
+    append,
+    argsort,
+    array,
+    corrcoef,
+    float64,
+    fromiter,
+    full,
+    int64,
+    isnan,
+    maximum,
+    mean,
+    nan,
+    nanmin,
+    ndarray,
+    percentile,
+    sqrt,
+    std,
+)
+from polars import col, DataFrame, Float64, lit, String, when
 from utils.logger.logger import LoggerWrapper, log_execution
 
+DAY_MS = 24 * 60 * 60 * 1000
+YEAR_MS = 365 * DAY_MS
+
+
+def get_sorted_history(history: dict) -> tuple[ndarray, ndarray]:
+    """
+    :param history: {timestamp: value}, e.g. one series of Portfolio.equity_history
+    :type history: dict
+    :returns: (timestamps, values) as arrays sorted by timestamp
+    """
+    timestamps = fromiter(history.keys(), dtype=int64, count=len(history))
+    values = fromiter(history.values(), dtype=float64, count=len(history))
+    order = argsort(timestamps, kind="stable")
+    return timestamps[order], values[order]
+
+
+def get_drawdowns(values: ndarray) -> tuple[ndarray, ndarray]:
+    """
+    :returns: (drawdown in $, drawdown in %) against the running max
+    """
+    running_max = maximum.accumulate(values)
+    drawdown = values - running_max
+    return drawdown, drawdown / running_max * 100
+
+
+def get_last_per_period(periods: ndarray, values: ndarray) -> ndarray:
+    """
+    Last value of every period, periods sorted, e.g. day numbers of sorted
+    timestamps
+    """
+    return values[append(periods[1:] != periods[:-1], True)]
+
+
+def get_r_squared(x: ndarray, y: ndarray) -> float:
+    """
+    R² of the least squares line of y on x, the squared correlation. Constant y
+    is fitted perfectly, constant x explains nothing.
+    """
+    if y.min() == y.max():
+        return 1.0
+    if x.min() == x.max():
+        return 0.0
+    return float(corrcoef(x.astype(float64), y)[0, 1] ** 2)
+
 
 class MetricsGenerator:
     def __init__(
@@ -18,109 +78,121 @@ class MetricsGenerator:
         self.logger = LoggerWrapper(name="Metrics Generator Module", level=log_level)
 
         self.equity_history = equity_history
-        self.equity_history_copy = deepcopy(self.equity_history)
+        self.symbols = [symbol for symbol in equity_history if symbol != "General"]
         self.general_equity_history = self.equity_history["General"]
         self.trade_history = trade_history
         self.order_history = order_history
         self.current_positions = current_positions
         self.initial_balance = initial_balance
         self.final_balance = self.general_equity_history[
-            list(self.general_equity_history.keys())[-1]
+            next(reversed(self.general_equity_history))
         ]
+        self.equity_curve = None
 
     @log_execution
     def generate_symbolwise_metrics(self):
-        metrics = {}
-
-        self.equity_history_copy.pop("General", None)
-        for symbol, _ in self.equity_history_copy.items():
-            symbol_metrics = {}
-
-            total_trades = self._get_total_trades(symbol=symbol)
-            symbol_metrics.update({"Total trades": total_trades})
-
-            win_rate = self._get_winrate(symbol=symbol, total_trades=total_trades)
-            symbol_metrics.update({"Win Rate (%)": win_rate})
-
-            total_pnl = self._get_symbol_pnl(symbol=symbol)
-            symbol_metrics.update({"Total PnL": total_pnl})
-
-            gross_profit, gross_loss = self._get_gross_profit_loss(symbol=symbol)
-            symbol_metrics.update({"Gross Profit": gross_profit})
-            symbol_metrics.update({"Gross Loss": gross_loss})
-
-            profit_factor = self._get_profit_factor(
-                gross_profit=gross_profit, gross_loss=gross_loss
-            )
-            symbol_metrics.update({"Profit Factor": profit_factor})
-
-            max_drawdown_pct, max_drawdown = self._get_symbol_max_drawdown(
-                symbol=symbol
-            )
-            symbol_metrics.update({"Max Drawdown (%)": max_drawdown_pct})
-            symbol_metrics.update({"Max Drawdown ($)": max_drawdown})
-
-            average_trade_return = self._get_average_trade_return(symbol=symbol)
-            symbol_metrics.update({"Average Trade Return (%)": average_trade_return})
-
-            commissions = self.trade_history.filter(col("symbol") == symbol)[
-                "commissions"
-            ].sum()
-            symbol_metrics.update({"Commission Cost": commissions})
+        """
+        Metrics of every symbol from one group_by over the closed trades, one over
+        the open positions and one partitioned drawdown pass over the symbol PnL
+        histories
+
+        :returns: {symbol: {metric: value}}, symbols in equity history order
+        """
+        table = (
+            DataFrame({"symbol": self.symbols}, schema={"symbol": String})
+            .join(self._get_closed_trade_stats(), on="symbol", how="left")
+            .join(self._get_open_position_stats(), on="symbol", how="left")
+            .join(self._get_symbol_max_drawdowns(), on="symbol", how="left")
+        )
 
-            metrics.update({symbol: symbol_metrics})
+        metrics = {}
+        for row in table.iter_rows(named=True):
+            total_trades = (row["closed_trades"] or 0) + (row["open_trades"] or 0)
+            gross_profit = (row["closed_profit"] or 0) + (row["open_profit"] or 0)
+            gross_loss = (row["closed_loss"] or 0) + (row["open_loss"] or 0)
+            commissions = row["commissions"] or 0
+            average_trade_return = row["average_return"]
+
+            metrics[row["symbol"]] = {
+                "Total trades": total_trades,
+                "Win Rate (%)": (
+                    (row["wins"] or 0) / total_trades * 100 if total_trades else nan
+                ),
+                "Total PnL": (row["pnl"] or 0)
+                + (row["realized_pnl"] or 0)
+                + (row["unrealized_pnl"] or 0)
+                - commissions,
+                "Gross Profit": gross_profit,
+                "Gross Loss": gross_loss,
+                "Profit Factor": self._get_profit_factor(
+                    gross_profit=gross_profit, gross_loss=gross_loss
+                ),
+                "Max Drawdown (%)": row["max_drawdown_pct"],
+                "Max Drawdown ($)": row["max_drawdown_dollar"],
+                "Average Trade Return (%)": (
+                    nan if average_trade_return is None else average_trade_return
+                ),
+                "Commission Cost": commissions,
+            }
 
         return metrics
 
-    def _get_average_trade_return(self, symbol):
-        trade_history = self.trade_history.filter(col("symbol") == symbol)
-
-        trade_history = trade_history.with_columns(
+    def _get_closed_trade_stats(self) -> DataFrame:
+        exit_price = (
             when(col("closed_by") == "TP")
             .then(col("take_profit"))
             .when(col("closed_by") == "SL")
             .then(col("stop_loss"))
             .otherwise(lit(None))
-            .alias("exit_price")
-        )
-
-        trade_history = trade_history.with_columns(
-            ((col("exit_price") - col("entry_price")) / col("entry_price") * 100).alias(
-                "return_pct"
-            )
         )
-
-        return float(trade_history["return_pct"].mean())
-
-    def _get_symbol_max_drawdown(self, symbol):
-        df = (
-            DataFrame(
-                {
-                    "timestamp": list(self.equity_history_copy[symbol].keys()),
-                    "pnl": list(self.equity_history_copy[symbol].values()),
-                }
-            )
-            .with_columns(col("timestamp").cast(Datetime("ms")))
-            .sort("timestamp")
+        return self.trade_history.group_by("symbol").agg(
+            col("symbol").len().alias("closed_trades"),
+            (col("closed_by") == "TP").sum().alias("wins"),
+            col("pnl").sum(),
+            col("pnl").filter(col("pnl") > 0).sum().alias("closed_profit"),
+            col("pnl").filter(col("pnl") < 0).sum().alias("closed_loss"),
+            col("commissions").sum(),
+            ((exit_price - col("entry_price")) / col("entry_price") * 100)
+            .mean()
+            .alias("average_return"),
         )
 
-        df = df.with_columns(col("pnl").cum_max().alias("running_max"))
-        df = df.with_columns(
-            ((col("pnl") - col("running_max"))).alias("drawdown_dollar"),
-            ((col("pnl") - col("running_max")) / col("running_max") * 100).alias(
-                "drawdown_pct"
-            ),
+    def _get_open_position_stats(self) -> DataFrame:
+        realized = col("realized_pnl")
+        return self.current_positions.group_by("symbol").agg(
+            col("symbol").len().alias("open_trades"),
+            realized.sum(),
+            col("unrealized_pnl").sum(),
+            realized.filter(realized > 0).sum().alias("open_profit"),
+            realized.filter(realized < 0).sum().alias("open_loss"),
         )
-        max_drawdown_row = df.select(
-            [
-                col("drawdown_pct").min().alias("max_drawdown_pct"),
-                col("drawdown_dollar").min().alias("max_drawdown_dollar"),
-            ]
-        ).to_dict(as_series=False)
 
-        return (
-            max_drawdown_row["max_drawdown_pct"][0],
-            max_drawdown_row["max_drawdown_dollar"][0],
+    def _get_symbol_max_drawdowns(self) -> DataFrame:
+        """
+        Drawdowns of every symbol PnL history, NaN percentages (running max of 0)
+        are skipped like polars min does
+        """
+        max_drawdown_pct = full(len(self.symbols), nan)
+        max_drawdown_dollar = full(len(self.symbols), nan)
+        for i, symbol in enumerate(self.symbols):
+            _, pnl = get_sorted_history(self.equity_history[symbol])
+            if not pnl.size:
+                continue
+            drawdown_dollar, drawdown_pct = get_drawdowns(pnl)
+            max_drawdown_dollar[i] = drawdown_dollar.min()
+            if not isnan(drawdown_pct).all():
+                max_drawdown_pct[i] = nanmin(drawdown_pct)
+        return DataFrame(
+            {
+                "symbol": self.symbols,
+                "max_drawdown_pct": max_drawdown_pct,
+                "max_drawdown_dollar": max_drawdown_dollar,
+            },
+            schema={
+                "symbol": String,
+                "max_drawdown_pct": Float64,
+                "max_drawdown_dollar": Float64,
+            },
         )
 
     @staticmethod
@@ -129,58 +201,6 @@ class MetricsGenerator:
             return 0
         return abs(gross_profit / gross_loss)
 
-    def _get_gross_profit_loss(self, symbol):
-        closed_trades_profit = self.trade_history.filter(
-            (col("symbol") == symbol) & (col("pnl") > 0)
-        )["pnl"].sum()
-        closed_trades_loss = self.trade_history.filter(
-            (col("symbol") == symbol) & (col("pnl") < 0)
-        )["pnl"].sum()
-        open_trades_profit = self.current_positions.filter(
-            (col("symbol") == symbol) & (col("realized_pnl") > 0)
-        )["realized_pnl"].sum()
-        open_trades_loss = self.current_positions.filter(
-            (col("symbol") == symbol) & (col("realized_pnl") < 0)
-        )["realized_pnl"].sum()
-
-        return (
-            closed_trades_profit + open_trades_profit,
-            closed_trades_loss + open_trades_loss,
-        )
-
-    def _get_symbol_pnl(self, symbol):
-        closed_trades_pnl = self.trade_history.filter(col("symbol") == symbol)[
-            "pnl"
-        ].sum()
-        open_trades_realized_pnl = self.current_positions.filter(
-            col("symbol") == symbol
-        )["realized_pnl"].sum()
-        open_trades_unrealized_pnl = self.current_positions.filter(
-            col("symbol") == symbol
-        )["unrealized_pnl"].sum()
-        closed_trades_commissions = self.trade_history.filter(col("symbol") == symbol)[
-            "commissions"
-        ].sum()
-        return (
-            closed_trades_pnl
-            + open_trades_realized_pnl
-            + open_trades_unrealized_pnl
-            - closed_trades_commissions
-        )
-
-    def _get_total_trades(self, symbol):
-        trade_history_count = self.trade_history.filter(col("symbol") == symbol).height
-        current_position_count = self.current_positions.filter(
-            col("symbol") == symbol
-        ).height
-        return trade_history_count + current_position_count
-
-    def _get_winrate(self, symbol, total_trades):
-        profitable_positions = self.trade_history.filter(
-            (col("symbol") == symbol) & (col("closed_by") == "TP")
-        ).height
-        return profitable_positions / total_trades * 100
-
     @log_execution
     def generate_general_metrics(self):
         metrics = {}
@@ -249,89 +269,22 @@ class MetricsGenerator:
         return turnover_pct
 
     def _get_equity_curve_stability(self):
-        df = DataFrame(
-            {
-                "timestamp": list(self.general_equity_history.keys()),
-                "equity": list(self.general_equity_history.values()),
-            }
-        ).sort("timestamp")
-        X = df["timestamp"].to_numpy().reshape(-1, 1)
-        y = df["equity"].to_numpy()
-        if len(y) < 2:
+        curve = self._get_equity_curve()
+        if curve["equity"].size < 2:
             return nan
-        model = LinearRegression()
-        model.fit(X, y)
-        r_squared = model.score(X, y)
-
-        return r_squared
+        return get_r_squared(curve["timestamps"], curve["equity"])
 
     def _get_historical_var(self):
-        df = DataFrame(
-            {
-                "timestamp": list(self.general_equity_history.keys()),
-                "equity": list(self.general_equity_history.values()),
-            }
-        )
-        df = df.with_columns(col("timestamp").cast(Datetime("ms")))
-        daily_df = df.group_by_dynamic(
-            index_column="timestamp", every="1d", closed="right", by=None
-        ).agg(col("equity").last().alias("equity"))
-        daily_df = daily_df.sort("timestamp")
-        returns = daily_df.select("equity").drop_nulls().to_numpy().flatten()
         confidence_level = 0.95
-        returns = asarray(returns)
         var_percentile = 100 * (1 - confidence_level)
-        var = percentile(returns, var_percentile)
-        return var
+        return percentile(self._get_equity_curve()["daily_equity"], var_percentile)
 
     def _get_max_drawdown(self):
-        df = (
-            DataFrame(
-                {
-                    "timestamp": list(self.general_equity_history.keys()),
-                    "equity": list(self.general_equity_history.values()),
-                }
-            )
-            .with_columns(col("timestamp").cast(Datetime("ms")))
-            .sort("timestamp")
-        )
-        df = df.with_columns(col("equity").cum_max().alias("running_max"))
-        df = df.with_columns(
-            ((col("equity") - col("running_max"))).alias("drawdown_dollar"),
-            ((col("equity") - col("running_max")) / col("running_max") * 100).alias(
-                "drawdown_pct"
-            ),
-        )
-        max_drawdown_row = df.select(
-            [
-                col("drawdown_pct").min().alias("max_drawdown_pct"),
-                col("drawdown_dollar").min().alias("max_drawdown_dollar"),
-            ]
-        ).to_dict(as_series=False)
-
-        return (
-            max_drawdown_row["max_drawdown_pct"][0],
-            max_drawdown_row["max_drawdown_dollar"][0],
-        )
+        curve = self._get_equity_curve()
+        return curve["drawdown_pct"].min(), curve["drawdown_dollar"].min()
 
     def _get_sharpe_sortino_ratios(self):
-        df = DataFrame(
-            {
-                "timestamp": list(self.general_equity_history.keys()),
-                "equity": list(self.general_equity_history.values()),
-            }
-        )
-        df = df.with_columns(col("timestamp").cast(Datetime("ms")))
-        monthly_df = df.group_by_dynamic(
-            index_column="timestamp", every="1mo", closed="right", by=None
-        ).agg(col("equity").last().alias("equity"))
-        monthly_df = monthly_df.sort("timestamp")
-        monthly_df = monthly_df.with_columns(
-            (col("equity").pct_change().alias("monthly_return"))
-        )
-        monthly_returns = (
-            monthly_df.select("monthly_return").drop_nulls().to_numpy().flatten()
-        )
+        monthly_returns = self._get_equity_curve()["monthly_returns"]
         monthly_sharpe = mean(monthly_returns) / std(monthly_returns)
         annualized_sharpe = monthly_sharpe * sqrt(12)
 
@@ -339,6 +292,32 @@ class MetricsGenerator:
 
         return monthly_sharpe, annualized_sharpe, monthly_sortino, annualized_sortino
 
+    def _get_equity_curve(self) -> dict[str, ndarray]:
+        """
+        Intermediates shared by the general metrics, computed once from the sorted
+        general equity: drawdowns against the running max, equity at the end of
+        every day and returns between month ends. Days and months are closed on the
+        right, a point at midnight closes the previous period.
+        """
+        if self.equity_curve is not None:
+            return self.equity_curve
+
+        timestamps, equity = get_sorted_history(self.general_equity_history)
+        drawdown_dollar, drawdown_pct = get_drawdowns(equity)
+        days = (timestamps - 1) // DAY_MS
+        months = (timestamps - 1).astype("datetime64[ms]").astype("datetime64[M]")
+        monthly_equity = get_last_per_period(months, equity)
+
+        self.equity_curve = {
+            "timestamps": timestamps,
+            "equity": equity,
+            "drawdown_dollar": drawdown_dollar,
+            "drawdown_pct": drawdown_pct,
+            "daily_equity": get_last_per_period(days, equity),
+            "monthly_returns": monthly_equity[1:] / monthly_equity[:-1] - 1,
+        }
+        return self.equity_curve
+
     def _get_sortino_ratio(self, returns):
         returns = array(returns)
         excess_returns = returns - 0 / 12
@@ -360,9 +339,8 @@ class MetricsGenerator:
         return daily_volatility, annual_volatility
 
     def _get_annualized_return(self):
-        time_start = min(self.general_equity_history.keys())
-        time_end = max(self.general_equity_history.keys())
-        years = (time_end - time_start) / (60 * 60 * 24 * 365 * 1000)
+        timestamps = self._get_equity_curve()["timestamps"]
+        years = int(timestamps[-1] - timestamps[0]) / YEAR_MS
         annualized_return = (
             (self.final_balance / self.initial_balance) ** (1 / years) - 1
         ) * 100
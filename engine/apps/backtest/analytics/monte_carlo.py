@@ -0,0 +1,337 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from numpy import (
+    arange,
+    asarray,
+    concatenate,
+    cumprod,
+    divide,
+    empty,
+    errstate,
+    float64,
+    maximum,
+    nan,
+    ndarray,
+    percentile,
+    sqrt,
+    tile,
+)
+from numpy.random import default_rng, SeedSequence
+from polars import col, DataFrame
+from utils.logger.logger import LoggerWrapper, log_execution
+
+METHODS = ("shuffle", "bootstrap", "block")
+# a permutation keeps the set of trades, these are equal on every shuffled path
+ORDER_INVARIANT = ("final_return", "sharpe")
+YEAR_MS = 365 * 24 * 60 * 60 * 1000
+
+_worker_state = {}
+
+
+def get_trade_returns(trade_history: DataFrame, initial_balance: float) -> ndarray:
+    """
+    Return of every closed trade on the equity before it, net of commissions, in
+    exit order
+
+    :param trade_history: Portfolio.trade_history
+    :type trade_history: pl.DataFrame
+    :param initial_balance: starting equity
+    :type initial_balance: float
+    :returns: np.ndarray of returns, -0.01 for a trade losing 1% of the equity
+    """
+    net_pnl = (
+        trade_history.sort("exit_time", "order_id")
+        .select(col("pnl") - col("commissions"))
+        .to_series()
+        .to_numpy()
+        .astype(float64)
+    )
+    equity = initial_balance + concatenate([[0.0], net_pnl.cumsum()])
+    return net_pnl / equity[:-1]
+
+
+def sample_indexes(
+    rng, size: int, n_paths: int, method: str, block_size: int = 10
+) -> ndarray:
+    """
+    Resampled trade orders, one row per path
+
+    :param rng: numpy Generator
+    :param size: amount of trades
+    :type size: int
+    :param n_paths: amount of paths
+    :type n_paths: int
+    :param method: "shuffle" (permutation of the trades, only the order changes so
+        the final return and Sharpe ratio are the same on every path), "bootstrap"
+        (draws with replacement) or "block" (circular blocks of consecutive trades,
+        keeps streaks)
+    :type method: str
+    :param block_size: trades per block of the block bootstrap
+    :type block_size: int
+    :returns: np.ndarray of shape (n_paths, size)
+    """
+    if method == "shuffle":
+        return rng.permuted(tile(arange(size), (n_paths, 1)), axis=1)
+    if method == "bootstrap":
+        return rng.integers(0, size, (n_paths, size))
+    if method == "block":
+        blocks = -(-size // block_size)
+        starts = rng.integers(0, size, (n_paths, blocks, 1))
+        indexes = (starts + arange(block_size)) % size
+        return indexes.reshape(n_paths, -1)[:, :size]
+    raise ValueError(f"Unknown method {method}, expected one of {METHODS}")
+
+
+def simulate_paths(
+    returns: ndarray,
+    n_paths: int,
+    method: str = "bootstrap",
+    block_size: int = 10,
+    initial_balance: float = 1.0,
+    seed: int | SeedSequence | None = None,
+) -> ndarray:
+    """
+    Equity paths of resampled trade returns
+
+    :returns: np.ndarray of shape (n_paths, len(returns) + 1), the first column is
+        the initial balance
+    """
+    rng = default_rng(seed)
+    paths = empty((n_paths, returns.size + 1))
+    paths[:, 0] = initial_balance
+    # growth factors are accumulated in place, the index array is freed once used
+    sampled = returns[sample_indexes(rng, returns.size, n_paths, method, block_size)]
+    sampled += 1
+    cumprod(sampled, axis=1, out=paths[:, 1:])
+    del sampled
+    paths[:, 1:] *= initial_balance
+    return paths
+
+
+def get_path_statistics(
+    paths: ndarray, ruin_level: float, periods_per_year: float
+) -> dict[str, ndarray]:
+    """
+    :param paths: output of simulate_paths
+    :type paths: np.ndarray
+    :param ruin_level: a path is ruined once its equity falls to this fraction of
+        the initial balance
+    :type ruin_level: float
+    :param periods_per_year: trades per year, annualizes the Sharpe ratio
+    :type periods_per_year: float
+    :returns: per path max drawdown (%), final return (%), annualized Sharpe ratio
+        of the trade returns and ruin flag
+    """
+    initial = paths[:, :1]
+    with errstate(divide="ignore", invalid="ignore"):
+        returns = paths[:, 1:] / paths[:, :-1]
+        returns -= 1
+        sharpe = returns.mean(axis=1) / returns.std(axis=1) * sqrt(periods_per_year)
+        del returns
+        # peaks are overwritten with the drawdown ratio instead of a new array
+        drawdown = maximum.accumulate(paths, axis=1)
+        divide(paths, drawdown, out=drawdown)
+    return {
+        "max_drawdown": (drawdown.min(axis=1) - 1) * 100,
+        "final_return": (paths[:, -1] / initial[:, 0] - 1) * 100,
+        "sharpe": sharpe,
+        "ruined": (paths <= initial * ruin_level).any(axis=1),
+    }
+
+
+def get_confidence_interval(
+    values: ndarray, confidence: float = 0.95
+) -> tuple[float, float]:
+    """
+    Equal tailed percentile interval, NaN values are ignored
+    """
+    values = values[values == values]
+    if not values.size:
+        return nan, nan
+    tail = (1 - confidence) / 2 * 100
+    lower, upper = percentile(values, [tail, 100 - tail])
+    return float(lower), float(upper)
+
+
+def simulate_chunk(
+    returns: ndarray,
+    seed: SeedSequence,
+    n_paths: int,
+    method: str,
+    block_size: int,
+    ruin_level: float,
+    periods_per_year: float,
+) -> dict[str, ndarray]:
+    paths = simulate_paths(returns, n_paths, method, block_size, seed=seed)
+    return get_path_statistics(paths, ruin_level, periods_per_year)
+
+
+def init_worker(returns: ndarray, settings: dict):
+    """ProcessPoolExecutor initializer. Stores the trade returns once per worker."""
+    _worker_state.update({"returns": returns, "settings": settings})
+
+
+def run_chunk_task(task: tuple[SeedSequence, int]) -> dict[str, ndarray]:
+    """
+    Pool task: (seed, amount of paths) -> path statistics. Requires init_worker.
+    """
+    return simulate_chunk(_worker_state["returns"], *task, **_worker_state["settings"])
+
+
+class MonteCarlo:
+    def __init__(
+        self,
+        trade_history: DataFrame,
+        initial_balance: float,
+        log_level: int = 10,
+    ):
+        """
+        Monte Carlo analysis of a backtest: the closed trades are resampled into
+        thousands of alternative equity paths, giving distributions of the max
+        drawdown, the final return and the Sharpe ratio plus the probability of
+        ruin. Paths are simulated in chunks of 2-D arrays, so memory stays bounded
+        by the chunk size, and chunks run in a process pool.
+
+        :param trade_history: Portfolio.trade_history
+        :type trade_history: pl.DataFrame
+        :param initial_balance: starting equity of the backtest
+        :type initial_balance: float
+        """
+        self.logger = LoggerWrapper(name="Monte Carlo Module", level=log_level)
+        if trade_history.is_empty():
+            raise ValueError("Monte Carlo analysis needs closed trades")
+
+        self.initial_balance = initial_balance
+        self.returns = get_trade_returns(trade_history, initial_balance)
+
+        span = trade_history["exit_time"].max() - trade_history["exit_time"].min()
+        years = span / YEAR_MS if span else 0
+        self.trades_per_year = self.returns.size / years if years else nan
+
+    @classmethod
+    def from_portfolio(cls, portfolio, log_level: int = 10) -> "MonteCarlo":
+        return cls(
+            trade_history=portfolio.trade_history,
+            initial_balance=portfolio.initial_capital,
+            log_level=log_level,
+        )
+
+    def simulate(
+        self,
+        n_paths: int = 1000,
+        method: str = "bootstrap",
+        block_size: int = 10,
+        seed: int | None = None,
+    ) -> ndarray:
+        """
+        All paths in one array, for plots and custom statistics
+
+        :returns: np.ndarray of shape (n_paths, trades + 1) of equity values
+        """
+        return simulate_paths(
+            self.returns, n_paths, method, block_size, self.initial_balance, seed
+        )
+
+    @log_execution
+    def run(
+        self,
+        n_paths: int = 10000,
+        method: str = "bootstrap",
+        block_size: int = 10,
+        ruin_level: float = 0.5,
+        chunk_size: int = 1000,
+        n_jobs: int | None = None,
+        seed: int | None = None,
+    ) -> dict[str, ndarray]:
+        """
+        Statistics of n_paths resampled paths. Every chunk gets its own seed spawned
+        from `seed`, so results do not depend on n_jobs.
+
+        :param n_paths: amount of paths
+        :type n_paths: int
+        :param method: "bootstrap", "block" or "shuffle", see sample_indexes
+        :type method: str
+        :param block_size: trades per block of the block bootstrap
+        :type block_size: int
+        :param ruin_level: fraction of the initial balance counted as ruin
+        :type ruin_level: float
+        :param chunk_size: paths simulated at once, bounds the peak memory of a
+            worker to about chunk_size * trades * 25 bytes (resample indexes,
+            sampled returns and the paths, intermediates are freed or reused)
+        :type chunk_size: int
+        :param n_jobs: worker processes, cpu count if None, in process if 1
+        :type n_jobs: int | None
+        :param seed: seed of the random generators
+        :type seed: int | None
+        :returns: {"max_drawdown", "final_return", "sharpe", "ruined"}, one value per
+            path
+        """
+        if method not in METHODS:
+            raise ValueError(f"Unknown method {method}, expected one of {METHODS}")
+
+        sizes = [
+            min(chunk_size, n_paths - start) for start in range(0, n_paths, chunk_size)
+        ]
+        tasks = list(zip(SeedSequence(seed).spawn(len(sizes)), sizes))
+        settings = {
+            "method": method,
+            "block_size": block_size,
+            "ruin_level": ruin_level,
+            "periods_per_year": self.trades_per_year,
+        }
+
+        if n_jobs == 1:
+            results = [
+                simulate_chunk(self.returns, *task, **settings) for task in tasks
+            ]
+        else:
+            with ProcessPoolExecutor(
+                max_workers=n_jobs,
+                mp_context=get_context("spawn"),
+                initializer=init_worker,
+                initargs=(self.returns, settings),
+            ) as executor:
+                results = list(executor.map(run_chunk_task, tasks))
+
+        return {
+            name: concatenate([result[name] for result in results])
+            for name in results[0]
+        }
+
+    def get_metrics(
+        self,
+        results: dict[str, ndarray],
+        confidence: float = 0.95,
+        method: str = "bootstrap",
+    ) -> dict[str, float]:
+        """
+        Report ready summary of run
+
+        :param results: output of run
+        :type results: dict[str, np.ndarray]
+        :param confidence: level of the confidence intervals
+        :type confidence: float
+        :param method: method of run, shuffled paths only report the max drawdown
+            and the probability of ruin, their final return and Sharpe ratio have a
+            zero width interval
+        :type method: str
+        """
+        level = f"{confidence * 100:g}%"
+        metrics = {"Paths": results["ruined"].size}
+        for name, title in (
+            ("max_drawdown", "Max Drawdown (%)"),
+            ("final_return", "Final Return (%)"),
+            ("sharpe", "Sharpe Ratio 1Y"),
+        ):
+            if method == "shuffle" and name in ORDER_INVARIANT:
+                continue
+            values = asarray(results[name])
+            lower, upper = get_confidence_interval(values, confidence)
+            finite = values[values == values]
+            metrics[f"{title} Median"] = (
+                float(percentile(finite, 50)) if finite.size else nan
+            )
+            metrics[f"{title} {level} CI Lower"] = lower
+            metrics[f"{title} {level} CI Upper"] = upper
+        metrics["Probability Of Ruin (%)"] = float(results["ruined"].mean() * 100)
+        return metrics
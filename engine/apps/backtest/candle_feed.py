@@ -0,0 +1,139 @@
+from engine.core.buffers.candle_history import MarketHistory
+from numpy import array, asarray, concatenate, int64, ndarray
+from polars import DataFrame, Int64, Series
+from typing import Iterator
+
+
+class CandleFeed:
+    """
+    Single pass over the candle stream of several symbols.
+
+    The timeline is taken from the first symbol, like BackTest always did. The
+    row of every symbol frame at every timestamp is looked up once, so a step is a
+    zero copy one-row slice instead of a filter over the whole frame.
+    """
+
+    def __init__(self, data: dict[str, DataFrame]):
+        self.symbols = list(data.keys())
+        self.timeline = next(iter(data.values()))["open_time"].to_list()
+        self.frames = data
+
+        self.positions = {}
+        self.columns = None
+        timeline = DataFrame({"open_time": Series(self.timeline, dtype=Int64)})
+        for symbol, df in data.items():
+            positions = timeline.join(
+                df.with_row_index("row")
+                .select("open_time", "row")
+                .unique(subset="open_time", keep="last", maintain_order=True),
+                on="open_time",
+                how="left",
+                maintain_order="left",
+            )["row"].to_list()
+            self.positions[symbol] = positions
+
+    def __len__(self) -> int:
+        return len(self.timeline)
+
+    def __iter__(self) -> Iterator[tuple[int, list[tuple[str, DataFrame]]]]:
+        return self.iterate()
+
+    def iterate(
+        self, start: int = 0
+    ) -> Iterator[tuple[int, list[tuple[str, DataFrame]]]]:
+        """
+        Yields (position, [(symbol, candle)]) for every timestamp from `start`.
+        Symbols without a candle at that timestamp are skipped.
+
+        :param start: position in the timeline to start from
+        :type start: int
+        """
+        for position in range(start, len(self.timeline)):
+            yield position, self.get_candles(position)
+
+    def get_candles(self, position: int) -> list[tuple[str, DataFrame]]:
+        candles = []
+        for symbol in self.symbols:
+            row = self.positions[symbol][position]
+            if row is not None:
+                candles.append((symbol, self.frames[symbol].slice(row, 1)))
+        return candles
+
+    def get_rows(self, position: int) -> list[tuple[str, int]]:
+        """
+        Row of every symbol frame at that timestamp, for symbols with a candle
+        """
+        rows = []
+        for symbol in self.symbols:
+            row = self.positions[symbol][position]
+            if row is not None:
+                rows.append((symbol, row))
+        return rows
+
+    def get_batch(self, position: int) -> dict[str, ndarray]:
+        """
+        Candles of all symbols at that timestamp as aligned arrays, for
+        Strategy.generate_orders. On the first call the shared numeric columns of
+        all symbols are concatenated once (the size of the data) and the row
+        positions are offset into them, a step then gathers one row per present
+        symbol from every column.
+
+        :returns: {"symbol": symbols with a candle, column: values}
+        """
+        if self.columns is None:
+            self._build_columns()
+        rows = self.flat_rows[position]
+        present = rows >= 0
+        rows = rows[present]
+        batch = {"symbol": self.symbol_array[present]}
+        for name, values in self.columns.items():
+            batch[name] = values[rows]
+        return batch
+
+    def build_history(self, capacity: int, position: int = 0) -> MarketHistory:
+        """
+        Ring buffer history holding the candles before `position`, so a resumed
+        backtest continues with the same history
+
+        :param capacity: candles kept per symbol
+        :type capacity: int
+        :param position: first timestamp not yet processed
+        :type position: int
+        """
+        history = MarketHistory(capacity)
+        for symbol in self.symbols:
+            rows = [row for row in self.positions[symbol][:position] if row is not None]
+            if rows:
+                history.get_history(symbol).extend(
+                    self.frames[symbol][rows[-capacity:]]
+                )
+        return history
+
+    # ---=== HELPER METHODS ===---
+    def _build_columns(self):
+        frames = list(self.frames.values())
+        columns = [
+            name
+            for name, dtype in frames[0].schema.items()
+            if dtype.is_numeric()
+            and all(name in df.columns and df[name].dtype == dtype for df in frames)
+        ]
+
+        self.symbol_array = asarray(self.symbols)
+        self.flat_rows = []
+        offset = 0
+        for symbol in self.symbols:
+            rows = array(
+                [-1 if row is None else row for row in self.positions[symbol]],
+                dtype=int64,
+            )
+            self.flat_rows.append(rows + (rows >= 0) * offset)
+            offset += self.frames[symbol].height
+        # (timestamp, symbol) row into the concatenated columns, -1 without a candle
+        self.flat_rows = asarray(self.flat_rows).T.copy()
+        self.columns = {
+            name: concatenate(
+                [self.frames[symbol][name].to_numpy() for symbol in self.symbols]
+            )
+            for name in columns
+        }
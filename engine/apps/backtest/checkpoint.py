@@ -0,0 +1,86 @@
+from hashlib import sha256
+from os import makedirs, path, remove, replace
+from pickle import dumps, HIGHEST_PROTOCOL, loads, PicklingError
+from polars import DataFrame
+from zstandard import ZstdCompressor, ZstdDecompressor
+
+CHECKPOINT_VERSION = 4
+
+
+def get_run_signature(
+    data: dict[str, DataFrame], strategy_state: dict, settings: dict
+) -> str:
+    """
+    Fingerprint of a backtest run: symbols, first and last timestamps and row
+    hashes of every frame, the initial strategy state (its parameters) and the
+    engine settings. A checkpoint is only resumed by a run with the same one.
+
+    :param data: {symbol: klines}
+    :type data: dict[str, pl.DataFrame]
+    :param strategy_state: Strategy.get_state before the run
+    :type strategy_state: dict
+    :param settings: portfolio settings, e.g. leverage, fees and the parameters of
+        the execution models, must be picklable
+    :type settings: dict
+    :returns: hex digest
+    """
+    digest = sha256()
+    for symbol, df in data.items():
+        times = df["open_time"]
+        digest.update(repr((symbol, df.height, times.first(), times.last())).encode())
+        digest.update(df.hash_rows(seed=0).to_numpy().tobytes())
+    try:
+        digest.update(dumps(strategy_state, protocol=HIGHEST_PROTOCOL))
+    except (PicklingError, TypeError, AttributeError):
+        digest.update(repr(sorted(strategy_state.items())).encode())
+    digest.update(dumps(sorted(settings.items()), protocol=HIGHEST_PROTOCOL))
+    return digest.hexdigest()
+
+
+def save_checkpoint(file_path: str, state: dict, compression_level: int = 3):
+    """
+    Write a backtest snapshot as zstd compressed pickle. The file is replaced
+    atomically, so a crash while writing keeps the previous snapshot.
+
+    :param file_path: checkpoint file
+    :type file_path: str
+    :param state: engine state, see BackTest._get_state
+    :type state: dict
+    :param compression_level: zstd level, low levels keep the overhead small
+    :type compression_level: int
+    """
+    directory = path.dirname(file_path)
+    if directory:
+        makedirs(directory, exist_ok=True)
+
+    payload = dumps({"version": CHECKPOINT_VERSION, **state}, protocol=HIGHEST_PROTOCOL)
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(ZstdCompressor(level=compression_level).compress(payload))
+    replace(tmp_path, file_path)
+
+
+def load_checkpoint(file_path: str) -> dict | None:
+    """
+    Read a snapshot written by save_checkpoint
+
+    :param file_path: checkpoint file
+    :type file_path: str
+    :returns: engine state, None if there is no checkpoint
+    """
+    if not path.exists(file_path):
+        return None
+
+    with open(file_path, "rb") as f:
+        state = loads(ZstdDecompressor().decompress(f.read()))
+
+    if state.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(
+            f"Unsupported checkpoint version {state.get('version')} in {file_path}"
+        )
+    return state
+
+
+def remove_checkpoint(file_path: str):
+    if path.exists(file_path):
+        remove(file_path)
@@ -1,11 +1,33 @@
+from engine.apps.backtest.candle_feed import CandleFeed
+from engine.apps.backtest.checkpoint import (
+    get_run_signature,
+    load_checkpoint,
+    remove_checkpoint,
+    save_checkpoint,
+)
 from engine.apps.backtest.execution_handler import ExecutionHandler
 from engine.apps.backtest.portfolio import Portfolio
 from engine.apps.backtest.report import ReportGenerator
+from engine.core.strategies.precomputed import prepare_strategy
 from engine.core.strategies.strategy import Strategy
-from polars import DataFrame, Series, col
+from numpy.random import get_state as get_numpy_random_state
+from numpy.random import set_state as set_numpy_random_state
+from os import path
+from polars import DataFrame, Series
+from random import getstate as get_random_state
+from random import setstate as set_random_state
+from signal import SIGINT, signal
+from threading import current_thread, main_thread
 from time import time
+from typing import TYPE_CHECKING
 from utils.logger.logger import LoggerWrapper, log_execution
 
+if TYPE_CHECKING:
+    from engine.apps.backtest.intrabar_resolver import IntrabarResolver
+    from engine.apps.backtest.margin import MarginEngine
+    from engine.apps.backtest.matching import MatchingEngine
+    from engine.apps.backtest.slippage import SlippageModel
+
 
 class BackTest:
     def __init__(
@@ -17,10 +39,36 @@ class BackTest:
         leverage: int = 1,
         maker_fee: float = 0.001,
         taker_fee: float = 0.001,
+        checkpoint_dir: str | None = "checkpoints",
+        checkpoint_interval: float = 300.0,
+        intrabar_resolver: "IntrabarResolver | None" = None,
+        slippage_model: "SlippageModel | None" = None,
+        margin_engine: "MarginEngine | None" = None,
+        matching_engine: "MatchingEngine | None" = None,
     ):
+        """
+        :param checkpoint_dir: directory for periodic snapshots of the engine state,
+            checkpoints are disabled if None
+        :type checkpoint_dir: str | None
+        :param checkpoint_interval: minimal amount of seconds between two snapshots
+        :type checkpoint_interval: float
+        :param intrabar_resolver: resolves candles that touch both TP and SL with lower
+            timeframe data, take profit wins if None
+        :type intrabar_resolver: IntrabarResolver | None
+        :param slippage_model: order book based fill prices and partial fills (see
+            slippage.py), orders fill completely at the close if None
+        :type slippage_model: SlippageModel | None
+        :param margin_engine: tiered maintenance margin and liquidations (see
+            margin.py), positions are never liquidated if None
+        :type margin_engine: MarginEngine | None
+        :param matching_engine: fills LIMIT and STOP orders by replaying trades (see
+            matching.py), they fill at the close like MARKET orders if None
+        :type matching_engine: MatchingEngine | None
+        """
         self.logger = LoggerWrapper(name="Backtest Module", level=log_level)
 
         self.data = data
+        self.candle_feed = CandleFeed(data)
 
         self.portfolio = Portfolio(
             initial_balance=initial_balance,
@@ -28,29 +76,113 @@ class BackTest:
             maker_fee=maker_fee,
             taker_fee=taker_fee,
             log_level=log_level,
+            intrabar_resolver=intrabar_resolver,
+            slippage_model=slippage_model,
+            margin_engine=margin_engine,
+            matching_engine=matching_engine,
         )
         self.execution_handler = ExecutionHandler(
             portfolio=self.portfolio, strategy=strategy, log_level=log_level
         )
         self.report_generator = ReportGenerator(self.portfolio, log_level=log_level)
+        self.strategy = strategy
         self.strategy_name = strategy.__class__.__name__
 
+        # checkpoints are named after the run, so runs with other data, params or
+        # settings never share (or delete) one
+        self.signature = None
+        self.checkpoint_path = None
+        if checkpoint_dir:
+            self.signature = get_run_signature(
+                data=data,
+                strategy_state=strategy.get_state(),
+                settings={
+                    "initial_balance": initial_balance,
+                    "leverage": leverage,
+                    "maker_fee": maker_fee,
+                    "taker_fee": taker_fee,
+                    "intrabar_resolver": self._get_model_settings(intrabar_resolver),
+                    "slippage_model": self._get_model_settings(slippage_model),
+                    "margin_engine": self._get_model_settings(margin_engine),
+                    "matching_engine": self._get_model_settings(matching_engine),
+                },
+            )
+            self.checkpoint_path = path.join(
+                checkpoint_dir, f"{self.strategy_name}-{self.signature[:16]}.ckpt"
+            )
+        # only a checkpoint this run wrote or resumed from is removed at the end
+        self.owns_checkpoint = False
+        self.checkpoint_interval = checkpoint_interval
+        self.position = 0
+        self.interrupted = False
+        self.precomputed = None
+        self.history = None
+
     @log_execution
-    def run(self):
+    def run(self, resume: bool = False):
+        """
+        Run the backtest
+
+        :param resume: continue from the latest checkpoint if there is one
+        :type resume: bool
+        """
         start_time = time()
-        self._iterate_through_candles()
+        if resume:
+            self._restore_checkpoint()
+        self.precomputed = prepare_strategy(self.strategy, self.data)
+        if self.strategy.history_capacity:
+            self.history = self.candle_feed.build_history(
+                self.strategy.history_capacity, self.position
+            )
+        self.strategy.set_history(self.history)
+
+        self.interrupted = False
+        previous_handler = self._set_interrupt_handler()
+        try:
+            self._iterate_through_candles()
+        finally:
+            if previous_handler is not None:
+                signal(SIGINT, previous_handler)
+
+        if self.interrupted:
+            self._save_checkpoint()
+            raise KeyboardInterrupt
+
+        if self.checkpoint_path and self.owns_checkpoint:
+            remove_checkpoint(self.checkpoint_path)
+            self.owns_checkpoint = False
         end_time = time()
         print(f"Backtest war running for {end_time - start_time:.3f} seconds")
 
     @log_execution
     def _iterate_through_candles(self):
-        df = next(iter(self.data.values()))
+        last_checkpoint_time = time()
+        batch = self.strategy.uses_batch_orders()
+        for position, candles in self.candle_feed.iterate(start=self.position):
+            if self.precomputed is not None:
+                for symbol, row in self.candle_feed.get_rows(position):
+                    self.precomputed.set_row(symbol, row)
+            if batch or self.history is not None:
+                candle_batch = self.candle_feed.get_batch(position)
+            if self.history is not None:
+                self.history.update(candle_batch)
+            if batch:
+                self.execution_handler.process_batch(
+                    self.candle_feed.timeline[position], candle_batch, candles
+                )
+            else:
+                for symbol, series in candles:
+                    self._process_orders(symbol, series)
+            self.position = position + 1
 
-        open_time_values = df["open_time"].to_list()
-        for timestamp in open_time_values:
-            for symbol, df in self.data.items():
-                series = df.filter(col("open_time") == timestamp)
-                self._process_orders(symbol, series)
+            if self.interrupted:
+                break
+            if (
+                self.checkpoint_path
+                and time() - last_checkpoint_time >= self.checkpoint_interval
+            ):
+                self._save_checkpoint()
+                last_checkpoint_time = time()
 
     @log_execution
     def generate_report(
@@ -66,3 +198,67 @@ class BackTest:
     @log_execution
     def _process_orders(self, symbol: str, series: Series):
         self.execution_handler.process_orders(symbol, series)
+
+    # ---=== CHECKPOINTS ===---
+    def _get_state(self) -> dict:
+        return {
+            "position": self.position,
+            "signature": self.signature,
+            "portfolio": self.portfolio.get_state(),
+            "strategy": self.strategy.get_state(),
+            "random_state": get_random_state(),
+            "numpy_random_state": get_numpy_random_state(),
+        }
+
+    @staticmethod
+    def _get_model_settings(model) -> tuple[str, dict] | None:
+        if model is None:
+            return None
+        return type(model).__name__, model.get_settings()
+
+    def _set_interrupt_handler(self):
+        """
+        Defer Ctrl-C until the current timestamp is fully processed, so the
+        checkpoint written on interrupt is consistent. Returns the previous handler.
+        """
+        if not self.checkpoint_path or current_thread() is not main_thread():
+            return None
+
+        def handle_interrupt(signum, frame):
+            self.logger.warning("Interrupted, saving checkpoint after this candle")
+            self.interrupted = True
+
+        return signal(SIGINT, handle_interrupt)
+
+    def _save_checkpoint(self):
+        if not self.checkpoint_path:
+            return
+        start_time = time()
+        save_checkpoint(self.checkpoint_path, self._get_state())
+        self.owns_checkpoint = True
+        self.logger.info(
+            f"Checkpoint at candle {self.position}/{len(self.candle_feed)} saved "
+            f"in {time() - start_time:.3f} seconds"
+        )
+
+    def _restore_checkpoint(self):
+        state = load_checkpoint(self.checkpoint_path) if self.checkpoint_path else None
+        if state is None:
+            self.logger.warning("No checkpoint to resume from, starting over")
+            return
+
+        if state["signature"] != self.signature:
+            raise ValueError(
+                f"Checkpoint {self.checkpoint_path} was made by another run (data, "
+                f"strategy params or settings differ)"
+            )
+        self.owns_checkpoint = True
+
+        self.position = state["position"]
+        self.portfolio.set_state(state["portfolio"])
+        self.strategy.set_state(state["strategy"])
+        set_random_state(state["random_state"])
+        set_numpy_random_state(state["numpy_random_state"])
+        self.logger.info(
+            f"Resuming from candle {self.position}/{len(self.candle_feed)}"
+        )
@@ -1,6 +1,7 @@
 from engine.apps.backtest.portfolio import Portfolio
 from engine.core.strategies.strategy import Strategy
-from polars import Series
+from numpy import ndarray
+from polars import DataFrame, Series
 from utils.logger.logger import LoggerWrapper
 
 
@@ -17,6 +18,22 @@ class ExecutionHandler:
             self.portfolio.update_orders(order=order)
         self.portfolio.update_positions(symbol=symbol, series=series)
 
+    def process_batch(
+        self,
+        timestamp: int,
+        batch: dict[str, ndarray],
+        candles: list[tuple[str, DataFrame]],
+    ):
+        """
+        One call of Strategy.generate_orders for all symbols of a timestamp, then
+        the positions of every symbol are updated as in process_orders
+        """
+        orders = self.strategy.generate_orders(timestamp=timestamp, candles=batch)
+        if orders is not None:
+            self.portfolio.update_orders(order=orders)
+        for symbol, series in candles:
+            self.portfolio.update_positions(symbol=symbol, series=series)
+
     def _check_for_orders(self, symbol: str, series: Series):
         order = self.strategy.generate_order(symbol=symbol, new_series=series)
         if order is None:
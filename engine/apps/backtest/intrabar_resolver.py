@@ -0,0 +1,314 @@
+from bisect import bisect_left
+from datetime import datetime, timezone
+from numpy import argmax, concatenate, ndarray
+from os import makedirs, path
+from polars import read_parquet
+from typing import TYPE_CHECKING
+from utils.global_variables.GLOBAL_VARIABLES import TIMEFRAME_MAP
+from utils.logger.logger import LoggerWrapper
+
+if TYPE_CHECKING:
+    from engine.apps.data_managers.managers.klines_manager import KlineDataManager
+    from engine.apps.data_managers.managers.trades_manager import TradeDataManager
+
+DAY_MS = 24 * 60 * 60 * 1000
+# trades fetched around the interpolated id of a searched timestamp
+TRADE_WINDOW = 10_000
+
+
+class IntrabarResolver:
+    def __init__(
+        self,
+        kline_managers: dict[str, "KlineDataManager"],
+        trade_managers: dict[str, "TradeDataManager"] | None = None,
+        timeframe: str = "1h",
+        lower_timeframe: str = "1m",
+        cache_dir: str | None = None,
+        unresolved: str = "TP",
+        log_level: int = 10,
+    ):
+        """
+        Decides which barrier was hit first when a candle touches both the take profit
+        and the stop loss of a position. Lower timeframe klines of the candle are
+        looked up, and if both barriers are still touched within one lower timeframe
+        candle, the raw trades of that candle are replayed.
+
+        Klines are loaded a whole UTC day at a time and kept in memory (and in
+        `cache_dir` as parquet if given), so a backtest pays one query per day that
+        has an ambiguous candle.
+
+        :param kline_managers: {symbol: KlineDataManager}
+        :type kline_managers: dict[str, KlineDataManager]
+        :param trade_managers: {symbol: TradeDataManager}, trades are not used if None
+        :type trade_managers: dict[str, TradeDataManager] | None
+        :param timeframe: timeframe of the backtest candles
+        :type timeframe: str
+        :param lower_timeframe: timeframe used to resolve ambiguous candles
+        :type lower_timeframe: str
+        :param cache_dir: directory for cached lower timeframe klines
+        :type cache_dir: str | None
+        :param unresolved: "TP" or "SL", used when the data can not tell the order,
+            "TP" matches the Portfolio rule without a resolver
+        :type unresolved: str
+        """
+        self.logger = LoggerWrapper(name="Intrabar Resolver Module", level=log_level)
+
+        for name in (timeframe, lower_timeframe):
+            if name not in TIMEFRAME_MAP:
+                raise ValueError(f"Unsupported timeframe: {name}")
+        if unresolved not in ("TP", "SL"):
+            raise ValueError(f"unresolved must be 'TP' or 'SL', got {unresolved}")
+
+        self.kline_managers = kline_managers
+        self.trade_managers = trade_managers or {}
+        self.timeframe = timeframe
+        self.lower_timeframe = lower_timeframe
+        self.candle_ms = int(TIMEFRAME_MAP[timeframe].total_seconds() * 1000)
+        self.lower_candle_ms = int(
+            TIMEFRAME_MAP[lower_timeframe].total_seconds() * 1000
+        )
+        self.cache_dir = cache_dir
+        self.unresolved = unresolved
+
+        self.klines = {}
+        self.trade_ids = {}
+        self.trade_windows = {}
+        self.stats = {"candles": 0, "klines": 0, "trades": 0, "unresolved": 0}
+
+    def resolve(self, symbol: str, timestamp: int, position: dict) -> str:
+        """
+        Which barrier of the position was hit first inside the candle
+
+        :param symbol: symbol of the candle
+        :type symbol: str
+        :param timestamp: open_time of the candle in UNIX ms
+        :type timestamp: int
+        :param position: position row with direction, take_profit and stop_loss
+        :type position: dict
+        :returns: "TP" or "SL"
+        """
+        self.stats["candles"] += 1
+        open_time, high, low, num_trades = self._get_lower_klines(symbol, timestamp)
+
+        if open_time.size:
+            tp_hit, sl_hit = self._get_hits(position, high, low)
+            touched = tp_hit | sl_hit
+            if touched.any():
+                first = argmax(touched)
+                if tp_hit[first] != sl_hit[first]:
+                    self.stats["klines"] += 1
+                    return "TP" if tp_hit[first] else "SL"
+
+                closed_by = self._resolve_with_trades(
+                    symbol, int(open_time[first]), int(num_trades[first]), position
+                )
+                if closed_by is not None:
+                    self.stats["trades"] += 1
+                    return closed_by
+
+        self.stats["unresolved"] += 1
+        return self.unresolved
+
+    def get_settings(self) -> dict:
+        """
+        What the resolution depends on, part of the backtest checkpoint signature
+        """
+        return {
+            "kline_symbols": sorted(self.kline_managers),
+            "trade_symbols": sorted(self.trade_managers),
+            "timeframe": self.timeframe,
+            "lower_timeframe": self.lower_timeframe,
+            "unresolved": self.unresolved,
+        }
+
+    def report(self):
+        print(" === INTRABAR RESOLVER ===")
+        print(f"Ambiguous candles: {self.stats['candles']}")
+        print(f"Resolved with {self.lower_timeframe} klines: {self.stats['klines']}")
+        print(f"Resolved with trades: {self.stats['trades']}")
+        print(f"Unresolved ({self.unresolved}): {self.stats['unresolved']}")
+        print(" === END ===")
+
+    # ---=== HELPER METHODS ===---
+    def _get_lower_klines(
+        self, symbol: str, timestamp: int
+    ) -> tuple[ndarray, ndarray, ndarray, ndarray]:
+        """
+        Lower timeframe open_time, high, low and num_trades inside the candle
+        """
+        end = timestamp + self.candle_ms
+        columns = ("open_time", "high", "low", "num_trades")
+        parts = {name: [] for name in columns}
+        for day in range(timestamp // DAY_MS, (end - 1) // DAY_MS + 1):
+            day_klines = self._get_day_klines(symbol, day)
+            start_index = day_klines["open_time"].searchsorted(timestamp)
+            end_index = day_klines["open_time"].searchsorted(end)
+            for name in columns:
+                parts[name].append(day_klines[name][start_index:end_index])
+
+        open_time, high, low, num_trades = (
+            concatenate(parts[name]) for name in columns
+        )
+        return open_time, high, low, num_trades
+
+    def _get_day_klines(self, symbol: str, day: int) -> dict[str, ndarray]:
+        key = (symbol, day)
+        if key in self.klines:
+            return self.klines[key]
+
+        cache_path = (
+            path.join(self.cache_dir, f"{symbol}_{self.lower_timeframe}_{day}.parquet")
+            if self.cache_dir
+            else None
+        )
+        if cache_path and path.exists(cache_path):
+            data = read_parquet(cache_path)
+        else:
+            if symbol not in self.kline_managers:
+                raise ValueError(f"No KlineDataManager for {symbol}")
+            start = day * DAY_MS
+            data = (
+                self.kline_managers[symbol]
+                .get_klines(
+                    start_date=self._to_date_string(start),
+                    end_date=self._to_date_string(
+                        start + DAY_MS - self.lower_candle_ms
+                    ),
+                    timeframe=self.lower_timeframe,
+                )
+                .select("open_time", "high", "low", "num_trades")
+                .sort("open_time")
+            )
+            if cache_path:
+                makedirs(self.cache_dir, exist_ok=True)
+                data.write_parquet(cache_path)
+
+        self.klines[key] = {name: data[name].to_numpy() for name in data.columns}
+        return self.klines[key]
+
+    def _resolve_with_trades(
+        self, symbol: str, open_time: int, num_trades: int, position: dict
+    ) -> str | None:
+        """
+        Replay the trades of one lower timeframe candle. Trade ids are consecutive,
+        so the candle holds ids [first_id, first_id + num_trades).
+        """
+        trade_manager = self.trade_managers.get(symbol)
+        if trade_manager is None or num_trades <= 0:
+            return None
+
+        first_id = self._find_first_trade_id(
+            trade_manager, symbol, open_time, num_trades
+        )
+        if first_id is None:
+            return None
+        last_id = first_id + num_trades - 1
+
+        ids, _, price = self.trade_windows.get(symbol, ([], [], []))
+        if len(ids) and ids[0] <= first_id and last_id <= ids[-1]:
+            price = price[first_id - ids[0] : last_id - ids[0] + 1]
+        else:
+            trades = trade_manager.get_trades(start_id=first_id, end_id=last_id)
+            if trades.is_empty():
+                return None
+            price = trades["price"].to_numpy()
+
+        tp_hit, sl_hit = self._get_hits(position, price, price)
+        touched = tp_hit | sl_hit
+        if not touched.any():
+            return None
+        return "TP" if tp_hit[argmax(touched)] else "SL"
+
+    def _find_first_trade_id(
+        self,
+        trade_manager: "TradeDataManager",
+        symbol: str,
+        timestamp: int,
+        num_trades: int = 1,
+    ) -> int | None:
+        """
+        First trade at or after timestamp. Probed (id, time) pairs are kept per
+        symbol, starting with the first and the latest trade, and bracket the
+        trade. Its id is interpolated from the bracket, one window of trades
+        around the guess is fetched and bisected in memory, and a window that
+        misses only narrows the bracket for the next guess. A search therefore
+        costs about one query instead of one per binary search step.
+
+        :param num_trades: trades wanted from the result on, the window is widened
+            to hold them for _resolve_with_trades
+        :type num_trades: int
+        :returns: trade id, None if trades of a window are missing
+        """
+        probes = self.trade_ids.setdefault(symbol, ([], []))
+        ids, times = probes
+
+        if not ids:
+            fetcher = trade_manager.data_fetcher
+            bounds = fetcher.fetch_historical_trades(
+                limit=1, from_id=0
+            ) + fetcher.fetch_recent_trades(limit=1)
+            if len(bounds) < 2:
+                self.logger.warning(f"No trades of {symbol} to search")
+                return None
+            for trade in bounds:
+                self._add_probe(probes, int(trade["id"]), int(trade["time"]))
+
+        while True:
+            index = bisect_left(times, timestamp)
+            if index == 0:
+                return ids[0]
+            if index == len(ids):
+                return ids[-1]
+            low_id, high_id = ids[index - 1], ids[index]
+            if high_id - low_id == 1:
+                return high_id
+
+            share = (timestamp - times[index - 1]) / (times[index] - times[index - 1])
+            guess = low_id + int(share * (high_id - low_id))
+            start_id = max(guess - TRADE_WINDOW // 2, low_id + 1)
+            end_id = min(guess + TRADE_WINDOW // 2 + num_trades, high_id)
+
+            trades = trade_manager.get_trades(start_id=start_id, end_id=end_id)
+            if trades.height != end_id - start_id + 1:
+                self.logger.warning(
+                    f"Trades {start_id} to {end_id} of {symbol} are missing"
+                )
+                return None
+            window_ids = trades["id"].to_numpy()
+            window_times = trades["time"].to_numpy()
+            self.trade_windows[symbol] = (
+                window_ids,
+                window_times,
+                trades["price"].to_numpy(),
+            )
+            self._add_probe(probes, int(window_ids[0]), int(window_times[0]))
+            self._add_probe(probes, int(window_ids[-1]), int(window_times[-1]))
+
+            position = window_times.searchsorted(timestamp)
+            if 0 < position < window_ids.size:
+                return int(window_ids[position])
+
+    # ---=== STATIC METHODS ===---
+    @staticmethod
+    def _add_probe(probes: tuple, trade_id: int, trade_time: int):
+        ids, times = probes
+        index = bisect_left(ids, trade_id)
+        if index < len(ids) and ids[index] == trade_id:
+            return
+        ids.insert(index, trade_id)
+        times.insert(index, trade_time)
+
+    @staticmethod
+    def _get_hits(
+        position: dict, high: ndarray, low: ndarray
+    ) -> tuple[ndarray, ndarray]:
+        """
+        Same barrier rules as Portfolio._update_positions_stats
+        """
+        if position["direction"] == "BUY":
+            return high > position["take_profit"], low < position["stop_loss"]
+        return low < position["take_profit"], high > position["stop_loss"]
+
+    @staticmethod
+    def _to_date_string(timestamp: int) -> str:
+        return datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc).isoformat()
@@ -0,0 +1,191 @@
+from numpy import (
+    asarray,
+    concatenate,
+    cumsum,
+    diff,
+    float64,
+    inf,
+    isnan,
+    maximum,
+    ndarray,
+    searchsorted,
+    where,
+)
+from utils.logger.logger import LoggerWrapper
+
+# (notional floor in USDT, maintenance margin rate), USDT-M BTCUSDT brackets
+BINANCE_MAINTENANCE_TIERS = (
+    (0.0, 0.004),
+    (50_000.0, 0.005),
+    (250_000.0, 0.01),
+    (3_000_000.0, 0.025),
+    (15_000_000.0, 0.05),
+    (30_000_000.0, 0.1),
+    (80_000_000.0, 0.125),
+    (100_000_000.0, 0.15),
+    (200_000_000.0, 0.25),
+    (300_000_000.0, 0.5),
+)
+
+
+class MaintenanceTiers:
+    def __init__(self, tiers: tuple[tuple[float, float], ...]):
+        """
+        Tiered maintenance margin: a position of notional N in the tier starting at
+        floor F_i with rate r_i keeps N * r_i - amount_i, where the maintenance
+        amounts make the margin continuous across tiers,
+        amount_i = amount_(i-1) + F_i * (r_i - r_(i-1)), like Binance publishes them.
+
+        :param tiers: (notional floor, maintenance rate) per tier, the first floor
+            must be 0
+        :type tiers: tuple[tuple[float, float], ...]
+        """
+        floors, rates = (asarray(values, dtype=float64) for values in zip(*tiers))
+        if floors[0] != 0 or (diff(floors) <= 0).any():
+            raise ValueError("Tier floors must start at 0 and increase")
+        self.floors = floors
+        self.rates = rates
+        self.amounts = cumsum(concatenate([[0.0], floors[1:] * diff(rates)]))
+
+    def get_tiers(self, notionals: ndarray) -> tuple[ndarray, ndarray]:
+        """
+        :returns: (maintenance rate, maintenance amount) of every notional
+        """
+        tier = searchsorted(self.floors, asarray(notionals), side="right") - 1
+        tier = maximum(tier, 0)
+        return self.rates[tier], self.amounts[tier]
+
+    def get_maintenance_margin(self, notionals: ndarray) -> ndarray:
+        rates, amounts = self.get_tiers(notionals)
+        return asarray(notionals) * rates - amounts
+
+
+class MarginEngine:
+    def __init__(
+        self,
+        tiers: tuple[tuple[float, float], ...] = BINANCE_MAINTENANCE_TIERS,
+        symbol_tiers: dict[str, tuple[tuple[float, float], ...]] | None = None,
+        log_level: int = 10,
+    ):
+        """
+        Isolated margin liquidation for the backtest. The liquidation price of a
+        position is computed once, at entry, so checking every open position
+        against a candle is a vectorized comparison with its high and low.
+
+        :param tiers: maintenance tiers of all symbols
+        :type tiers: tuple[tuple[float, float], ...]
+        :param symbol_tiers: {symbol: tiers} for symbols with their own brackets
+        :type symbol_tiers: dict[str, tuple[tuple[float, float], ...]] | None
+        """
+        self.logger = LoggerWrapper(name="Margin Module", level=log_level)
+        self.tiers = MaintenanceTiers(tiers)
+        self.symbol_tiers = {
+            symbol: MaintenanceTiers(value)
+            for symbol, value in (symbol_tiers or {}).items()
+        }
+
+    def get_settings(self) -> dict:
+        """
+        Maintenance tiers, part of the backtest checkpoint signature
+        """
+        return {
+            symbol: (tiers.floors, tiers.rates)
+            for symbol, tiers in {None: self.tiers, **self.symbol_tiers}.items()
+        }
+
+    def get_symbol_tiers(self, symbol: str) -> MaintenanceTiers:
+        return self.symbol_tiers.get(symbol, self.tiers)
+
+    def get_liquidation_prices(
+        self,
+        symbol: str,
+        directions: ndarray,
+        entry_prices: ndarray,
+        notionals: ndarray,
+        margins: ndarray,
+    ) -> ndarray:
+        """
+        Price at which the isolated margin of a position drops to its maintenance
+        margin. With side s (1 long, -1 short) and quantity Q,
+        LP = (margin + amount - s * Q * entry) / (Q * rate - s * Q).
+        The tier is taken at the notional at the liquidation price, found by
+        recomputing once from the entry notional tier.
+
+        :param symbol: symbol of the positions
+        :type symbol: str
+        :param directions: "BUY" or "SELL" per position
+        :type directions: np.ndarray
+        :param entry_prices: entry price per position
+        :type entry_prices: np.ndarray
+        :param notionals: leveraged dollar volume per position
+        :type notionals: np.ndarray
+        :param margins: isolated margin per position, notional / leverage
+        :type margins: np.ndarray
+        :returns: np.ndarray of liquidation prices, 0 for longs and inf for shorts
+            that can not be liquidated
+        """
+        tiers = self.get_symbol_tiers(symbol)
+        entry_prices = asarray(entry_prices, dtype=float64)
+        notionals = asarray(notionals, dtype=float64)
+        margins = asarray(margins, dtype=float64)
+        side = where(asarray(directions) == "BUY", 1.0, -1.0)
+        quantity = notionals / entry_prices
+
+        prices = entry_prices
+        for _ in range(2):
+            rates, amounts = tiers.get_tiers(quantity * prices)
+            prices = (margins + amounts - side * quantity * entry_prices) / (
+                quantity * rates - side * quantity
+            )
+        safe = isnan(prices) | (prices <= 0)
+        return where(safe, where(side > 0, 0.0, inf), prices)
+
+    @staticmethod
+    def find_liquidations(
+        directions: ndarray,
+        liquidation_prices: ndarray,
+        stop_losses: ndarray,
+        highs: ndarray,
+        lows: ndarray,
+    ) -> ndarray:
+        """
+        Positions liquidated by a candle, all positions in one pass. A stop loss
+        placed before the liquidation price is hit first and closes the position
+        normally instead.
+
+        :param directions: "BUY" or "SELL" per position
+        :type directions: np.ndarray
+        :param liquidation_prices: liquidation price per position
+        :type liquidation_prices: np.ndarray
+        :param stop_losses: stop loss per position, NaN if none
+        :type stop_losses: np.ndarray
+        :param highs: high of the candle of every position
+        :type highs: np.ndarray | float
+        :param lows: low of the candle of every position
+        :type lows: np.ndarray | float
+        :returns: boolean mask of liquidated positions
+        """
+        buy = asarray(directions) == "BUY"
+        liquidation_prices = asarray(liquidation_prices, dtype=float64)
+        stop_losses = asarray(stop_losses, dtype=float64)
+        long_stop = where(isnan(stop_losses), -inf, stop_losses)
+        short_stop = where(isnan(stop_losses), inf, stop_losses)
+        return where(
+            buy,
+            (lows <= liquidation_prices) & (long_stop <= liquidation_prices),
+            (highs >= liquidation_prices) & (short_stop >= liquidation_prices),
+        )
+
+    def get_margin_ratios(
+        self,
+        symbol: str,
+        notionals: ndarray,
+        margins: ndarray,
+        unrealized_pnls: ndarray,
+    ) -> ndarray:
+        """
+        Maintenance margin over margin balance per position, liquidation at 1
+        """
+        maintenance = self.get_symbol_tiers(symbol).get_maintenance_margin(notionals)
+        balance = asarray(margins, dtype=float64) + asarray(unrealized_pnls)
+        return where(balance > 0, maintenance / where(balance > 0, balance, 1), inf)
@@ -0,0 +1,563 @@
+from engine.core.barriers.first_touch import build_range_table, find_first_touch
+from numpy import (
+    arange,
+    argmax,
+    asarray,
+    concatenate,
+    cumsum,
+    diff,
+    float64,
+    full,
+    inf,
+    int64,
+    lexsort,
+    maximum,
+    minimum,
+    nan,
+    ndarray,
+    nextafter,
+    searchsorted,
+    unique,
+    where,
+    zeros,
+)
+from polars import col, DataFrame, when
+from typing import TYPE_CHECKING
+from utils.global_variables.SCHEMAS import FILL_SCHEMA
+from utils.logger.logger import LoggerWrapper, log_execution
+
+if TYPE_CHECKING:
+    from engine.apps.data_managers.managers.trades_manager import TradeDataManager
+
+CHUNK_SIZE = 1 << 21
+
+
+class LevelVolume:
+    def __init__(self, price: ndarray, qty: ndarray, mask: ndarray):
+        """
+        Traded quantity per price level, for one aggressor side. Trades are sorted
+        by (price, index) once, so the volume traded at a level between two trade
+        indexes is a difference of two cumulative sums found by binary search.
+
+        :param price: trade prices
+        :type price: np.ndarray
+        :param qty: trade quantities
+        :type qty: np.ndarray
+        :param mask: trades of the aggressor side
+        :type mask: np.ndarray
+        """
+        self.size = price.size
+        index = mask.nonzero()[0]
+        order = lexsort((index, price[index]))
+        self.index = index[order]
+        self.prices, rank = unique(price[self.index], return_inverse=True)
+        self.keys = rank.astype(int64) * (self.size + 1) + self.index
+        self.cumulative = concatenate([[0.0], cumsum(qty[self.index])])
+
+    def get_positions(self, levels: ndarray, at: ndarray) -> tuple[ndarray, ndarray]:
+        """
+        :returns: (position of the first trade of the level at or after `at` in the
+            sorted trades, mask of levels that traded at all)
+        """
+        rank = minimum(searchsorted(self.prices, levels), max(self.prices.size - 1, 0))
+        present = (
+            self.prices[rank] == levels
+            if self.prices.size
+            else zeros(levels.shape, dtype=bool)
+        )
+        positions = searchsorted(self.keys, rank * (self.size + 1) + at)
+        return positions, present
+
+    def get_traded(self, levels: ndarray, start: ndarray, stop: ndarray) -> ndarray:
+        """
+        Quantity traded at every level by trades in [start, stop)
+        """
+        first, present = self.get_positions(levels, start)
+        last, _ = self.get_positions(levels, stop)
+        return where(present, self.cumulative[last] - self.cumulative[first], 0.0)
+
+    def find_queue_fill(
+        self, levels: ndarray, start: ndarray, stop: ndarray, volume: ndarray
+    ) -> ndarray:
+        """
+        First trade index in [start, stop) at which `volume` has traded at the
+        level, i.e. the queue ahead and the order itself are consumed
+
+        :returns: np.ndarray of trade indexes, `size` if never
+        """
+        if not self.index.size:
+            return full(levels.shape, self.size, dtype=int64)
+        first, present = self.get_positions(levels, start)
+        last, _ = self.get_positions(levels, stop)
+        target = self.cumulative[first] + volume
+        position = searchsorted(self.cumulative, target, side="left") - 1
+        reached = present & (position < last) & (position >= first)
+        position = minimum(maximum(position, 0), self.index.size - 1)
+        return where(reached, self.index[position], self.size)
+
+
+class TradeTape:
+    def __init__(
+        self,
+        time: ndarray,
+        price: ndarray,
+        qty: ndarray,
+        is_buyer_maker: ndarray,
+        block_size: int = 256,
+    ):
+        """
+        Trades of one symbol prepared for matching. Searches for the first trade
+        through a price use block extremes: the block holding the start is scanned
+        directly, then binary lifting over a sparse table of block maxima / minima
+        finds the first block that crosses, which is scanned again. The tables are
+        len / block_size long, so tapes of hundreds of millions of trades fit.
+
+        :param time: trade times in UNIX ms, sorted
+        :type time: np.ndarray
+        :param price: trade prices
+        :type price: np.ndarray
+        :param qty: trade quantities
+        :type qty: np.ndarray
+        :param is_buyer_maker: True for trades initiated by a seller
+        :type is_buyer_maker: np.ndarray
+        :param block_size: trades per block of the search tables
+        :type block_size: int
+        """
+        self.time = asarray(time, dtype=int64)
+        self.price = asarray(price, dtype=float64)
+        self.qty = asarray(qty, dtype=float64)
+        is_buyer_maker = asarray(is_buyer_maker, dtype=bool)
+        if (diff(self.time) < 0).any():
+            raise ValueError("Trades must be sorted by time")
+
+        self.size = self.price.size
+        self.block_size = block_size
+        self.blocks = -(-self.size // block_size)
+        # NaN padding never compares as a cross, the extra block keeps gathers in
+        # bounds
+        self.padded = full((self.blocks + 1) * block_size, nan)
+        self.padded[: self.size] = self.price
+
+        levels = max(self.blocks.bit_length(), 1)
+        blocks = self.padded[: self.blocks * block_size].reshape(-1, block_size)
+        self.upper_table = build_range_table(
+            where(blocks == blocks, blocks, -inf).max(axis=1), levels, upper=True
+        )
+        self.lower_table = build_range_table(
+            where(blocks == blocks, blocks, inf).min(axis=1), levels, upper=False
+        )
+
+        # resting bids are hit by sellers, resting asks are lifted by buyers
+        self.level_volume = {
+            "BUY": LevelVolume(self.price, self.qty, is_buyer_maker),
+            "SELL": LevelVolume(self.price, self.qty, ~is_buyer_maker),
+        }
+
+    @classmethod
+    def from_frame(cls, trades: DataFrame, **kwargs) -> "TradeTape":
+        """
+        Build from trades with TRADES_SCHEMA
+        """
+        trades = trades.sort("time", "id")
+        return cls(
+            time=trades["time"].to_numpy(),
+            price=trades["price"].to_numpy(),
+            qty=trades["qty"].to_numpy(),
+            is_buyer_maker=trades["isBuyerMaker"].to_numpy(),
+            **kwargs,
+        )
+
+    def get_index(self, timestamps: ndarray) -> ndarray:
+        """
+        Index of the first trade strictly after every timestamp
+        """
+        return searchsorted(self.time, timestamps, side="right")
+
+    def find_first_cross(
+        self, start: ndarray, stop: ndarray, level: ndarray, upper: bool
+    ) -> ndarray:
+        """
+        First trade index in [start, stop) with price > level (upper) or
+        price < level, for all entries at once
+
+        :returns: np.ndarray of trade indexes, `size` if never
+        """
+        result = full(start.shape, self.size, dtype=int64)
+        step = max(CHUNK_SIZE // self.block_size, 1)
+        for chunk in range(0, start.size, step):
+            part = slice(chunk, chunk + step)
+            result[part] = self._find_first_cross(
+                start[part], stop[part], level[part], upper
+            )
+        return result
+
+    # ---=== HELPER METHODS ===---
+    def _find_first_cross(
+        self, start: ndarray, stop: ndarray, level: ndarray, upper: bool
+    ) -> ndarray:
+        offsets = arange(self.block_size)
+        result = full(start.shape, self.size, dtype=int64)
+
+        # rest of the block holding the start
+        head_end = minimum((start // self.block_size + 1) * self.block_size, stop)
+        rows = minimum(start, self.size)[:, None] + offsets
+        crossed = self._crosses(rows, level, upper) & (rows < head_end[:, None])
+        found = crossed.any(axis=1)
+        result[found] = rows[found, argmax(crossed[found], axis=1)]
+
+        # first crossing block after it
+        pending = ~found & (head_end < stop)
+        if pending.any():
+            block = find_first_touch(
+                self.upper_table if upper else self.lower_table,
+                head_end[pending] // self.block_size,
+                -(-stop[pending] // self.block_size),
+                level[pending],
+                upper,
+            )
+            rows = maximum(block, 0)[:, None] * self.block_size + offsets
+            crossed = self._crosses(rows, level[pending], upper)
+            crossed &= (block[:, None] >= 0) & (rows < stop[pending][:, None])
+            inside = crossed.any(axis=1)
+            indexes = full(block.shape, self.size, dtype=int64)
+            indexes[inside] = rows[inside, argmax(crossed[inside], axis=1)]
+            result[pending] = indexes
+        return result
+
+    def _crosses(self, rows: ndarray, level: ndarray, upper: bool) -> ndarray:
+        prices = self.padded[rows]
+        return prices > level[:, None] if upper else prices < level[:, None]
+
+
+def match_orders(
+    tape: TradeTape,
+    directions: ndarray,
+    order_types: ndarray,
+    prices: ndarray,
+    quantities: ndarray,
+    order_times: ndarray,
+    expire_times: ndarray,
+    queue_ahead: ndarray,
+) -> dict[str, ndarray]:
+    """
+    Match limit and stop orders of one symbol against its trades, vectorized
+    across orders.
+
+    A resting limit order fills as maker at its price when a trade prints through
+    it, or when the quantity traded at its price by the opposite aggressor has
+    consumed the queue ahead of it and the order itself (price-time priority).
+    Limits beyond the last trade price are marketable and fill as taker at that
+    price. Stops trigger on the first trade at or through the stop price and fill
+    as taker at the price of that trade. Only trades strictly after order_time and
+    at or before expire_time are used.
+
+    :param tape: trades of the symbol
+    :type tape: TradeTape
+    :param directions: "BUY" or "SELL" per order
+    :type directions: np.ndarray
+    :param order_types: "LIMIT" or "STOP" per order
+    :type order_types: np.ndarray
+    :param prices: limit or stop price per order
+    :type prices: np.ndarray
+    :param quantities: base quantity per order
+    :type quantities: np.ndarray
+    :param order_times: submission time per order in UNIX ms
+    :type order_times: np.ndarray
+    :param expire_times: expiry per order in UNIX ms, int64 max for good till cancel
+    :type expire_times: np.ndarray
+    :param queue_ahead: quantity resting at the price before the order per order
+    :type queue_ahead: np.ndarray
+    :returns: {"fill_index", "fill_price", "filled", "maker", "immediate"}, fill
+        index is `tape.size` for orders not completely filled
+    """
+    buy = directions == "BUY"
+    stop_order = order_types == "STOP"
+    start = tape.get_index(order_times)
+    stop = tape.get_index(expire_times)
+
+    fill_index = full(prices.shape, tape.size, dtype=int64)
+    fill_price = prices.copy()
+    filled = zeros(prices.shape)
+    maker = ~stop_order
+    immediate = zeros(prices.shape, dtype=bool)
+
+    last_price = where(start > 0, tape.price[maximum(start - 1, 0)], nan)
+    marketable = ~stop_order & (
+        (buy & (last_price < prices)) | (~buy & (last_price > prices))
+    )
+    fill_price[marketable] = last_price[marketable]
+    filled[marketable] = quantities[marketable]
+    maker[marketable] = False
+    immediate[marketable] = True
+
+    for direction, upper in (("BUY", True), ("SELL", False)):
+        side = directions == direction
+
+        stops = (side & stop_order).nonzero()[0]
+        if stops.size:
+            # trigger at or through the stop, as a strict comparison
+            trigger = nextafter(prices[stops], -inf if upper else inf)
+            index = tape.find_first_cross(start[stops], stop[stops], trigger, upper)
+            triggered = index < tape.size
+            fill_index[stops] = index
+            fill_price[stops] = where(
+                triggered, tape.price[minimum(index, tape.size - 1)], prices[stops]
+            )
+            filled[stops] = where(triggered, quantities[stops], 0.0)
+
+        limits = (side & ~stop_order & ~marketable).nonzero()[0]
+        if limits.size:
+            # a bid fills when the price trades below it, an ask above it
+            through = tape.find_first_cross(
+                start[limits], stop[limits], prices[limits], not upper
+            )
+            volume = tape.level_volume[direction]
+            queue = volume.find_queue_fill(
+                prices[limits],
+                start[limits],
+                stop[limits],
+                queue_ahead[limits] + quantities[limits],
+            )
+            index = minimum(through, queue)
+            complete = index < tape.size
+            traded = volume.get_traded(prices[limits], start[limits], stop[limits])
+            partial = minimum(
+                maximum(traded - queue_ahead[limits], 0.0), quantities[limits]
+            )
+            fill_index[limits] = index
+            filled[limits] = where(complete, quantities[limits], partial)
+
+    return {
+        "fill_index": fill_index,
+        "fill_price": fill_price,
+        "filled": filled,
+        "maker": maker,
+        "immediate": immediate,
+    }
+
+
+class MatchingEngine:
+    def __init__(
+        self,
+        trades: dict[str, DataFrame],
+        maker_fee: float = 0.001,
+        taker_fee: float = 0.001,
+        block_size: int = 256,
+        log_level: int = 10,
+    ):
+        """
+        Simulates LIMIT and STOP orders by replaying historical trades. Every tape
+        is prepared once (O(n log n)), after which a whole batch of orders is
+        matched with binary searches, independent of the amount of trades between
+        an order and its fill.
+
+        :param trades: {symbol: trades with TRADES_SCHEMA}
+        :type trades: dict[str, pl.DataFrame]
+        :param maker_fee: fee rate of resting fills
+        :type maker_fee: float
+        :param taker_fee: fee rate of marketable limits and triggered stops
+        :type taker_fee: float
+        :param block_size: trades per block of the search tables
+        :type block_size: int
+        """
+        self.logger = LoggerWrapper(name="Matching Engine Module", level=log_level)
+        self.maker_fee = maker_fee
+        self.taker_fee = taker_fee
+        self.tapes = {
+            symbol: TradeTape.from_frame(df, block_size=block_size)
+            for symbol, df in trades.items()
+        }
+
+    @classmethod
+    def from_managers(
+        cls,
+        managers: dict[str, "TradeDataManager"],
+        start_id: int | None = None,
+        end_id: int | None = None,
+        **kwargs,
+    ) -> "MatchingEngine":
+        """
+        Load the tapes from TradeDataManagers, fetching missing trades
+        """
+        trades = {
+            symbol: manager.get_trades(start_id=start_id, end_id=end_id)
+            for symbol, manager in managers.items()
+        }
+        return cls(trades, **kwargs)
+
+    def get_settings(self) -> dict:
+        """
+        Fees and a fingerprint of every tape, part of the backtest checkpoint
+        signature
+        """
+        return {
+            "maker_fee": self.maker_fee,
+            "taker_fee": self.taker_fee,
+            "tapes": {
+                symbol: (tape.size, tape.time[:1], tape.time[-1:], tape.qty.sum())
+                for symbol, tape in self.tapes.items()
+            },
+        }
+
+    @log_execution
+    def match(self, orders: DataFrame) -> DataFrame:
+        """
+        Match orders with ORDER_HISTORY_SCHEMA. entry_price is the limit or stop
+        price and volume the dollar notional at that price. Optional columns
+        "expire_time" (UNIX ms, null for good till cancel) and "queue_ahead" (base
+        quantity resting before the order, e.g. from an order book snapshot) refine
+        the simulation. Own orders at the same symbol, side and price queue behind
+        each other in order_time order.
+
+        :param orders: orders with order_type "LIMIT" or "STOP"
+        :type orders: pl.DataFrame
+        :returns: pl.DataFrame with FILL_SCHEMA, one row per order. Status is
+            FILLED, PARTIALLY_FILLED, EXPIRED without any fill or NEW when the order
+            still rests untouched at the end of the trades
+        """
+        invalid = ~orders["order_type"].is_in(["LIMIT", "STOP"])
+        if invalid.any():
+            raise ValueError(
+                f"MatchingEngine handles LIMIT and STOP orders, got "
+                f"{orders.filter(invalid)['order_type'].unique().to_list()}"
+            )
+
+        fills = []
+        for (symbol,), df in orders.partition_by(
+            "symbol", as_dict=True, maintain_order=True
+        ).items():
+            if symbol not in self.tapes:
+                raise ValueError(f"No trades loaded for {symbol}")
+            fills.append(self._match_symbol(self.tapes[symbol], df))
+
+        if not fills:
+            return DataFrame(schema=FILL_SCHEMA)
+        data = {name: concatenate([fill[name] for fill in fills]) for name in fills[0]}
+        has_fill = col("filled_volume") > 0
+        return DataFrame(data, schema=FILL_SCHEMA).with_columns(
+            when(has_fill).then(col("fill_time")).alias("fill_time"),
+            when(has_fill).then(col("fill_price")).alias("fill_price"),
+        )
+
+    # ---=== HELPER METHODS ===---
+    def _match_symbol(self, tape: TradeTape, orders: DataFrame) -> dict[str, ndarray]:
+        directions = orders["direction"].to_numpy()
+        order_types = orders["order_type"].to_numpy()
+        prices = orders["entry_price"].to_numpy().astype(float64)
+        quantities = orders["volume"].to_numpy() / prices
+        order_times = orders["order_time"].to_numpy().astype(int64)
+        expire_times = full(prices.shape, (1 << 63) - 1, dtype=int64)
+        if "expire_time" in orders.columns:
+            expire = orders["expire_time"]
+            expire_times = where(
+                expire.is_null().to_numpy(),
+                expire_times,
+                expire.fill_null(0).to_numpy(),
+            )
+        queue_ahead = zeros(prices.shape)
+        if "queue_ahead" in orders.columns:
+            queue_ahead = (
+                orders["queue_ahead"].fill_null(0.0).to_numpy().astype(float64)
+            )
+
+        arguments = (
+            directions,
+            order_types,
+            prices,
+            quantities,
+            order_times,
+            expire_times,
+            queue_ahead,
+        )
+        result = match_orders(tape, *arguments)
+        self._apply_own_queue(tape, result, arguments)
+
+        complete = result["fill_index"] < tape.size
+        stop = tape.get_index(expire_times)
+        # fills at expiry happened by the last trade before it
+        index = where(complete, result["fill_index"], stop - 1)
+        fill_time = tape.time[minimum(maximum(index, 0), tape.size - 1)]
+        fill_time = where(result["immediate"], order_times, fill_time)
+
+        status = where(
+            result["immediate"] | complete,
+            "FILLED",
+            where(
+                result["filled"] > 0,
+                "PARTIALLY_FILLED",
+                where(stop < tape.size, "EXPIRED", "NEW"),
+            ),
+        )
+        volume = result["filled"] * result["fill_price"]
+        fee_rate = where(result["maker"], self.maker_fee, self.taker_fee)
+        return {
+            "order_id": orders["order_id"].to_numpy(),
+            "symbol": orders["symbol"].to_numpy(),
+            "status": status,
+            "fill_time": fill_time,
+            "fill_price": result["fill_price"],
+            "filled_volume": volume,
+            "liquidity": where(result["maker"], "MAKER", "TAKER"),
+            "fee": volume * fee_rate,
+        }
+
+    @staticmethod
+    def _apply_own_queue(tape: TradeTape, result: dict, arguments: tuple):
+        """
+        Own resting limits at the same side and price are ahead of later ones
+        until they fill. Orders sharing a level are re-matched one after the other,
+        with the quantity earlier orders still have unfilled at the submission of
+        the order added to its queue.
+        """
+        directions, order_types, prices, quantities, order_times, expire_times, _ = (
+            arguments
+        )
+        resting = (order_types == "LIMIT") & ~result["immediate"]
+        candidates = resting.nonzero()[0]
+        if candidates.size < 2:
+            return
+
+        buy = directions[candidates] == "BUY"
+        order = lexsort((order_times[candidates], prices[candidates], buy))
+        candidates = candidates[order]
+        same_level = (directions[candidates[1:]] == directions[candidates[:-1]]) & (
+            prices[candidates[1:]] == prices[candidates[:-1]]
+        )
+        if not same_level.any():
+            return
+
+        starts = tape.get_index(order_times)
+        stops = tape.get_index(expire_times)
+        # last trade index every order rests through, updated as orders re-match
+        ends = minimum(result["fill_index"], stops - 1)
+        queues = asarray(arguments[-1], dtype=float64).copy()
+        group = [candidates[0]]
+        for position in range(1, candidates.size):
+            current = candidates[position]
+            if not same_level[position - 1]:
+                group = [current]
+                continue
+            earlier = asarray(group)
+            group.append(current)
+            at = starts[current]
+            earlier = earlier[(starts[earlier] <= at) & (ends[earlier] >= at)]
+            if not earlier.size:
+                continue
+
+            traded = tape.level_volume[directions[current]].get_traded(
+                prices[earlier], starts[earlier], full(earlier.shape, at)
+            )
+            filled = minimum(
+                maximum(traded - queues[earlier], 0.0), quantities[earlier]
+            )
+            ahead = (quantities[earlier] - filled).sum()
+            if ahead <= 0:
+                continue
+            queues[current] += ahead
+            single = [current]
+            arguments_single = [argument[single] for argument in arguments]
+            arguments_single[-1] = queues[single]
+            rematched = match_orders(tape, *arguments_single)
+            for name, values in rematched.items():
+                result[name][current] = values[0]
+            ends[current] = min(rematched["fill_index"][0], stops[current] - 1)
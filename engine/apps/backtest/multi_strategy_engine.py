@@ -0,0 +1,200 @@
+from engine.apps.backtest.candle_feed import CandleFeed
+from engine.apps.backtest.execution_handler import ExecutionHandler
+from engine.apps.backtest.portfolio import Portfolio
+from engine.apps.backtest.report import ReportGenerator
+from engine.core.strategies.precomputed import prepare_strategy
+from engine.core.strategies.strategy import Strategy
+from polars import DataFrame, Expr
+from time import time
+from typing import TYPE_CHECKING
+from utils.logger.logger import LoggerWrapper, log_execution
+
+if TYPE_CHECKING:
+    from engine.apps.backtest.intrabar_resolver import IntrabarResolver
+    from engine.apps.backtest.margin import MarginEngine
+    from engine.apps.backtest.matching import MatchingEngine
+    from engine.apps.backtest.slippage import SlippageModel
+
+
+class MultiStrategyBackTest:
+    def __init__(
+        self,
+        data: dict[str, DataFrame],
+        strategies: dict[str, Strategy] | list[Strategy],
+        indicators: list[Expr] | None = None,
+        log_level: int = 10,
+        initial_balance: int = 10000,
+        leverage: int = 1,
+        maker_fee: float = 0.001,
+        taker_fee: float = 0.001,
+        intrabar_resolver: "IntrabarResolver | None" = None,
+        slippage_model: "SlippageModel | None" = None,
+        margin_engine: "MarginEngine | None" = None,
+        matching_engine: "MatchingEngine | None" = None,
+    ):
+        """
+        Drives several strategies from one pass over the candle stream. Every strategy
+        has its own Portfolio and ExecutionHandler, while the data is indexed once and
+        every candle is handed to all of them.
+
+        :param data: {symbol: klines}, same layout as for BackTest
+        :type data: dict[str, pl.DataFrame]
+        :param strategies: {name: strategy}, or a list named after the strategy classes
+        :type strategies: dict[str, Strategy] | list[Strategy]
+        :param indicators: polars expressions added to every symbol frame once, before
+            the pass, so shared indicator columns are not recomputed per strategy
+        :type indicators: list[pl.Expr] | None
+        :param intrabar_resolver: resolves candles that touch both TP and SL with lower
+            timeframe data for all portfolios, take profit wins if None
+        :type intrabar_resolver: IntrabarResolver | None
+        :param slippage_model: execution model shared by all portfolios, orders fill
+            completely at the close if None
+        :type slippage_model: SlippageModel | None
+        :param margin_engine: tiered maintenance margin and liquidations (see
+            margin.py), positions are never liquidated if None
+        :type margin_engine: MarginEngine | None
+        :param matching_engine: fills LIMIT and STOP orders of all portfolios by
+            replaying trades, they fill at the close like MARKET orders if None
+        :type matching_engine: MatchingEngine | None
+        """
+        self.logger = LoggerWrapper(
+            name="Multi Strategy Backtest Module", level=log_level
+        )
+
+        if indicators:
+            data = {symbol: df.with_columns(indicators) for symbol, df in data.items()}
+        self.data = data
+        self.candle_feed = CandleFeed(data)
+
+        if not isinstance(strategies, dict):
+            strategies = self._name_strategies(strategies)
+
+        self.strategies = strategies
+        self.precomputed = []
+        self.history = None
+        self.portfolios = {}
+        self.execution_handlers = {}
+        self.report_generators = {}
+        for name, strategy in strategies.items():
+            portfolio = Portfolio(
+                initial_balance=initial_balance,
+                leverage=leverage,
+                maker_fee=maker_fee,
+                taker_fee=taker_fee,
+                log_level=log_level,
+                intrabar_resolver=intrabar_resolver,
+                slippage_model=slippage_model,
+                margin_engine=margin_engine,
+                matching_engine=matching_engine,
+            )
+            self.portfolios[name] = portfolio
+            self.execution_handlers[name] = ExecutionHandler(
+                portfolio=portfolio, strategy=strategy, log_level=log_level
+            )
+            self.report_generators[name] = ReportGenerator(
+                portfolio, log_level=log_level
+            )
+
+    @log_execution
+    def run(self):
+        start_time = time()
+        self.precomputed = [
+            precomputed
+            for strategy in self.strategies.values()
+            if (precomputed := prepare_strategy(strategy, self.data)) is not None
+        ]
+        capacity = max(
+            (strategy.history_capacity or 0 for strategy in self.strategies.values()),
+            default=0,
+        )
+        # one history shared by all strategies, long enough for the longest
+        self.history = self.candle_feed.build_history(capacity) if capacity else None
+        for strategy in self.strategies.values():
+            strategy.set_history(self.history)
+        self._iterate_through_candles()
+        end_time = time()
+        print(
+            f"Backtest of {len(self.execution_handlers)} strategies was running for "
+            f"{end_time - start_time:.3f} seconds"
+        )
+
+    @log_execution
+    def _iterate_through_candles(self):
+        execution_handlers = []
+        batch_handlers = []
+        for execution_handler in self.execution_handlers.values():
+            if execution_handler.strategy.uses_batch_orders():
+                batch_handlers.append(execution_handler)
+            else:
+                execution_handlers.append(execution_handler)
+        for position, candles in self.candle_feed:
+            if self.precomputed:
+                for symbol, row in self.candle_feed.get_rows(position):
+                    for precomputed in self.precomputed:
+                        precomputed.set_row(symbol, row)
+            if batch_handlers or self.history is not None:
+                batch = self.candle_feed.get_batch(position)
+            if self.history is not None:
+                self.history.update(batch)
+            if batch_handlers:
+                timestamp = self.candle_feed.timeline[position]
+                for execution_handler in batch_handlers:
+                    execution_handler.process_batch(timestamp, batch, candles)
+            for symbol, series in candles:
+                for execution_handler in execution_handlers:
+                    execution_handler.process_orders(symbol, series)
+
+    @log_execution
+    def get_summary(self) -> DataFrame:
+        """
+        Side by side comparison of the strategies
+
+        :returns: pl.DataFrame with one row per strategy
+        """
+        rows = []
+        for name, portfolio in self.portfolios.items():
+            equity_history, trade_history, _, current_positions, initial_balance = (
+                portfolio.get_metrics()
+            )
+            general_equity = equity_history["General"]
+            final_balance = (
+                general_equity[next(reversed(general_equity))]
+                if general_equity
+                else initial_balance
+            )
+            rows.append(
+                {
+                    "strategy": name,
+                    "Total trades": trade_history.height + current_positions.height,
+                    "Final Balance": final_balance,
+                    "Total Net Profit ($)": final_balance - initial_balance,
+                    "Commissions": trade_history["commissions"].sum(),
+                }
+            )
+        return DataFrame(rows).sort("Total Net Profit ($)", descending=True)
+
+    @log_execution
+    def generate_report(
+        self,
+        name: str,
+        pdf: bool = False,
+        file_name: str = "strategy_report.pdf",
+    ):
+        report_generator = self.report_generators[name]
+        report_generator.generate_general_metrics()
+        report_generator.generate_symbol_metrics()
+        if pdf:
+            report_generator.generate_pdf_report(
+                strategy_name=name, output_file_path=file_name
+            )
+
+    # ---=== STATIC METHODS ===---
+    @staticmethod
+    def _name_strategies(strategies: list[Strategy]) -> dict[str, Strategy]:
+        names = [strategy.__class__.__name__ for strategy in strategies]
+        named = {}
+        for i, (name, strategy) in enumerate(zip(names, strategies)):
+            if names.count(name) > 1:
+                name = f"{name}_{i}"
+            named[name] = strategy
+        return named
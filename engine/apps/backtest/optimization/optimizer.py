@@ -0,0 +1,286 @@
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from engine.apps.backtest.optimization.shared_data import SharedMarketData
+from engine.apps.backtest.optimization.worker import init_worker, run_backtest_task
+from itertools import product
+from math import isnan
+from multiprocessing import get_context
+from numpy.random import default_rng
+from polars import col, DataFrame, int_range
+from tqdm import tqdm
+from utils.logger.logger import LoggerWrapper, log_execution
+
+
+def expand_grid(param_grid: dict[str, list]) -> list[dict]:
+    """
+    Cartesian product of a parameter grid
+
+    :param param_grid: {param: [values]}, e.g. {"rsi_period": [7, 14], "leverage": [1, 4]}
+    :type param_grid: dict[str, list]
+    :returns: list of flat parameter sets
+    """
+    names = list(param_grid.keys())
+    return [dict(zip(names, values)) for values in product(*param_grid.values())]
+
+
+def sample_params(
+    param_distributions: dict[str, list | tuple], n_iter: int, seed: int | None = None
+) -> list[dict]:
+    """
+    Random search parameter sets. A list is sampled uniformly as a set of choices,
+    a (low, high) tuple as a uniform range (integers if both bounds are ints).
+
+    :param param_distributions: {param: [choices] | (low, high)}
+    :type param_distributions: dict[str, list | tuple]
+    :param n_iter: amount of parameter sets
+    :type n_iter: int
+    :param seed: seed of the random generator
+    :type seed: int | None
+    :returns: list of flat parameter sets
+    """
+    rng = default_rng(seed)
+    param_sets = []
+    for _ in range(n_iter):
+        params = {}
+        for name, distribution in param_distributions.items():
+            if isinstance(distribution, tuple):
+                low, high = distribution
+                if isinstance(low, int) and isinstance(high, int):
+                    params[name] = int(rng.integers(low, high + 1))
+                else:
+                    params[name] = float(rng.uniform(low, high))
+            else:
+                params[name] = distribution[int(rng.integers(len(distribution)))]
+        param_sets.append(params)
+    return param_sets
+
+
+class StrategyOptimizer:
+    def __init__(
+        self,
+        data: dict[str, DataFrame],
+        strategy_class: type,
+        metric: str = "Sharpe Ratio 1Y",
+        maximize: bool = True,
+        n_jobs: int | None = None,
+        log_level: int = 10,
+        worker_log_level: int = 30,
+    ):
+        """
+        Runs BackTests of a Strategy class over many parameter sets in a process pool.
+        Market data is placed into shared memory once and attached by each worker.
+
+        :param data: {symbol: klines}, same layout as for BackTest
+        :type data: dict[str, pl.DataFrame]
+        :param strategy_class: Strategy subclass to optimise
+        :type strategy_class: type
+        :param metric: MetricsGenerator general metric used for ranking
+        :type metric: str
+        :param maximize: rank descending if True, ascending otherwise
+        :type maximize: bool
+        :param n_jobs: amount of worker processes, cpu count if None
+        :type n_jobs: int | None
+        :param log_level: log level of the optimizer
+        :type log_level: int
+        :param worker_log_level: log level of the backtests inside workers
+        :type worker_log_level: int
+        """
+        self.logger = LoggerWrapper(name="Strategy Optimizer Module", level=log_level)
+        self.data = data
+        self.strategy_class = strategy_class
+        self.metric = metric
+        self.maximize = maximize
+        self.n_jobs = n_jobs
+        self.worker_log_level = worker_log_level
+        self.timeline = next(iter(data.values()))["open_time"].sort().to_list()
+
+    @log_execution
+    def grid_search(self, param_grid: dict[str, list]) -> DataFrame:
+        """
+        Evaluate every combination of the grid on the full data
+
+        :param param_grid: {param: [values]}
+        :type param_grid: dict[str, list]
+        :returns: pl.DataFrame of params and metrics, ranked by self.metric
+        """
+        param_sets = expand_grid(param_grid)
+        results = self._evaluate([(params, None, None) for params in param_sets])
+        return self._rank(param_sets, results)
+
+    @log_execution
+    def random_search(
+        self,
+        param_distributions: dict[str, list | tuple],
+        n_iter: int = 50,
+        seed: int | None = None,
+    ) -> DataFrame:
+        """
+        Evaluate n_iter random parameter sets on the full data
+
+        :param param_distributions: see sample_params
+        :type param_distributions: dict[str, list | tuple]
+        :param n_iter: amount of parameter sets
+        :type n_iter: int
+        :param seed: seed of the random generator
+        :type seed: int | None
+        :returns: pl.DataFrame of params and metrics, ranked by self.metric
+        """
+        param_sets = sample_params(param_distributions, n_iter=n_iter, seed=seed)
+        results = self._evaluate([(params, None, None) for params in param_sets])
+        return self._rank(param_sets, results)
+
+    @log_execution
+    def walk_forward(
+        self,
+        param_grid: dict[str, list],
+        train_size: int,
+        test_size: int,
+        step: int | None = None,
+    ) -> DataFrame:
+        """
+        Walk-forward optimisation. For every window the grid is evaluated on the train
+        part, the best parameter set is picked by self.metric and re-run out of sample
+        on the following test part.
+
+        :param param_grid: {param: [values]}
+        :type param_grid: dict[str, list]
+        :param train_size: amount of candles in a train window
+        :type train_size: int
+        :param test_size: amount of candles in a test window
+        :type test_size: int
+        :param step: shift between windows in candles, test_size if None
+        :type step: int | None
+        :returns: pl.DataFrame with one row per window: best params, train and test metrics
+        """
+        step = step or test_size
+        param_sets = expand_grid(param_grid)
+        windows = self._get_walk_forward_windows(train_size, test_size, step)
+        if not windows:
+            raise ValueError(
+                f"Not enough candles ({len(self.timeline)}) for train_size={train_size}"
+                f" and test_size={test_size}"
+            )
+
+        train_tasks = [
+            (params, train_start, train_end)
+            for train_start, train_end, _, _ in windows
+            for params in param_sets
+        ]
+        train_results = self._evaluate(train_tasks)
+
+        best_params = []
+        for window_id in range(len(windows)):
+            window_results = train_results[
+                window_id * len(param_sets) : (window_id + 1) * len(param_sets)
+            ]
+            best_params.append(self._pick_best(param_sets, window_results))
+
+        test_tasks = [
+            (params, test_start, test_end)
+            for (_, _, test_start, test_end), (params, _) in zip(windows, best_params)
+        ]
+        test_results = self._evaluate(test_tasks)
+
+        rows = []
+        for window_id, (window, (params, train_metrics), test_metrics) in enumerate(
+            zip(windows, best_params, test_results)
+        ):
+            train_start, train_end, test_start, test_end = window
+            row = {
+                "window": window_id,
+                "train_start": train_start,
+                "train_end": train_end,
+                "test_start": test_start,
+                "test_end": test_end,
+            }
+            row.update(params)
+            row.update({f"train {self.metric}": train_metrics.get(self.metric)})
+            row.update(
+                {f"test {title}": value for title, value in test_metrics.items()}
+            )
+            rows.append(row)
+
+        return DataFrame(rows, infer_schema_length=None)
+
+    # ---=== HELPER METHODS ===---
+    def _evaluate(
+        self,
+        tasks: list[tuple[dict, int | None, int | None]],
+        on_result: Callable[[int, dict], None] | None = None,
+    ) -> list[dict]:
+        """
+        Run tasks in the process pool, preserving their order
+
+        :param tasks: [(params, start_time, end_time)]
+        :type tasks: list[tuple]
+        :param on_result: called with (task index, metrics) as soon as a task is done
+        :type on_result: Callable[[int, dict], None] | None
+        :returns: list of metrics, one per task
+        """
+        if not tasks:
+            return []
+
+        metrics = []
+        with SharedMarketData(self.data) as shared_data:
+            with ProcessPoolExecutor(
+                max_workers=self.n_jobs,
+                mp_context=get_context("spawn"),
+                initializer=init_worker,
+                initargs=(
+                    shared_data.descriptor,
+                    self.strategy_class,
+                    self.worker_log_level,
+                ),
+            ) as executor:
+                for result in tqdm(
+                    executor.map(run_backtest_task, tasks),
+                    total=len(tasks),
+                    desc="Running backtests",
+                ):
+                    if on_result is not None:
+                        on_result(len(metrics), result)
+                    metrics.append(result)
+
+        return metrics
+
+    def _rank(self, param_sets: list[dict], results: list[dict]) -> DataFrame:
+        df = DataFrame(
+            [{**params, **result} for params, result in zip(param_sets, results)],
+            infer_schema_length=None,
+        )
+        if self.metric not in df.columns:
+            self.logger.warning(f"Metric {self.metric} is missing in the results")
+            return df
+        return (
+            df.with_columns(col(self.metric).fill_nan(None))
+            .sort(self.metric, descending=self.maximize, nulls_last=True)
+            .with_columns(int_range(1, df.height + 1).alias("rank"))
+        )
+
+    def _pick_best(self, param_sets: list[dict], results: list[dict]):
+        scored = [
+            (params, result)
+            for params, result in zip(param_sets, results)
+            if result.get(self.metric) is not None and not isnan(result[self.metric])
+        ]
+        if not scored:
+            self.logger.warning("No valid train results in window, using first params")
+            return param_sets[0], results[0]
+        pick = max if self.maximize else min
+        return pick(scored, key=lambda item: item[1][self.metric])
+
+    def _get_walk_forward_windows(self, train_size: int, test_size: int, step: int):
+        windows = []
+        start = 0
+        while start + train_size + test_size <= len(self.timeline):
+            train_end = start + train_size
+            windows.append(
+                (
+                    self.timeline[start],
+                    self.timeline[train_end - 1],
+                    self.timeline[train_end],
+                    self.timeline[train_end + test_size - 1],
+                )
+            )
+            start += step
+        return windows
@@ -0,0 +1,69 @@
+from io import BytesIO
+from multiprocessing.shared_memory import SharedMemory
+from polars import DataFrame, from_arrow
+from pyarrow import ipc, py_buffer
+
+
+class SharedMarketData:
+    """
+    Market data placed once into a shared memory block, so worker processes
+    can attach to it instead of receiving a pickled copy with every task.
+    """
+
+    def __init__(self, data: dict[str, DataFrame]):
+        payloads = {}
+        for symbol, df in data.items():
+            buffer = BytesIO()
+            df.write_ipc(buffer, compression="uncompressed")
+            payloads[symbol] = buffer.getvalue()
+
+        total_size = max(sum(len(payload) for payload in payloads.values()), 1)
+        self.shared_memory = SharedMemory(create=True, size=total_size)
+
+        self.layout = {}
+        offset = 0
+        for symbol, payload in payloads.items():
+            self.shared_memory.buf[offset : offset + len(payload)] = payload
+            self.layout[symbol] = (offset, len(payload))
+            offset += len(payload)
+
+    @property
+    def descriptor(self) -> tuple[str, dict[str, tuple[int, int]]]:
+        """
+        Picklable handle that workers pass to `attach_shared_market_data`
+
+        :returns: shared memory name, {symbol: (offset, size)}
+        """
+        return self.shared_memory.name, self.layout
+
+    def close(self):
+        self.shared_memory.close()
+        self.shared_memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def attach_shared_market_data(
+    descriptor: tuple[str, dict[str, tuple[int, int]]],
+) -> tuple[SharedMemory, dict[str, DataFrame]]:
+    """
+    Attach to a block created by SharedMarketData. Frames are zero-copy views
+    over the shared buffer, so the returned SharedMemory must outlive them.
+
+    :param descriptor: SharedMarketData.descriptor
+    :type descriptor: tuple
+    :returns: attached shared memory, {symbol: pl.DataFrame}
+    """
+    name, layout = descriptor
+    shared_memory = SharedMemory(name=name, track=False)
+
+    data = {}
+    for symbol, (offset, size) in layout.items():
+        reader = ipc.open_file(py_buffer(shared_memory.buf[offset : offset + size]))
+        data[symbol] = from_arrow(reader.read_all())
+
+    return shared_memory, data
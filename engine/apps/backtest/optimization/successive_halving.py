@@ -0,0 +1,287 @@
+from engine.apps.backtest.optimization.optimizer import expand_grid, StrategyOptimizer
+from json import dumps, JSONDecodeError, loads
+from math import ceil, isnan, log
+from os import path
+from polars import col, DataFrame, int_range
+from utils.logger.logger import LoggerWrapper, log_execution
+
+
+class SuccessiveHalvingSearch(StrategyOptimizer):
+    def __init__(
+        self,
+        data: dict[str, DataFrame],
+        strategy_class: type,
+        metric: str = "Sharpe Ratio 1Y",
+        maximize: bool = True,
+        eta: int = 3,
+        min_candles: int | None = None,
+        state_path: str | None = None,
+        n_jobs: int | None = None,
+        log_level: int = 10,
+        worker_log_level: int = 30,
+    ):
+        """
+        Early-stopping search. All parameter sets are backtested on a short prefix of
+        the data, only the best 1/eta of them by `metric` are extended to an eta times
+        longer prefix, until the survivors are evaluated on the full data.
+
+        :param data: {symbol: klines}, same layout as for BackTest
+        :type data: dict[str, pl.DataFrame]
+        :param strategy_class: Strategy subclass to optimise
+        :type strategy_class: type
+        :param metric: MetricsGenerator general metric used for pruning
+        :type metric: str
+        :param maximize: keep the highest values if True, the lowest otherwise
+        :type maximize: bool
+        :param eta: reduction factor between rungs
+        :type eta: int
+        :param min_candles: prefix length of the first rung, derived from the amount
+            of parameter sets if None
+        :type min_candles: int | None
+        :param state_path: json lines file with the search settings and finished
+            evaluations, used to resume
+        :type state_path: str | None
+        :param n_jobs: amount of worker processes, cpu count if None
+        :type n_jobs: int | None
+        :param log_level: log level of the search
+        :type log_level: int
+        :param worker_log_level: log level of the backtests inside workers
+        :type worker_log_level: int
+        """
+        super().__init__(
+            data=data,
+            strategy_class=strategy_class,
+            metric=metric,
+            maximize=maximize,
+            n_jobs=n_jobs,
+            log_level=log_level,
+            worker_log_level=worker_log_level,
+        )
+        self.logger = LoggerWrapper(name="Successive Halving Module", level=log_level)
+
+        if eta < 2:
+            raise ValueError(f"eta must be at least 2, got {eta}")
+        self.eta = eta
+        self.min_candles = min_candles
+        self.state_path = state_path
+        self.compute_report = {}
+
+    @log_execution
+    def run(
+        self,
+        param_grid: dict[str, list] | None = None,
+        param_sets: list[dict] | None = None,
+        resume: bool = False,
+    ) -> DataFrame:
+        """
+        Run the search over a grid or an explicit list of parameter sets
+
+        :param param_grid: {param: [values]}
+        :type param_grid: dict[str, list] | None
+        :param param_sets: flat parameter sets, e.g. from sample_params
+        :type param_sets: list[dict] | None
+        :param resume: reuse evaluations stored in state_path, the search settings
+            must match
+        :type resume: bool
+        :returns: pl.DataFrame with the last rung and metrics of every parameter set
+        """
+        if param_sets is None:
+            if param_grid is None:
+                raise ValueError("Either param_grid or param_sets must be provided")
+            param_sets = expand_grid(param_grid)
+
+        search = self._get_search(param_sets)
+        state = self._load_state(search) if resume else None
+        if state is None:
+            state = {"search": search, "evaluations": {}}
+            self._write_state_header(search)
+
+        total_candles = len(self.timeline)
+        candles = min(self._get_min_candles(len(param_sets)), total_candles)
+        survivors = list(range(len(param_sets)))
+        last_results = {}
+        rung = 0
+
+        while True:
+            self.logger.info(
+                f"Rung {rung}: {len(survivors)} parameter sets on {candles} candles"
+            )
+            results = self._evaluate_rung(state, param_sets, survivors, candles)
+            for index in survivors:
+                last_results[index] = (rung, candles, results[index])
+
+            if candles >= total_candles:
+                break
+
+            survivors = self._select_survivors(survivors, results)
+            candles = min(candles * self.eta, total_candles)
+            rung += 1
+
+        self._build_compute_report(state, len(param_sets), total_candles)
+        return self._rank_rungs(param_sets, last_results)
+
+    # ---=== HELPER METHODS ===---
+    def _evaluate_rung(
+        self, state: dict, param_sets: list[dict], survivors: list[int], candles: int
+    ) -> dict[int, dict]:
+        """
+        Evaluate survivors on the first `candles` candles, skipping stored results
+        """
+        stored = state["evaluations"].setdefault(str(candles), {})
+        missing = [index for index in survivors if str(index) not in stored]
+        if len(missing) < len(survivors):
+            self.logger.info(
+                f"Reusing {len(survivors) - len(missing)} stored evaluations"
+            )
+
+        start_time = self.timeline[0]
+        end_time = self.timeline[candles - 1]
+        tasks = [(param_sets[index], start_time, end_time) for index in missing]
+
+        def store_result(task_index: int, metrics: dict):
+            stored[str(missing[task_index])] = metrics
+            self._append_evaluation(candles, missing[task_index], metrics)
+
+        self._evaluate(tasks, on_result=store_result)
+
+        return {index: stored[str(index)] for index in survivors}
+
+    def _select_survivors(
+        self, survivors: list[int], results: dict[int, dict]
+    ) -> list[int]:
+        keep = max(ceil(len(survivors) / self.eta), 1)
+
+        def score(index: int) -> float:
+            value = results[index].get(self.metric)
+            if value is None or isnan(value):
+                return float("-inf")
+            return value if self.maximize else -value
+
+        return sorted(survivors, key=score, reverse=True)[:keep]
+
+    def _get_min_candles(self, n_param_sets: int) -> int:
+        if self.min_candles is not None:
+            return self.min_candles
+        rungs = max(ceil(log(max(n_param_sets, 1)) / log(self.eta)), 1)
+        return max(ceil(len(self.timeline) / self.eta ** (rungs - 1)), 1)
+
+    def _build_compute_report(self, state: dict, n_param_sets: int, total_candles: int):
+        evaluated_candles = sum(
+            metrics.get("Candles", 0)
+            for evaluations in state["evaluations"].values()
+            for metrics in evaluations.values()
+        )
+        full_grid_candles = n_param_sets * total_candles
+        saved_pct = (1 - evaluated_candles / full_grid_candles) * 100
+
+        self.compute_report = {
+            "Evaluated candles": evaluated_candles,
+            "Full grid candles": full_grid_candles,
+            "Compute saved (%)": saved_pct,
+        }
+
+        print(" === SUCCESSIVE HALVING ===")
+        for title, value in self.compute_report.items():
+            if isinstance(value, float):
+                print(f"{title}: {value:.2f}")
+            else:
+                print(f"{title}: {value}")
+        print(" === END ===")
+
+    def _rank_rungs(self, param_sets: list[dict], last_results: dict) -> DataFrame:
+        rows = []
+        for index, (rung, _, metrics) in last_results.items():
+            rows.append({**param_sets[index], "rung": rung, **metrics})
+
+        df = DataFrame(rows, infer_schema_length=None)
+        if self.metric not in df.columns:
+            self.logger.warning(f"Metric {self.metric} is missing in the results")
+            return df
+
+        return (
+            df.with_columns(col(self.metric).fill_nan(None))
+            .sort(
+                ["rung", self.metric],
+                descending=[True, self.maximize],
+                nulls_last=True,
+            )
+            .with_columns(int_range(1, df.height + 1).alias("rank"))
+        )
+
+    def _get_search(self, param_sets: list[dict]) -> dict:
+        """
+        Everything the stored evaluations depend on, a resumed search must match
+        """
+        return {
+            "param_sets": param_sets,
+            "symbols": sorted(self.data),
+            "start_time": int(self.timeline[0]),
+            "end_time": int(self.timeline[-1]),
+            "total_candles": len(self.timeline),
+            "metric": self.metric,
+            "maximize": self.maximize,
+            "eta": self.eta,
+            "min_candles": self.min_candles,
+        }
+
+    def _load_state(self, search: dict) -> dict | None:
+        """
+        Read a state written by _write_state_header and _append_evaluation. A
+        truncated last line, from a crash while writing, is dropped.
+        """
+        if self.state_path is None or not path.exists(self.state_path):
+            self.logger.warning("No search state to resume from, starting over")
+            return None
+
+        with open(self.state_path) as f:
+            lines = f.read().splitlines()
+
+        header = loads(lines[0]) if lines else {}
+        stored_search = header.get("search")
+        if stored_search is None:
+            raise ValueError(f"{self.state_path} is not a successive halving state")
+        # compare after a json round trip, e.g. tuples are stored as lists
+        expected = loads(dumps(search))
+        mismatched = [
+            key for key in expected if stored_search.get(key) != expected[key]
+        ]
+        if mismatched:
+            raise ValueError(
+                f"Search state in {self.state_path} does not match the requested "
+                f"search: {', '.join(mismatched)} differ"
+            )
+
+        evaluations = {}
+        for number, line in enumerate(lines[1:], start=2):
+            try:
+                record = loads(line)
+            except JSONDecodeError:
+                if number < len(lines):
+                    raise
+                self.logger.warning(f"Dropping truncated line {number}")
+                # later evaluations are appended after the complete lines
+                with open(self.state_path, "w") as f:
+                    f.write("\n".join(lines[:-1]) + "\n")
+                break
+            evaluations.setdefault(str(record["candles"]), {})[str(record["index"])] = (
+                record["metrics"]
+            )
+        return {"search": search, "evaluations": evaluations}
+
+    def _write_state_header(self, search: dict):
+        if self.state_path is None:
+            return
+
+        with open(self.state_path, "w") as f:
+            f.write(dumps({"search": search}) + "\n")
+
+    def _append_evaluation(self, candles: int, index: int, metrics: dict):
+        """
+        One line per finished backtest, so saving does not grow with the search
+        """
+        if self.state_path is None:
+            return
+
+        record = {"candles": candles, "index": index, "metrics": metrics}
+        with open(self.state_path, "a") as f:
+            f.write(dumps(record) + "\n")
@@ -0,0 +1,184 @@
+from engine.apps.backtest.analytics.metrics import MetricsGenerator
+from engine.apps.backtest.engine import BackTest
+from engine.apps.backtest.optimization.shared_data import attach_shared_market_data
+from engine.core.strategies.strategy import Strategy
+from inspect import Parameter, signature
+from numpy import nan
+from polars import col, DataFrame
+from utils.logger.logger import LoggerWrapper
+
+BACKTEST_PARAMETERS = ("initial_balance", "leverage", "maker_fee", "taker_fee")
+
+_worker_state = {}
+
+
+def split_params(params: dict) -> tuple[dict, dict]:
+    """
+    Split a flat parameter set into strategy and BackTest keyword arguments
+
+    :param params: flat parameter set, e.g. {"rsi_period": 14, "leverage": 4}
+    :type params: dict
+    :returns: strategy params, backtest params
+    """
+    strategy_params = {
+        key: value for key, value in params.items() if key not in BACKTEST_PARAMETERS
+    }
+    backtest_params = {
+        key: value for key, value in params.items() if key in BACKTEST_PARAMETERS
+    }
+    return strategy_params, backtest_params
+
+
+def create_strategy(
+    strategy_class: type[Strategy], strategy_params: dict, log_level: int
+) -> Strategy:
+    """
+    Instantiate a strategy, passing log_level only if its constructor accepts it
+
+    :param strategy_class: Strategy subclass
+    :type strategy_class: type[Strategy]
+    :param strategy_params: keyword arguments of the strategy
+    :type strategy_params: dict
+    :param log_level: log level of the strategy logger
+    :type log_level: int
+    :returns: Strategy instance
+    """
+    parameters = signature(strategy_class).parameters
+    if "log_level" in parameters or any(
+        parameter.kind == Parameter.VAR_KEYWORD for parameter in parameters.values()
+    ):
+        strategy_params = {"log_level": log_level, **strategy_params}
+    return strategy_class(**strategy_params)
+
+
+def slice_market_data(
+    data: dict[str, DataFrame],
+    start_time: int | None = None,
+    end_time: int | None = None,
+) -> dict[str, DataFrame]:
+    """
+    Restrict every symbol frame to open_time in [start_time, end_time]
+
+    :param data: {symbol: klines}
+    :type data: dict[str, pl.DataFrame]
+    :param start_time: first open_time to keep, UNIX ms
+    :type start_time: int | None
+    :param end_time: last open_time to keep, UNIX ms
+    :type end_time: int | None
+    :returns: {symbol: sliced klines}
+    """
+    if start_time is None and end_time is None:
+        return data
+
+    condition = col("open_time").is_not_null()
+    if start_time is not None:
+        condition = condition & (col("open_time") >= start_time)
+    if end_time is not None:
+        condition = condition & (col("open_time") <= end_time)
+
+    return {symbol: df.filter(condition) for symbol, df in data.items()}
+
+
+def evaluate_backtest(
+    data: dict[str, DataFrame],
+    strategy_class: type,
+    params: dict,
+    log_level: int = 30,
+    start_time: int | None = None,
+    end_time: int | None = None,
+) -> dict:
+    """
+    Run one BackTest for a parameter set and return its general metrics
+
+    :param data: {symbol: klines}
+    :type data: dict[str, pl.DataFrame]
+    :param strategy_class: Strategy subclass, instantiated with the strategy params
+    :type strategy_class: type
+    :param params: flat parameter set, see split_params
+    :type params: dict
+    :param log_level: log level of the backtest modules
+    :type log_level: int
+    :param start_time: first open_time of the window, UNIX ms
+    :type start_time: int | None
+    :param end_time: last open_time of the window, UNIX ms
+    :type end_time: int | None
+    :returns: MetricsGenerator general metrics plus "Candles" evaluated
+    """
+    logger = LoggerWrapper(name="Optimization Worker Module", level=log_level)
+
+    window = slice_market_data(data, start_time=start_time, end_time=end_time)
+    candles = next(iter(window.values())).height
+    if candles == 0:
+        logger.warning(f"Empty window {start_time} - {end_time}, skipping {params}")
+        return {"Candles": 0}
+
+    strategy_params, backtest_params = split_params(params)
+    strategy = create_strategy(strategy_class, strategy_params, log_level)
+    backtest = BackTest(
+        data=window,
+        strategy=strategy,
+        log_level=log_level,
+        checkpoint_dir=None,
+        **backtest_params,
+    )
+    backtest.run()
+
+    (
+        equity_history,
+        trade_history,
+        order_history,
+        current_positions,
+        initial_balance,
+    ) = backtest.portfolio.get_metrics()
+
+    metrics = {}
+    if trade_history.is_empty():
+        logger.warning(f"No trades in {start_time} - {end_time} for {params}")
+    else:
+        try:
+            metrics = MetricsGenerator(
+                equity_history=equity_history,
+                trade_history=trade_history,
+                order_history=order_history,
+                current_positions=current_positions,
+                initial_balance=initial_balance,
+                log_level=log_level,
+            ).generate_general_metrics()
+        except ZeroDivisionError as e:
+            # equity curve of a single timestamp, nothing to annualize
+            logger.warning(f"Failed to compute metrics for {params}: {e}")
+
+    metrics = {
+        title: nan if value is None else float(value)
+        for title, value in metrics.items()
+    }
+    metrics.update({"Total Trades": trade_history.height, "Candles": candles})
+    return metrics
+
+
+def init_worker(descriptor, strategy_class: type, log_level: int):
+    """ProcessPoolExecutor initializer. Attaches the shared market data once."""
+    shared_memory, data = attach_shared_market_data(descriptor)
+    _worker_state.update(
+        {
+            "shared_memory": shared_memory,
+            "data": data,
+            "strategy_class": strategy_class,
+            "log_level": log_level,
+        }
+    )
+
+
+def run_backtest_task(task: tuple[dict, int | None, int | None]) -> dict:
+    """
+    Pool task: (params, start_time, end_time) -> metrics. Requires init_worker.
+    """
+    params, start_time, end_time = task
+    return evaluate_backtest(
+        data=_worker_state["data"],
+        strategy_class=_worker_state["strategy_class"],
+        params=params,
+        log_level=_worker_state["log_level"],
+        start_time=start_time,
+        end_time=end_time,
+    )
@@ -1,19 +1,52 @@
 from collections import defaultdict
-from polars import col, concat, DataFrame, lit, when
+from numpy import asarray, float64
+from polars import col, concat, DataFrame, Float64, int_range, lit, when
 from utils.global_variables.SCHEMAS import (
     TRADE_HISTORY_SCHEMA,
     ORDER_HISTORY_SCHEMA,
+    PORTFOLIO_ORDER_HISTORY_SCHEMA,
     POSITIONS_SCHEMA,
 )
 from utils.logger.logger import LoggerWrapper
 
+# order types simulated by the matching engine, everything else fills at the close
+RESTING_ORDER_TYPES = ("LIMIT", "STOP")
+
 
 class Portfolio:
-    def __init__(self, initial_balance, leverage, maker_fee, taker_fee, log_level):
+    def __init__(
+        self,
+        initial_balance,
+        leverage,
+        maker_fee,
+        taker_fee,
+        log_level,
+        intrabar_resolver=None,
+        slippage_model=None,
+        margin_engine=None,
+        matching_engine=None,
+    ):
+        """
+        :param intrabar_resolver: decides TP vs SL when a candle touches both barriers
+            (see IntrabarResolver), take profit wins if None
+        :type intrabar_resolver: IntrabarResolver | None
+        :param slippage_model: fill price and filled fraction of market orders (see
+            slippage.py), orders fill completely at the close if None
+        :type slippage_model: SlippageModel | None
+        :param margin_engine: liquidates positions whose isolated margin falls to the
+            tiered maintenance margin (see margin.py), positions are never
+            liquidated if None
+        :type margin_engine: MarginEngine | None
+        :param matching_engine: fills LIMIT and STOP orders by replaying trades (see
+            matching.py), they fill at the close like MARKET orders if None
+        :type matching_engine: MatchingEngine | None
+        """
         self.logger = LoggerWrapper(name="Portfolio Module", level=log_level)
 
         self.trade_history = DataFrame(schema=TRADE_HISTORY_SCHEMA, orient="row")
-        self.order_history = DataFrame(schema=ORDER_HISTORY_SCHEMA, orient="row")
+        self.order_history = DataFrame(
+            schema=PORTFOLIO_ORDER_HISTORY_SCHEMA, orient="row"
+        )
         self.current_positions = DataFrame(schema=POSITIONS_SCHEMA, orient="row")
         self.order_id = 0
         self.equity = initial_balance
@@ -23,6 +56,12 @@ class Portfolio:
         self.initial_capital = initial_balance
         self.maker_fee = maker_fee
         self.taker_fee = taker_fee
+        self.intrabar_resolver = intrabar_resolver
+        self.slippage_model = slippage_model
+        self.margin_engine = margin_engine
+        self.matching_engine = matching_engine
+        # {order_id: FILL_SCHEMA row} of resting orders matched but not filled yet
+        self.order_fills = {}
 
     def get_metrics(self):
         return (
@@ -33,10 +72,39 @@ class Portfolio:
             self.initial_capital,
         )
 
+    def get_state(self) -> dict:
+        return {
+            "trade_history": self.trade_history,
+            "order_history": self.order_history,
+            "current_positions": self.current_positions,
+            "order_id": self.order_id,
+            "equity": self.equity,
+            "equity_history": self.equity_history,
+            "order_fills": self.order_fills,
+        }
+
+    def set_state(self, state: dict):
+        self.trade_history = state["trade_history"]
+        self.order_history = state["order_history"]
+        self.current_positions = state["current_positions"]
+        self.order_id = state["order_id"]
+        self.equity = state["equity"]
+        self.equity_history = state["equity_history"]
+        self.order_fills = state["order_fills"]
+
     def update_orders(self, order):
+        """
+        :param order: one order or a block of orders, every row gets its own id
+        :type order: pl.DataFrame | dict
+        """
         order = DataFrame(schema=ORDER_HISTORY_SCHEMA, data=order)
-        order = order.with_columns(lit(self.order_id).alias("order_id"))
-        self.order_id += 1
+        if order.is_empty():
+            return
+        order = order.with_columns(
+            int_range(self.order_id, self.order_id + order.height).alias("order_id"),
+            lit(None, dtype=Float64).alias("filled_volume"),
+        )
+        self.order_id += order.height
         order = order.cast(self.order_history.schema)
         self.order_history = concat([self.order_history, order])
 
@@ -44,41 +112,192 @@ class Portfolio:
         orders_to_be_executed = self.order_history.filter(
             (col("status") == "PENDING") & (col("symbol") == symbol)
         )
+        if not orders_to_be_executed.is_empty() and self.matching_engine is not None:
+            resting = col("order_type").is_in(RESTING_ORDER_TYPES)
+            self._execute_resting_orders(orders_to_be_executed.filter(resting), series)
+            orders_to_be_executed = orders_to_be_executed.filter(~resting)
         if not orders_to_be_executed.is_empty():
             self._execute_orders(orders_to_be_executed, series)
 
         self._update_positions_stats(symbol=symbol, series=series)
 
     def _execute_orders(self, orders, series):
-        for order in orders.to_dicts():
-            position = {
-                "order_id": order["order_id"],
-                "symbol": order["symbol"],
-                "volume": order["volume"] * self.leverage,
-                "direction": order["direction"],
-                "entry_time": series["open_time"],
-                "entry_price": series["close"],
-                "leverage": self.leverage,
-                "strategy": order["strategy"],
-                "unrealized_pnl": 0,
-                "realized_pnl": 0,
-                "take_profit": order["take_profit"],
-                "stop_loss": order["stop_loss"],
-            }
-            if position["volume"] > self.equity:
-                self.logger.warning("Not enough money!")
-                continue
-            self.equity -= position["volume"] / self.leverage
-
-            new_position = DataFrame(position).cast(self.current_positions.schema)
-            self.current_positions = concat([self.current_positions, new_position])
-
-            self.order_history = self.order_history.with_columns(
-                when(col("order_id") == order["order_id"])
-                .then(lit("FILLED"))
-                .otherwise(col("status"))
-                .alias("status")
+        """
+        MARKET orders are immediate or cancel: they fill at the candle as far as
+        the slippage model finds liquidity and the remainder is cancelled. The
+        filled volume is recorded on the order, which is PARTIALLY_FILLED then, or
+        EXPIRED when nothing could be filled.
+        """
+        fill_prices, fractions = self._get_fills(orders, series)
+        liquidation_prices = self._get_liquidation_prices(
+            orders, fill_prices, fractions
+        )
+        for i, order in enumerate(orders.to_dicts()):
+            volume = order["volume"] * self.leverage * fractions[i]
+            opened = self._open_position(
+                order=order,
+                volume=volume,
+                entry_time=series["open_time"],
+                entry_price=fill_prices[i],
+                entry_fee=volume * self.maker_fee,
+                liquidation_price=liquidation_prices[i],
+                status="FILLED" if fractions[i] == 1 else "PARTIALLY_FILLED",
+            )
+            if not opened and not volume:
+                self._set_order_status(order["order_id"], "EXPIRED", 0.0)
+
+    def _execute_resting_orders(self, orders, series):
+        """
+        LIMIT and STOP orders are submitted to the matching engine when the candle
+        that created them closes, and become positions at the candle holding their
+        fill time, with the fill price and the maker or taker fee of the fill.
+        Orders the matching engine expires without any fill become EXPIRED.
+        """
+        if orders.is_empty():
+            return
+        time_column = "close_time" if "close_time" in series.columns else "open_time"
+        close_time = series[time_column][-1]
+
+        new = orders.filter(~col("order_id").is_in(list(self.order_fills)))
+        if not new.is_empty():
+            fills = self.matching_engine.match(
+                new.with_columns(
+                    lit(close_time).alias("order_time"),
+                    (col("volume") * self.leverage).alias("volume"),
+                )
             )
+            self.order_fills.update(
+                {fill["order_id"]: fill for fill in fills.to_dicts()}
+            )
+
+        for order_id in orders["order_id"]:
+            if self.order_fills[order_id]["status"] == "EXPIRED":
+                self.order_fills.pop(order_id)
+                self._set_order_status(order_id, "EXPIRED", 0.0)
+
+        filled = orders.filter(
+            col("order_id").is_in(
+                [
+                    order_id
+                    for order_id in orders["order_id"]
+                    if order_id in self.order_fills
+                    and self.order_fills[order_id]["fill_time"] is not None
+                    and self.order_fills[order_id]["fill_time"] <= close_time
+                ]
+            )
+        )
+        if filled.is_empty():
+            return
+
+        fills = [self.order_fills.pop(order_id) for order_id in filled["order_id"]]
+        fill_prices = [fill["fill_price"] for fill in fills]
+        # filled quantity over ordered quantity
+        fractions = [
+            fill["filled_volume"]
+            / fill["fill_price"]
+            * order["entry_price"]
+            / (order["volume"] * self.leverage)
+            for fill, order in zip(fills, filled.to_dicts())
+        ]
+        liquidation_prices = self._get_liquidation_prices(
+            filled, fill_prices, fractions
+        )
+        for i, (fill, order) in enumerate(zip(fills, filled.to_dicts())):
+            opened = self._open_position(
+                order=order,
+                volume=order["volume"] * self.leverage * fractions[i],
+                entry_time=fill["fill_time"],
+                entry_price=fill["fill_price"],
+                entry_fee=fill["fee"],
+                liquidation_price=liquidation_prices[i],
+                status=fill["status"],
+            )
+            if not opened:
+                # the fill is in the past, the order can not be retried later
+                self._set_order_status(order["order_id"], "REJECTED", 0.0)
+
+    def _open_position(
+        self,
+        order,
+        volume,
+        entry_time,
+        entry_price,
+        entry_fee,
+        liquidation_price,
+        status,
+    ) -> bool:
+        """
+        :returns: False if the order could not be filled, its status is left to the
+            caller then
+        """
+        position = {
+            "order_id": order["order_id"],
+            "symbol": order["symbol"],
+            "volume": volume,
+            "direction": order["direction"],
+            "entry_time": entry_time,
+            "entry_price": entry_price,
+            "leverage": self.leverage,
+            "strategy": order["strategy"],
+            "unrealized_pnl": 0,
+            "realized_pnl": 0,
+            "take_profit": order["take_profit"],
+            "stop_loss": order["stop_loss"],
+            "liquidation_price": liquidation_price,
+            "entry_fee": entry_fee,
+        }
+        if not position["volume"]:
+            self.logger.warning("No liquidity to fill the order")
+            return False
+        if position["volume"] > self.equity:
+            self.logger.warning("Not enough money!")
+            return False
+        self.equity -= position["volume"] / self.leverage
+
+        new_position = DataFrame(position).cast(self.current_positions.schema)
+        self.current_positions = concat([self.current_positions, new_position])
+        self._set_order_status(order["order_id"], status, volume / self.leverage)
+        return True
+
+    def _set_order_status(self, order_id, status, filled_volume):
+        is_order = col("order_id") == order_id
+        self.order_history = self.order_history.with_columns(
+            when(is_order).then(lit(status)).otherwise(col("status")).alias("status"),
+            when(is_order)
+            .then(lit(filled_volume, dtype=Float64))
+            .otherwise(col("filled_volume"))
+            .alias("filled_volume"),
+        )
+
+    def _get_fills(self, orders, series) -> tuple[list, list]:
+        """
+        Entry price and filled fraction of every order, one slippage model call for
+        all orders of the candle
+        """
+        if self.slippage_model is None:
+            return [series["close"]] * orders.height, [1] * orders.height
+        close = series["close"][-1]
+        prices, fractions = self.slippage_model.get_fills(
+            symbol=orders["symbol"][0],
+            timestamp=series["open_time"][-1],
+            directions=orders["direction"].to_numpy(),
+            notionals=orders["volume"].to_numpy() * self.leverage,
+            reference_prices=[close] * orders.height,
+        )
+        return prices.tolist(), fractions.tolist()
+
+    def _get_liquidation_prices(self, orders, fill_prices, fractions) -> list:
+        if self.margin_engine is None:
+            return [None] * orders.height
+        notionals = orders["volume"].to_numpy() * self.leverage * asarray(fractions)
+        return self.margin_engine.get_liquidation_prices(
+            symbol=orders["symbol"][0],
+            directions=orders["direction"].to_numpy(),
+            # fills at the close are one row Series
+            entry_prices=asarray(fill_prices, dtype=float64).reshape(orders.height),
+            notionals=notionals,
+            margins=notionals / self.leverage,
+        ).tolist()
 
     def _record_trade(self, position, closed_by, timestamp):
         self.current_positions = self.current_positions.filter(
@@ -100,10 +319,12 @@ class Portfolio:
                 volume=position["volume"],
                 direction=position["direction"],
             )
+        elif closed_by == "LIQUIDATION":
+            # the whole isolated margin is lost, the rest goes to the insurance fund
+            pnl = -position["volume"] / self.leverage
 
-        commissions = (
-            position["volume"] * self.maker_fee + position["volume"] * self.taker_fee
-        )
+        # the entry fee depends on how the order was filled, exits pay taker
+        commissions = position["entry_fee"] + position["volume"] * self.taker_fee
 
         trade = {
             "order_id": position["order_id"],
@@ -135,17 +356,19 @@ class Portfolio:
         timestamp = series["open_time"][-1]
 
         positions_by_symbol = self.current_positions.filter(col("symbol") == symbol)
+        if self.margin_engine is not None and not positions_by_symbol.is_empty():
+            positions_by_symbol = self._liquidate_positions(
+                positions_by_symbol, high, low, timestamp
+            )
 
         for position in positions_by_symbol.to_dicts():
             if position["direction"] == "BUY" and symbol == position["symbol"]:
-                if high > position["take_profit"]:
-                    closed_by = "TP"
-                    self._record_trade(
-                        position=position, closed_by=closed_by, timestamp=timestamp
+                tp_hit = high > position["take_profit"]
+                sl_hit = low < position["stop_loss"]
+                if tp_hit or sl_hit:
+                    closed_by = self._get_closed_by(
+                        symbol, timestamp, position, tp_hit, sl_hit
                     )
-
-                elif low < position["stop_loss"]:
-                    closed_by = "SL"
                     self._record_trade(
                         position=position, closed_by=closed_by, timestamp=timestamp
                     )
@@ -167,14 +390,12 @@ class Portfolio:
                     )
 
             else:
-                if low < position["take_profit"]:
-                    closed_by = "TP"
-                    self._record_trade(
-                        position=position, closed_by=closed_by, timestamp=timestamp
+                tp_hit = low < position["take_profit"]
+                sl_hit = high > position["stop_loss"]
+                if tp_hit or sl_hit:
+                    closed_by = self._get_closed_by(
+                        symbol, timestamp, position, tp_hit, sl_hit
                     )
-
-                elif high > position["stop_loss"]:
-                    closed_by = "SL"
                     self._record_trade(
                         position=position, closed_by=closed_by, timestamp=timestamp
                     )
@@ -208,6 +429,37 @@ class Portfolio:
         self.equity_history[symbol].update({timestamp: symbol_pnl})
         self.equity_history["General"].update({timestamp: total})
 
+    def _liquidate_positions(self, positions, high, low, timestamp):
+        """
+        Checks all positions of the candle at once and closes the liquidated ones
+
+        :returns: positions left for the take profit and stop loss checks
+        """
+        liquidated = self.margin_engine.find_liquidations(
+            directions=positions["direction"].to_numpy(),
+            liquidation_prices=positions["liquidation_price"].to_numpy(),
+            stop_losses=positions["stop_loss"].to_numpy(),
+            highs=high,
+            lows=low,
+        )
+        if not liquidated.any():
+            return positions
+        for position in positions.filter(liquidated).to_dicts():
+            self.logger.warning(f"Position {position['order_id']} liquidated")
+            self._record_trade(
+                position=position, closed_by="LIQUIDATION", timestamp=timestamp
+            )
+        return positions.filter(~liquidated)
+
+    def _get_closed_by(
+        self, symbol: str, timestamp: int, position: dict, tp_hit: bool, sl_hit: bool
+    ) -> str:
+        if tp_hit and sl_hit and self.intrabar_resolver is not None:
+            return self.intrabar_resolver.resolve(
+                symbol=symbol, timestamp=timestamp, position=position
+            )
+        return "TP" if tp_hit else "SL"
+
     def _calculate_symbol_pnl(self, symbol: str):
         symbol_data = self.current_positions.filter(col("symbol") == symbol)
         realized_total_pnl = self.trade_history.filter(col("symbol") == symbol)[
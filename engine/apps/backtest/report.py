@@ -3,6 +3,7 @@ from bokeh.plotting import figure, output_file, show
 from bokeh.models import ColumnDataSource, DatetimeTickFormatter
 from copy import deepcopy
 from engine.apps.backtest.analytics.metrics import MetricsGenerator
+from engine.apps.backtest.analytics.monte_carlo import MonteCarlo
 from io import BytesIO
 from matplotlib.pyplot import (
     close,
@@ -28,6 +29,7 @@ class ReportGenerator:
         self.log_level = log_level
         self.general_metrics = None
         self.symbol_wise_metrics = None
+        self.monte_carlo_metrics = None
 
     @log_execution
     def _generate_symbol_pnl_chart(self, equity_history):
@@ -132,6 +134,31 @@ class ReportGenerator:
 
         self._generate_general_chart(equity_history=equity_history)
 
+    @log_execution
+    def generate_monte_carlo_metrics(
+        self,
+        n_paths: int = 10000,
+        method: str = "bootstrap",
+        confidence: float = 0.95,
+        **kwargs,
+    ):
+        """
+        Resample the closed trades into alternative equity paths, see MonteCarlo.run
+        for the keyword arguments
+        """
+        monte_carlo = MonteCarlo.from_portfolio(
+            self.portfolio, log_level=self.log_level
+        )
+        results = monte_carlo.run(n_paths=n_paths, method=method, **kwargs)
+        self.monte_carlo_metrics = monte_carlo.get_metrics(results, confidence, method)
+
+        print(f" === MONTE CARLO METRICS ({method}) ===")
+
+        for title, value in self.monte_carlo_metrics.items():
+            print(f"{title}: {value:.2f}")
+
+        print(" === END ===")
+
     @log_execution
     def _generate_general_chart(self, equity_history):
         title = "General Equity Chart"
@@ -278,6 +305,17 @@ class ReportGenerator:
             y_pos -= 15
         y_pos -= 10
 
+        # Monte Carlo
+        if self.monte_carlo_metrics:
+            c.setFont("Helvetica-Bold", 14)
+            c.drawString(50, y_pos, "Monte Carlo Metrics:")
+            y_pos -= 20
+            c.setFont("Helvetica", 12)
+            for k, v in self.monte_carlo_metrics.items():
+                c.drawString(50, y_pos, f"{k}: {float(v):.2f}")
+                y_pos -= 15
+            y_pos -= 10
+
         # Best/Worst performers
         c.setFont("Helvetica-Bold", 14)
         c.drawString(
@@ -0,0 +1,247 @@
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from engine.apps.backtest.engine import BackTest
+from engine.apps.backtest.optimization.worker import create_strategy
+from engine.apps.backtest.portfolio import Portfolio
+from engine.apps.backtest.report import ReportGenerator
+from multiprocessing import get_context
+from polars import col, concat, DataFrame, Float64, Int64, lit, String, sum_horizontal
+from time import time
+from tqdm import tqdm
+from utils.logger.logger import LoggerWrapper, log_execution
+
+
+def run_sleeve(task: tuple) -> dict:
+    """
+    Pool task. Backtests one sleeve and returns its Portfolio books.
+
+    :param task: (data, strategy_class, strategy_params, backtest_params, log_level)
+    :type task: tuple
+    :returns: {"equity_history", "trade_history", "order_history", "current_positions",
+        "equity", "order_id"}
+    """
+    data, strategy_class, strategy_params, backtest_params, log_level = task
+    strategy = create_strategy(strategy_class, strategy_params, log_level)
+    backtest = BackTest(
+        data=data,
+        strategy=strategy,
+        log_level=log_level,
+        checkpoint_dir=None,
+        **backtest_params,
+    )
+    backtest.run()
+
+    portfolio = backtest.portfolio
+    return {
+        "equity_history": {
+            key: dict(history) for key, history in portfolio.equity_history.items()
+        },
+        "trade_history": portfolio.trade_history,
+        "order_history": portfolio.order_history,
+        "current_positions": portfolio.current_positions,
+        "equity": portfolio.equity,
+        "order_id": portfolio.order_id,
+    }
+
+
+class SleeveBackTest:
+    def __init__(
+        self,
+        data: dict[str, DataFrame],
+        strategy_class: type,
+        strategy_params: dict | None = None,
+        sleeves: list[list[str]] | None = None,
+        weights: list[float] | None = None,
+        n_jobs: int | None = None,
+        log_level: int = 10,
+        worker_log_level: int = 30,
+        initial_balance: int = 10000,
+        leverage: int = 1,
+        maker_fee: float = 0.001,
+        taker_fee: float = 0.001,
+    ):
+        """
+        Independent sleeves mode. Each sleeve (a symbol or a group of symbols) gets its
+        own slice of the capital, strategy instance and Portfolio, and is backtested in
+        a separate worker process. Only valid for strategies that never look across
+        sleeves. Histories are merged into one Portfolio afterwards.
+
+        :param data: {symbol: klines}, same layout as for BackTest
+        :type data: dict[str, pl.DataFrame]
+        :param strategy_class: Strategy subclass, instantiated once per sleeve
+        :type strategy_class: type
+        :param strategy_params: keyword arguments of the strategy
+        :type strategy_params: dict | None
+        :param sleeves: groups of symbols, one sleeve per symbol if None
+        :type sleeves: list[list[str]] | None
+        :param weights: capital share of every sleeve, proportional to its amount of
+            symbols if None
+        :type weights: list[float] | None
+        :param n_jobs: amount of worker processes, cpu count if None
+        :type n_jobs: int | None
+        """
+        self.logger = LoggerWrapper(name="Sleeve Backtest Module", level=log_level)
+
+        self.data = data
+        self.strategy_class = strategy_class
+        self.strategy_params = strategy_params or {}
+        self.strategy_name = strategy_class.__name__
+        self.sleeves = sleeves or [[symbol] for symbol in data.keys()]
+        self.n_jobs = n_jobs
+        self.worker_log_level = worker_log_level
+
+        missing = {s for sleeve in self.sleeves for s in sleeve} - set(data.keys())
+        if missing:
+            raise ValueError(f"No data for sleeve symbols: {sorted(missing)}")
+
+        if weights is None:
+            weights = [len(sleeve) for sleeve in self.sleeves]
+        if len(weights) != len(self.sleeves):
+            raise ValueError(
+                f"Got {len(weights)} weights for {len(self.sleeves)} sleeves"
+            )
+        total_weight = sum(weights)
+        self.sleeve_balances = [
+            initial_balance * weight / total_weight for weight in weights
+        ]
+
+        self.initial_balance = initial_balance
+        self.leverage = leverage
+        self.maker_fee = maker_fee
+        self.taker_fee = taker_fee
+
+        self.portfolio = Portfolio(
+            initial_balance=initial_balance,
+            leverage=leverage,
+            maker_fee=maker_fee,
+            taker_fee=taker_fee,
+            log_level=log_level,
+        )
+        self.report_generator = ReportGenerator(self.portfolio, log_level=log_level)
+
+    @log_execution
+    def run(self):
+        start_time = time()
+
+        tasks = []
+        for sleeve, balance in zip(self.sleeves, self.sleeve_balances):
+            backtest_params = {
+                "initial_balance": balance,
+                "leverage": self.leverage,
+                "maker_fee": self.maker_fee,
+                "taker_fee": self.taker_fee,
+            }
+            tasks.append(
+                (
+                    {symbol: self.data[symbol] for symbol in sleeve},
+                    self.strategy_class,
+                    self.strategy_params,
+                    backtest_params,
+                    self.worker_log_level,
+                )
+            )
+
+        with ProcessPoolExecutor(
+            max_workers=self.n_jobs, mp_context=get_context("spawn")
+        ) as executor:
+            results = list(
+                tqdm(
+                    executor.map(run_sleeve, tasks),
+                    total=len(tasks),
+                    desc="Running sleeves",
+                )
+            )
+
+        self._merge_sleeves(results)
+
+        end_time = time()
+        print(
+            f"Backtest of {len(self.sleeves)} sleeves was running for "
+            f"{end_time - start_time:.3f} seconds"
+        )
+
+    @log_execution
+    def generate_report(
+        self, pdf: bool = False, file_name: str = "strategy_report.pdf"
+    ):
+        self.report_generator.generate_general_metrics()
+        self.report_generator.generate_symbol_metrics()
+        if pdf:
+            self.report_generator.generate_pdf_report(
+                strategy_name=self.strategy_name, output_file_path=file_name
+            )
+
+    # ---=== HELPER METHODS ===---
+    def _merge_sleeves(self, results: list[dict]):
+        """
+        Merge sleeve books into self.portfolio. Order ids are shifted so they stay
+        unique, and the General equity is the sum of the sleeve equities, each
+        forward filled over the union of timestamps.
+        """
+        trade_histories = [self.portfolio.trade_history]
+        order_histories = [self.portfolio.order_history]
+        positions = [self.portfolio.current_positions]
+        equity_history = defaultdict(dict)
+
+        order_id_offset = 0
+        for result in results:
+            shift = col("order_id") + order_id_offset
+            trade_histories.append(result["trade_history"].with_columns(shift))
+            order_histories.append(result["order_history"].with_columns(shift))
+            positions.append(result["current_positions"].with_columns(shift))
+            order_id_offset += result["order_id"]
+
+            for key, history in result["equity_history"].items():
+                if key != "General":
+                    equity_history[key].update(history)
+
+        general_equity = self._merge_general_equity(results)
+        equity_history["General"].update(
+            dict(zip(general_equity["timestamp"], general_equity["equity"]))
+        )
+
+        self.portfolio.trade_history = concat(trade_histories)
+        self.portfolio.order_history = concat(order_histories)
+        self.portfolio.current_positions = concat(positions)
+        self.portfolio.equity_history = equity_history
+        self.portfolio.order_id = order_id_offset
+        self.portfolio.equity = sum(result["equity"] for result in results)
+
+    def _merge_general_equity(self, results: list[dict]) -> DataFrame:
+        """
+        Sum of the sleeve equities at every timestamp of any sleeve, a sleeve
+        keeps its last equity (its balance before the first one) in between.
+        One vertical concat and a pivot, rather than a join per sleeve.
+        """
+        if not any(result["equity_history"]["General"] for result in results):
+            return DataFrame(schema={"timestamp": Int64, "equity": Float64})
+
+        sleeve_columns = [f"sleeve_{i}" for i in range(len(results))]
+        history = concat(
+            [
+                DataFrame(
+                    {
+                        "timestamp": list(result["equity_history"]["General"].keys()),
+                        "sleeve": name,
+                        "equity": list(result["equity_history"]["General"].values()),
+                    },
+                    schema={"timestamp": Int64, "sleeve": String, "equity": Float64},
+                )
+                for name, result in zip(sleeve_columns, results)
+            ]
+        )
+        merged = history.pivot(on="sleeve", index="timestamp", values="equity")
+        # sleeves without any equity point keep their balance
+        merged = merged.with_columns(
+            lit(None, dtype=Float64).alias(name)
+            for name in sleeve_columns
+            if name not in merged.columns
+        )
+        return (
+            merged.sort("timestamp")
+            .with_columns(
+                col(name).forward_fill().fill_null(balance)
+                for name, balance in zip(sleeve_columns, self.sleeve_balances)
+            )
+            .select("timestamp", sum_horizontal(sleeve_columns).alias("equity"))
+        )
@@ -0,0 +1,333 @@
+from numpy import (
+    asarray,
+    concatenate,
+    cumsum,
+    exp,
+    float64,
+    full,
+    int64,
+    isnan,
+    log,
+    maximum,
+    minimum,
+    ndarray,
+    searchsorted,
+    where,
+    zeros,
+)
+from numpy.linalg import lstsq
+from polars import col, DataFrame
+from utils.logger.logger import LoggerWrapper
+
+
+def get_cumulative_levels(
+    prices: ndarray, quantities: ndarray
+) -> tuple[ndarray, ndarray, ndarray]:
+    """
+    :param prices: level prices of one side, best first
+    :type prices: np.ndarray
+    :param quantities: level quantities
+    :type quantities: np.ndarray
+    :returns: (prices, cumulative notional, cumulative quantity) for walk_levels
+    """
+    prices = asarray(prices, dtype=float64)
+    quantities = asarray(quantities, dtype=float64)
+    return prices, cumsum(prices * quantities), cumsum(quantities)
+
+
+def walk_levels(
+    levels: tuple[ndarray, ndarray, ndarray], notionals: ndarray
+) -> tuple[ndarray, ndarray]:
+    """
+    Fills of market orders against one side of a book, vectorized across orders:
+    every order finds the last level it reaches with one searchsorted over the
+    cumulative notional.
+
+    :param levels: output of get_cumulative_levels
+    :type levels: tuple[np.ndarray, np.ndarray, np.ndarray]
+    :param notionals: dollar notional of every order
+    :type notionals: np.ndarray
+    :returns: (VWAP fill price, filled notional) of every order, the fill is partial
+        when the book is too thin, NaN price if nothing can be filled
+    """
+    prices, level_notional, level_quantity = levels
+    notionals = asarray(notionals, dtype=float64)
+    if not prices.size:
+        return full(notionals.shape, float("nan")), zeros(notionals.shape)
+
+    filled = minimum(notionals, level_notional[-1])
+    level = minimum(searchsorted(level_notional, filled, side="left"), prices.size - 1)
+    previous = maximum(level - 1, 0)
+    notional_before = where(level > 0, level_notional[previous], 0.0)
+    quantity_before = where(level > 0, level_quantity[previous], 0.0)
+    quantity = quantity_before + (filled - notional_before) / prices[level]
+
+    with_fill = quantity > 0
+    vwap = full(notionals.shape, float("nan"))
+    vwap[with_fill] = filled[with_fill] / quantity[with_fill]
+    return vwap, filled
+
+
+def walk_book(
+    prices: ndarray, quantities: ndarray, notionals: ndarray
+) -> tuple[ndarray, ndarray]:
+    """
+    walk_levels over raw levels, best first
+    """
+    return walk_levels(get_cumulative_levels(prices, quantities), notionals)
+
+
+def get_book_sides(snapshot: DataFrame) -> dict[str, tuple[ndarray, ndarray]]:
+    """
+    Sorted levels of one snapshot with ORDER_BOOK_SCHEMA rows
+
+    :returns: {"BUY": asks best first, "SELL": bids best first}, (prices, quantities)
+    """
+    asks = snapshot.filter(col("side") == "ask").sort("price")
+    bids = snapshot.filter(col("side") == "bid").sort("price", descending=True)
+    return {
+        "BUY": (asks["price"].to_numpy(), asks["quantity"].to_numpy()),
+        "SELL": (bids["price"].to_numpy(), bids["quantity"].to_numpy()),
+    }
+
+
+class SlippageModel:
+    """
+    Base class of execution models used by the Portfolio. The default fills
+    everything at the reference price, like the backtest always did.
+    """
+
+    def get_fills(
+        self,
+        symbol: str,
+        timestamp: int,
+        directions: ndarray,
+        notionals: ndarray,
+        reference_prices: ndarray,
+    ) -> tuple[ndarray, ndarray]:
+        """
+        :param symbol: symbol of the orders
+        :type symbol: str
+        :param timestamp: time of execution in UNIX ms
+        :type timestamp: int
+        :param directions: "BUY" or "SELL" per order
+        :type directions: np.ndarray
+        :param notionals: dollar notional per order
+        :type notionals: np.ndarray
+        :param reference_prices: price the order would get without impact, e.g. the
+            candle close
+        :type reference_prices: np.ndarray
+        :returns: (fill price, filled fraction in [0, 1]) per order
+        """
+        reference_prices = asarray(reference_prices, dtype=float64)
+        return reference_prices, full(reference_prices.shape, 1.0)
+
+    def get_settings(self) -> dict:
+        """
+        Parameters the fills depend on, part of the backtest checkpoint signature
+        """
+        return {}
+
+    def get_fill(
+        self,
+        symbol: str,
+        timestamp: int,
+        direction: str,
+        notional: float,
+        reference_price: float,
+    ) -> tuple[float, float]:
+        prices, fractions = self.get_fills(
+            symbol, timestamp, asarray([direction]), [notional], [reference_price]
+        )
+        return float(prices[0]), float(fractions[0])
+
+
+class OrderBookSlippage(SlippageModel):
+    def __init__(
+        self,
+        snapshots: dict[str, DataFrame],
+        max_age: int | None = None,
+        log_level: int = 10,
+    ):
+        """
+        Walks the latest stored order book snapshot at or before the execution time.
+        The VWAP of the walk relative to the snapshot mid is applied to the reference
+        price, so snapshots taken at a slightly different price still give the right
+        impact. Orders larger than the visible depth are filled partially.
+
+        Cumulative levels of all snapshots are prepared once, a fill is then a
+        binary search for the snapshot plus walk_book.
+
+        :param snapshots: {symbol: frame with ORDER_BOOK_SCHEMA}, many snapshots
+            told apart by timestamp
+        :type snapshots: dict[str, pl.DataFrame]
+        :param max_age: snapshots older than this many ms are not used, orders fill
+            at the reference price then
+        :type max_age: int | None
+        """
+        self.logger = LoggerWrapper(name="Slippage Module", level=log_level)
+        self.max_age = max_age
+        self.books = {}
+        for symbol, df in snapshots.items():
+            times = []
+            books = []
+            for (timestamp,), snapshot in (
+                df.sort("timestamp")
+                .partition_by("timestamp", as_dict=True, maintain_order=True)
+                .items()
+            ):
+                sides = get_book_sides(snapshot)
+                best_ask, best_bid = sides["BUY"][0][:1], sides["SELL"][0][:1]
+                if not best_ask.size or not best_bid.size:
+                    continue
+                times.append(timestamp)
+                levels = {
+                    direction: get_cumulative_levels(*side)
+                    for direction, side in sides.items()
+                }
+                books.append((levels, (best_ask[0] + best_bid[0]) / 2))
+            self.books[symbol] = (asarray(times, dtype=int64), books)
+
+    def get_settings(self) -> dict:
+        return {"max_age": self.max_age, "books": self.books}
+
+    def get_fills(
+        self,
+        symbol: str,
+        timestamp: int,
+        directions: ndarray,
+        notionals: ndarray,
+        reference_prices: ndarray,
+    ) -> tuple[ndarray, ndarray]:
+        directions = asarray(directions)
+        notionals = asarray(notionals, dtype=float64)
+        reference_prices = asarray(reference_prices, dtype=float64)
+        prices = reference_prices.copy()
+        fractions = full(notionals.shape, 1.0)
+
+        book = self._get_book(symbol, timestamp)
+        if book is None:
+            return prices, fractions
+        levels, mid = book
+
+        for direction in ("BUY", "SELL"):
+            orders = directions == direction
+            if not orders.any():
+                continue
+            # notional is walked in snapshot prices, scaled back afterwards
+            scale = mid / reference_prices[orders]
+            wanted = notionals[orders] * scale
+            vwap, filled = walk_levels(levels[direction], wanted)
+            prices[orders] = where(isnan(vwap), reference_prices[orders], vwap / scale)
+            fractions[orders] = where(
+                wanted > 0, filled / where(wanted > 0, wanted, 1), 1
+            )
+        return prices, fractions
+
+    # ---=== HELPER METHODS ===---
+    def _get_book(self, symbol: str, timestamp: int) -> tuple | None:
+        if symbol not in self.books:
+            return None
+        times, books = self.books[symbol]
+        index = searchsorted(times, timestamp, side="right") - 1
+        if index < 0:
+            return None
+        if self.max_age is not None and timestamp - times[index] > self.max_age:
+            return None
+        return books[index]
+
+
+class DepthCurveSlippage(SlippageModel):
+    def __init__(
+        self,
+        scale: float,
+        exponent: float,
+        half_spread: float = 0.0,
+        max_distance: float | None = None,
+    ):
+        """
+        Parametric book: the notional resting within a relative distance x beyond
+        the best price is D(x) = scale * x ** exponent on both sides. An order of
+        notional N sweeps to x_N = (N / scale) ** (1 / exponent) and its VWAP lies
+        exponent / (exponent + 1) * x_N beyond the best price, which is half a
+        spread away from the mid.
+
+        :param scale: notional within a distance of 1 (100%)
+        :type scale: float
+        :param exponent: shape of the depth, 1 for uniform depth
+        :type exponent: float
+        :param half_spread: relative half spread paid by every order
+        :type half_spread: float
+        :param max_distance: visible depth, larger orders are filled partially
+        :type max_distance: float | None
+        """
+        self.scale = scale
+        self.exponent = exponent
+        self.half_spread = half_spread
+        self.max_distance = max_distance
+
+    def get_settings(self) -> dict:
+        return {
+            "scale": self.scale,
+            "exponent": self.exponent,
+            "half_spread": self.half_spread,
+            "max_distance": self.max_distance,
+        }
+
+    @classmethod
+    def from_snapshots(
+        cls, snapshots: DataFrame, max_distance: float | None = None
+    ) -> "DepthCurveSlippage":
+        """
+        Calibrate the curve on stored snapshots with a least squares fit of
+        log D(x) on log x over the levels of both sides of every snapshot
+
+        :param snapshots: frame with ORDER_BOOK_SCHEMA
+        :type snapshots: pl.DataFrame
+        """
+        distances = []
+        depths = []
+        spreads = []
+        for snapshot in snapshots.partition_by("timestamp", maintain_order=True):
+            sides = get_book_sides(snapshot)
+            if not sides["BUY"][0].size or not sides["SELL"][0].size:
+                continue
+            mid = (sides["BUY"][0][0] + sides["SELL"][0][0]) / 2
+            spreads.append((sides["BUY"][0][0] - sides["SELL"][0][0]) / (2 * mid))
+            for prices, quantities in sides.values():
+                distances.append(abs(prices / prices[0] - 1))
+                depths.append(cumsum(prices * quantities))
+
+        distances = concatenate(distances)
+        depths = concatenate(depths)
+        usable = distances > 0
+        X = concatenate(
+            [full((usable.sum(), 1), 1.0), log(distances[usable])[:, None]], axis=1
+        )
+        (intercept, exponent), _, _, _ = lstsq(X, log(depths[usable]), rcond=None)
+        return cls(
+            scale=float(exp(intercept)),
+            exponent=float(exponent),
+            half_spread=float(asarray(spreads).mean()),
+            max_distance=max_distance,
+        )
+
+    def get_fills(
+        self,
+        symbol: str,
+        timestamp: int,
+        directions: ndarray,
+        notionals: ndarray,
+        reference_prices: ndarray,
+    ) -> tuple[ndarray, ndarray]:
+        notionals = asarray(notionals, dtype=float64)
+        reference_prices = asarray(reference_prices, dtype=float64)
+        filled = notionals
+        if self.max_distance is not None:
+            filled = minimum(notionals, self.scale * self.max_distance**self.exponent)
+
+        sweep = (filled / self.scale) ** (1 / self.exponent)
+        impact = self.half_spread + self.exponent / (self.exponent + 1) * sweep
+        sign = where(asarray(directions) == "BUY", 1.0, -1.0)
+        fractions = where(notionals > 0, filled / where(notionals > 0, notionals, 1), 1)
+        return reference_prices * (1 + sign * impact), fractions
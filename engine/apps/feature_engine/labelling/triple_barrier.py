@@ -0,0 +1,301 @@
+from concurrent.futures import ProcessPoolExecutor
+from engine.core.barriers.first_touch import FirstTouchIndex
+from multiprocessing import get_context
+from numpy import (
+    arange,
+    asarray,
+    float64,
+    inf,
+    int64,
+    isnan,
+    minimum,
+    ndarray,
+    ones,
+    sign,
+    where,
+)
+from polars import col, concat, DataFrame, lit
+from tqdm import tqdm
+from utils.logger.logger import LoggerWrapper, log_execution
+
+BARRIERS = ("TP", "SL", "VERTICAL")
+
+
+def get_volatility(close: ndarray, span: int = 100) -> ndarray:
+    """
+    EWM standard deviation of close to close returns, the usual target for
+    volatility scaled barriers. Only uses data up to each bar.
+
+    :param close: close prices
+    :type close: np.ndarray
+    :param span: EWM span in bars
+    :type span: int
+    :returns: np.ndarray, NaN for the first bar
+    """
+    close = DataFrame({"close": asarray(close, dtype=float64)})
+    return close.select(
+        col("close").pct_change().ewm_std(span=span, adjust=True, min_samples=2)
+    )["close"].to_numpy()
+
+
+def get_triple_barrier_labels(
+    high: ndarray,
+    low: ndarray,
+    close: ndarray,
+    events: ndarray | None = None,
+    target: ndarray | None = None,
+    side: ndarray | None = None,
+    profit_taking: float = 1.0,
+    stop_loss: float = 1.0,
+    max_holding: int = 100,
+    min_target: float = 0.0,
+    tie: str = "SL",
+) -> dict[str, ndarray]:
+    """
+    Triple barrier method (Lopez de Prado, AFML ch. 3) for all events at once.
+
+    The entry is close[event]. Horizontal barriers sit at profit_taking * target and
+    stop_loss * target away from it, in the direction of `side`, and the vertical
+    barrier is max_holding bars later. Barriers are checked from the next bar on
+    with high/low, pass close as high and low for a close only path. Exits on a
+    horizontal barrier are priced at the barrier, vertical exits at the close.
+
+    :param high: high prices
+    :type high: np.ndarray
+    :param low: low prices
+    :type low: np.ndarray
+    :param close: close prices
+    :type close: np.ndarray
+    :param events: entry indexes (e.g. from the CUSUM filter), every bar if None
+    :type events: np.ndarray | None
+    :param target: barrier width per bar as a return, get_volatility if None
+    :type target: np.ndarray | None
+    :param side: 1 / -1 per bar from a primary model, long only if None. With a
+        side the labels are meta labels: 1 if the bet made money, 0 otherwise
+    :type side: np.ndarray | None
+    :param profit_taking: multiple of target for the profit taking barrier, 0 disables
+    :type profit_taking: float
+    :param stop_loss: multiple of target for the stop loss barrier, 0 disables
+    :type stop_loss: float
+    :param max_holding: vertical barrier in bars
+    :type max_holding: int
+    :param min_target: events with a smaller target are dropped
+    :type min_target: float
+    :param tie: "TP" or "SL", barrier assumed first when one bar touches both
+    :type tie: str
+    :returns: {"event", "exit", "target", "side", "ret", "barrier", "label"} arrays
+    """
+    if tie not in ("TP", "SL"):
+        raise ValueError(f"tie must be 'TP' or 'SL', got {tie}")
+
+    close = asarray(close, dtype=float64)
+    if target is None:
+        target = get_volatility(close)
+    target = asarray(target, dtype=float64)
+
+    events = arange(close.size, dtype=int64) if events is None else asarray(events)
+    events = events[(events < close.size - 1)]
+    events = events[~isnan(target[events]) & (target[events] > min_target)]
+
+    event_side = ones(events.size) if side is None else asarray(side)[events]
+    keep = (event_side == 1) | (event_side == -1)
+    events, event_side = events[keep], event_side[keep]
+
+    entry = close[events]
+    width = target[events]
+    profit_level = (
+        entry * (1 + event_side * profit_taking * width)
+        if profit_taking > 0
+        else event_side * inf
+    )
+    stop_level = (
+        entry * (1 - event_side * stop_loss * width)
+        if stop_loss > 0
+        else -event_side * inf
+    )
+    is_long = event_side > 0
+
+    index = FirstTouchIndex(high, low, close, max_horizon=max_holding, log_level=40)
+    upper_touch, lower_touch = index.first_touch(
+        events,
+        upper=where(is_long, profit_level, stop_level),
+        lower=where(is_long, stop_level, profit_level),
+    )
+    tp_touch = where(is_long, upper_touch, lower_touch)
+    sl_touch = where(is_long, lower_touch, upper_touch)
+
+    vertical = minimum(events + max_holding, close.size - 1)
+    never = close.size
+    tp_at = where(tp_touch >= 0, tp_touch, never)
+    sl_at = where(sl_touch >= 0, sl_touch, never)
+
+    tp_first = (tp_at < sl_at) | ((tp_at == sl_at) & (tie == "TP"))
+    barrier = where(tp_first, 0, 1)
+    exit_index = where(tp_first, tp_at, sl_at)
+    barrier = where(exit_index <= vertical, barrier, 2)
+    exit_index = minimum(exit_index, vertical)
+
+    exit_price = where(
+        barrier == 0, profit_level, where(barrier == 1, stop_level, close[exit_index])
+    )
+    ret = event_side * (exit_price / entry - 1)
+
+    label = sign(ret).astype(int64) if side is None else (ret > 0).astype(int64)
+
+    return {
+        "event": events.astype(int64),
+        "exit": exit_index.astype(int64),
+        "target": width,
+        "side": event_side.astype(int64),
+        "ret": ret,
+        "barrier": barrier,
+        "label": label,
+    }
+
+
+def label_symbol(task: tuple) -> DataFrame:
+    """
+    Pool task. Labels one symbol frame.
+
+    :param task: (symbol, data, time_column, events, target, side, params)
+    :type task: tuple
+    :returns: pl.DataFrame of labelled events
+    """
+    symbol, data, time_column, events, target, side, params = task
+    labels = get_triple_barrier_labels(
+        high=data["high"].to_numpy(),
+        low=data["low"].to_numpy(),
+        close=data["close"].to_numpy(),
+        events=events,
+        target=target,
+        side=side,
+        **params,
+    )
+    return labels_to_frame(labels, data[time_column].to_numpy()).with_columns(
+        lit(symbol).alias("symbol")
+    )
+
+
+def labels_to_frame(labels: dict[str, ndarray], time: ndarray) -> DataFrame:
+    """
+    Output of get_triple_barrier_labels as a frame with entry and exit times
+    """
+    return DataFrame(
+        {
+            "t0": time[labels["event"]],
+            "t1": time[labels["exit"]],
+            **labels,
+            "barrier": asarray(BARRIERS)[labels["barrier"]],
+        }
+    )
+
+
+class TripleBarrierLabeller:
+    def __init__(self, log_level: int = 10):
+        self.logger = LoggerWrapper(name="Labelling Module", level=log_level)
+
+    @log_execution
+    def get_labels(
+        self,
+        data: DataFrame,
+        events: ndarray | None = None,
+        target: ndarray | None = None,
+        time_column: str = "open_time",
+        **params,
+    ) -> DataFrame:
+        """
+        Triple barrier labels of klines or any Bars output (use time_column="end_time"
+        for bars). See get_triple_barrier_labels for params.
+
+        :param data: frame with high, low, close and time_column
+        :type data: pl.DataFrame
+        :returns: pl.DataFrame [t0, t1, event, exit, target, side, ret, label, barrier]
+        """
+        labels = get_triple_barrier_labels(
+            high=data["high"].to_numpy(),
+            low=data["low"].to_numpy(),
+            close=data["close"].to_numpy(),
+            events=events,
+            target=target,
+            **params,
+        )
+        return labels_to_frame(labels, data[time_column].to_numpy())
+
+    @log_execution
+    def get_meta_labels(
+        self,
+        data: DataFrame,
+        side: ndarray,
+        events: ndarray | None = None,
+        target: ndarray | None = None,
+        time_column: str = "open_time",
+        **params,
+    ) -> DataFrame:
+        """
+        Meta labels: whether the bet of a primary model (side per bar) hit profit.
+        Bars with side 0 are not events.
+
+        :param side: 1 / -1 / 0 per bar
+        :type side: np.ndarray
+        :returns: pl.DataFrame, label is 1 if the bet made money, 0 otherwise
+        """
+        return self.get_labels(
+            data,
+            events=events,
+            target=target,
+            time_column=time_column,
+            side=side,
+            **params,
+        )
+
+    @log_execution
+    def label_symbols(
+        self,
+        data: dict[str, DataFrame],
+        events: dict[str, ndarray] | None = None,
+        targets: dict[str, ndarray] | None = None,
+        sides: dict[str, ndarray] | None = None,
+        time_column: str = "open_time",
+        n_jobs: int | None = None,
+        **params,
+    ) -> DataFrame:
+        """
+        Label many symbols in parallel, one process per symbol
+
+        :param data: {symbol: frame}
+        :type data: dict[str, pl.DataFrame]
+        :param events: {symbol: entry indexes}
+        :type events: dict[str, np.ndarray] | None
+        :param targets: {symbol: barrier widths}
+        :type targets: dict[str, np.ndarray] | None
+        :param sides: {symbol: sides} for meta labels
+        :type sides: dict[str, np.ndarray] | None
+        :param n_jobs: amount of worker processes, cpu count if None
+        :type n_jobs: int | None
+        :returns: pl.DataFrame of all symbols with a symbol column
+        """
+        events, targets, sides = events or {}, targets or {}, sides or {}
+        tasks = [
+            (
+                symbol,
+                df.select(time_column, "high", "low", "close"),
+                time_column,
+                events.get(symbol),
+                targets.get(symbol),
+                sides.get(symbol),
+                params,
+            )
+            for symbol, df in data.items()
+        ]
+
+        with ProcessPoolExecutor(
+            max_workers=n_jobs, mp_context=get_context("spawn")
+        ) as executor:
+            frames = list(
+                tqdm(
+                    executor.map(label_symbol, tasks),
+                    total=len(tasks),
+                    desc="Labelling symbols",
+                )
+            )
+        return concat(frames)
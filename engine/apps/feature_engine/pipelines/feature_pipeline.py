@@ -0,0 +1,148 @@
+from polars import concat, DataFrame, Expr, LazyFrame, lit
+from utils.logger.logger import LoggerWrapper, log_execution
+
+
+class FeaturePipeline:
+    def __init__(
+        self,
+        symbol_column: str | None = "symbol",
+        time_column: str = "open_time",
+        log_level: int = 10,
+    ):
+        """
+        Features registered by name as polars expressions and compiled into one
+        lazy query. A feature may reference other features through col(name), the
+        dependencies are resolved into layers of with_columns so shared
+        intermediates (returns, rolling means, EMAs) are computed once, and polars
+        eliminates the common subexpressions left inside a layer.
+
+        With several symbols in one frame every feature is evaluated over the
+        symbol column, so the whole universe is a single query.
+
+        :param symbol_column: column separating symbols, None for one symbol
+        :type symbol_column: str | None
+        :param time_column: column the rows of every symbol are ordered by
+        :type time_column: str
+        """
+        self.logger = LoggerWrapper(name="Feature Pipeline Module", level=log_level)
+        self.symbol_column = symbol_column
+        self.time_column = time_column
+        self.features = {}
+
+    def add(self, name: str, expression: Expr, keep: bool = True) -> "FeaturePipeline":
+        """
+        :param name: column name of the feature
+        :type name: str
+        :param expression: polars expression over input columns and other features
+        :type expression: pl.Expr
+        :param keep: False for intermediate features dropped from the output
+        :type keep: bool
+        :returns: the pipeline, for chaining
+        """
+        if name in self.features:
+            raise ValueError(f"Feature {name} is already registered")
+        self.features[name] = (expression, keep)
+        return self
+
+    def remove(self, name: str):
+        dependants = [
+            other
+            for other, (expression, _) in self.features.items()
+            if name in expression.meta.root_names() and other != name
+        ]
+        if dependants:
+            raise ValueError(f"Features {dependants} depend on {name}")
+        del self.features[name]
+
+    def compile(self, data: LazyFrame) -> LazyFrame:
+        """
+        Lazy query adding all kept features to data
+
+        :param data: klines, bars or a frame of many symbols
+        :type data: pl.LazyFrame
+        :returns: pl.LazyFrame
+        """
+        columns = data.collect_schema().names()
+        partitioned = self.symbol_column is not None and self.symbol_column in columns
+
+        order = [self.time_column] if self.time_column in columns else []
+        if partitioned:
+            order = [self.symbol_column, *order]
+        if order:
+            data = data.sort(order, maintain_order=True)
+
+        for layer in self._get_layers(columns):
+            expressions = [self.features[name][0] for name in layer]
+            if partitioned:
+                expressions = [
+                    expression.over(self.symbol_column) for expression in expressions
+                ]
+            data = data.with_columns(
+                expression.alias(name) for name, expression in zip(layer, expressions)
+            )
+
+        intermediate = [name for name, (_, keep) in self.features.items() if not keep]
+        return data.drop(intermediate)
+
+    @log_execution
+    def transform(
+        self, data: DataFrame | dict[str, DataFrame]
+    ) -> DataFrame | dict[str, DataFrame]:
+        """
+        :param data: one frame (possibly with a symbol column) or {symbol: frame},
+            the dict is concatenated and computed in one query
+        :type data: pl.DataFrame | dict[str, pl.DataFrame]
+        :returns: same type as data with the features
+        """
+        if isinstance(data, DataFrame):
+            return self.compile(data.lazy()).collect()
+
+        if self.symbol_column is None:
+            raise ValueError("symbol_column is needed to transform many symbols")
+        frames = [
+            df.lazy().with_columns(lit(symbol).alias(self.symbol_column))
+            for symbol, df in data.items()
+        ]
+        result = self.compile(concat(frames, how="vertical_relaxed")).collect()
+        partitions = result.partition_by(
+            self.symbol_column, as_dict=True, maintain_order=True
+        )
+        return {
+            symbol: partitions[(symbol,)].drop(self.symbol_column) for symbol in data
+        }
+
+    def explain(self, data: DataFrame | LazyFrame) -> str:
+        """
+        Optimized plan of the query, e.g. to check that intermediates are shared
+        """
+        return self.compile(data.lazy()).explain()
+
+    # ---=== HELPER METHODS ===---
+    def _get_layers(self, columns: list[str]) -> list[list[str]]:
+        """
+        Features grouped by dependency depth, a layer only references input columns
+        and features of earlier layers
+        """
+        depth = {}
+
+        def get_depth(name: str, path: tuple) -> int:
+            if name in depth:
+                return depth[name]
+            if name in path:
+                raise ValueError(f"Circular feature dependency: {[*path, name]}")
+            dependencies = []
+            for root in self.features[name][0].meta.root_names():
+                if root in self.features and root != name:
+                    dependencies.append(get_depth(root, (*path, name)))
+                elif root not in columns:
+                    raise ValueError(f"Feature {name} needs unknown column {root}")
+            depth[name] = max(dependencies, default=-1) + 1
+            return depth[name]
+
+        for name in self.features:
+            get_depth(name, ())
+
+        layers = [[] for _ in range(max(depth.values(), default=-1) + 1)]
+        for name in self.features:
+            layers[depth[name]].append(name)
+        return layers
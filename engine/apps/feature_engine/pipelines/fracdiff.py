@@ -0,0 +1,243 @@
+from engine.apps.feature_engine.pipelines.stationarity import (
+    ADF_CRITICAL_VALUES,
+    get_adf_statistic,
+)
+from functools import lru_cache
+from numpy import (
+    abs as absolute,
+    arange,
+    asarray,
+    concatenate,
+    cumprod,
+    float64,
+    full,
+    isnan,
+    log,
+    ndarray,
+)
+from numpy.fft import irfft, rfft
+from numpy.lib.stride_tricks import sliding_window_view
+from polars import DataFrame, Series
+from utils.logger.logger import LoggerWrapper, log_execution
+
+# windows longer than this are applied with FFT convolution
+FFT_MIN_WIDTH = 64
+
+
+@lru_cache(maxsize=256)
+def _get_ffd_weights(d: float, threshold: float, max_width: int) -> ndarray:
+    weights = [1.0]
+    chunk = 256
+    while len(weights) < max_width:
+        k = arange(len(weights), len(weights) + chunk, dtype=float64)
+        steps = -(d - k + 1) / k
+        block = weights[-1] * cumprod(steps)
+        small = absolute(block) < threshold
+        if small.any():
+            weights.extend(block[: small.argmax()])
+            break
+        weights.extend(block)
+        chunk *= 2
+
+    weights = asarray(weights[:max_width], dtype=float64)
+    weights.setflags(write=False)
+    return weights
+
+
+def get_ffd_weights(
+    d: float, threshold: float = 1e-5, max_width: int = 100_000
+) -> ndarray:
+    """
+    Fixed width window weights of fractional differentiation (AFML 5.5),
+    w_0 = 1, w_k = -w_{k-1} * (d - k + 1) / k, cut where |w_k| < threshold.
+    Weights are cached per (d, threshold).
+
+    :param d: differentiation order
+    :type d: float
+    :param threshold: smallest weight kept
+    :type threshold: float
+    :param max_width: hard cap of the window
+    :type max_width: int
+    :returns: read only np.ndarray, weights[k] applies to the value k bars back
+    """
+    return _get_ffd_weights(float(d), float(threshold), int(max_width))
+
+
+def frac_diff_ffd(values: ndarray, d: float, threshold: float = 1e-5) -> ndarray:
+    """
+    Fixed width window fractional differentiation of one series or of the columns
+    of a (n, m) matrix at once. Long windows are applied with one batched FFT
+    convolution, short ones with a strided matrix product.
+
+    :param values: (n,) or (n, m) array without NaNs
+    :type values: np.ndarray
+    :param d: differentiation order
+    :type d: float
+    :param threshold: weight cut off
+    :type threshold: float
+    :returns: np.ndarray of the same shape, NaN for the first width - 1 rows
+    """
+    values = asarray(values, dtype=float64)
+    weights = get_ffd_weights(d, threshold)
+    width = weights.size
+    size = values.shape[0]
+
+    result = full(values.shape, float("nan"))
+    if size < width:
+        return result
+    if isnan(values).any():
+        raise ValueError("frac_diff_ffd does not take NaNs, drop or fill them first")
+
+    if width < FFT_MIN_WIDTH:
+        windows = sliding_window_view(values, width, axis=0)
+        result[width - 1 :] = windows @ weights[::-1]
+        return result
+
+    fft_size = 1 << (size + width - 2).bit_length()
+    weights_fft = rfft(weights, n=fft_size)
+    if values.ndim > 1:
+        weights_fft = weights_fft[:, None]
+    convolution = irfft(rfft(values, n=fft_size, axis=0) * weights_fft, fft_size, 0)
+    result[width - 1 :] = convolution[width - 1 : size]
+    return result
+
+
+def find_min_d(
+    values: ndarray,
+    threshold: float = 1e-4,
+    significance: float = 0.05,
+    tolerance: float = 0.01,
+    max_d: float = 1.0,
+    lags: int = 1,
+) -> float:
+    """
+    Smallest d whose FFD series passes the ADF test, by bisection. The ADF
+    statistic falls as d grows, so log2(max_d / tolerance) tests are enough
+    instead of a full grid.
+
+    :param values: series, usually log prices
+    :type values: np.ndarray
+    :param threshold: weight cut off
+    :type threshold: float
+    :param significance: ADF significance level, 0.01, 0.05 or 0.1
+    :type significance: float
+    :param tolerance: precision of the returned d
+    :type tolerance: float
+    :param max_d: upper bound of the search
+    :type max_d: float
+    :returns: minimal d, max_d if even max_d does not pass
+    """
+    critical_value = ADF_CRITICAL_VALUES[significance]
+
+    def passes(d: float) -> bool:
+        differentiated = frac_diff_ffd(values, d, threshold)
+        return get_adf_statistic(differentiated, lags) < critical_value
+
+    low, high = 0.0, max_d
+    if passes(low):
+        return low
+    if not passes(high):
+        return high
+    while high - low > tolerance:
+        middle = (low + high) / 2
+        if passes(middle):
+            high = middle
+        else:
+            low = middle
+    return high
+
+
+class FracDiff:
+    def __init__(self, log_level: int = 10):
+        self.logger = LoggerWrapper(name="Frac Diff Module", level=log_level)
+
+    @log_execution
+    def transform(
+        self,
+        data: DataFrame,
+        columns: list[str] | None = None,
+        d: float = 0.4,
+        threshold: float = 1e-4,
+        use_log: bool = True,
+    ) -> DataFrame:
+        """
+        Add `<column>_ffd` features to klines or any Bars output. All columns are
+        differentiated in one batched convolution.
+
+        :param data: frame with the columns
+        :type data: pl.DataFrame
+        :param columns: columns to differentiate, ["close"] if None
+        :type columns: list[str] | None
+        :param d: differentiation order
+        :type d: float
+        :param threshold: weight cut off
+        :type threshold: float
+        :param use_log: differentiate log values (prices) instead of raw values
+        :type use_log: bool
+        :returns: data with the new columns, null during the warm up window
+        """
+        columns = columns or ["close"]
+        values = data.select(columns).to_numpy().astype(float64)
+        if use_log:
+            values = log(values)
+
+        differentiated = frac_diff_ffd(values, d, threshold)
+        return data.with_columns(
+            Series(f"{name}_ffd", differentiated[:, i]).fill_nan(None)
+            for i, name in enumerate(columns)
+        )
+
+    @log_execution
+    def transform_symbols(
+        self,
+        data: dict[str, DataFrame],
+        column: str = "close",
+        d: float | dict[str, float] = 0.4,
+        threshold: float = 1e-4,
+        use_log: bool = True,
+    ) -> dict[str, DataFrame]:
+        """
+        FFD of many symbols. Symbols with equally long frames and a shared d are
+        stacked into one matrix and differentiated together.
+
+        :param data: {symbol: frame}
+        :type data: dict[str, pl.DataFrame]
+        :param d: one order for all symbols or {symbol: d}, e.g. from find_min_d
+        :type d: float | dict[str, float]
+        :returns: {symbol: frame with `<column>_ffd`}
+        """
+        batches = {}
+        for symbol, df in data.items():
+            symbol_d = d[symbol] if isinstance(d, dict) else d
+            batches.setdefault((df.height, symbol_d), []).append(symbol)
+
+        result = {}
+        for (_, batch_d), symbols in batches.items():
+            values = concatenate(
+                [data[symbol][column].to_numpy().reshape(-1, 1) for symbol in symbols],
+                axis=1,
+            ).astype(float64)
+            if use_log:
+                values = log(values)
+            differentiated = frac_diff_ffd(values, batch_d, threshold)
+            for i, symbol in enumerate(symbols):
+                result[symbol] = data[symbol].with_columns(
+                    Series(f"{column}_ffd", differentiated[:, i]).fill_nan(None)
+                )
+        return {symbol: result[symbol] for symbol in data}
+
+    @log_execution
+    def find_min_d(
+        self,
+        data: DataFrame,
+        column: str = "close",
+        use_log: bool = True,
+        **params,
+    ) -> float:
+        """
+        Minimal d that makes the column stationary, see find_min_d for params
+        """
+        values = data[column].to_numpy().astype(float64)
+        min_d = find_min_d(log(values) if use_log else values, **params)
+        self.logger.info(f"Minimal d for {column}: {min_d:.4f}")
+        return min_d
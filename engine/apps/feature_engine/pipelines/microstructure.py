@@ -0,0 +1,325 @@
+from collections import deque
+from math import floor, log, sqrt
+from polars import col, DataFrame, Expr, LazyFrame, lit, when
+from utils.logger.logger import LoggerWrapper, log_execution
+
+MICROSTRUCTURE_FEATURES = (
+    "order_flow_imbalance",
+    "cumulative_delta",
+    "vpin",
+    "kyle_lambda",
+    "amihud_lambda",
+    "roll_spread",
+)
+
+
+def get_flow_columns(data: DataFrame) -> list[Expr]:
+    """
+    Buy volume, sell volume, volume and dollar volume from trade based bars
+    (buy_volume / sell_volume, see TIBS_SCHEMA) or from klines (taker buy volume)
+
+    :param data: bars or klines
+    :type data: pl.DataFrame
+    :returns: expressions for buy_volume, sell_volume, volume, dollar_volume
+    """
+    columns = data.columns
+    if "buy_volume" in columns and "sell_volume" in columns:
+        volume = (
+            col("base_volume")
+            if "base_volume" in columns
+            else col("buy_volume") + col("sell_volume")
+        )
+        return [
+            col("buy_volume"),
+            col("sell_volume"),
+            volume.alias("volume"),
+            col("quote_volume").alias("dollar_volume"),
+        ]
+    if "taker_buy_base_asset_volume" in columns:
+        return [
+            col("taker_buy_base_asset_volume").alias("buy_volume"),
+            (col("volume") - col("taker_buy_base_asset_volume")).alias("sell_volume"),
+            col("volume"),
+            col("quote_asset_volume").alias("dollar_volume"),
+        ]
+    raise ValueError(
+        "Need buy_volume/sell_volume (trade bars) or taker_buy_base_asset_volume "
+        "(klines) for microstructure features"
+    )
+
+
+def get_bar_flow(bar: dict) -> tuple[float, float, float, float]:
+    """
+    get_flow_columns for one bar or kline row
+
+    :returns: (buy_volume, sell_volume, volume, dollar_volume)
+    """
+    if "buy_volume" in bar:
+        buy, sell = bar["buy_volume"], bar["sell_volume"]
+        return buy, sell, bar.get("base_volume", buy + sell), bar["quote_volume"]
+    buy = bar["taker_buy_base_asset_volume"]
+    return buy, bar["volume"] - buy, bar["volume"], bar["quote_asset_volume"]
+
+
+def _rolling_cov(x: Expr, y: Expr, window: int) -> Expr:
+    return (x * y).rolling_mean(window) - x.rolling_mean(window) * y.rolling_mean(
+        window
+    )
+
+
+def get_microstructure_expressions(window: int = 50) -> list[Expr]:
+    """
+    Rolling microstructure features over columns close, buy_volume, sell_volume
+    and dollar_volume
+
+    - order_flow_imbalance: (buy - sell) / (buy + sell) over the window
+    - cumulative_delta: running sum of buy - sell volume
+    - kyle_lambda: slope of price changes on signed volume
+    - amihud_lambda: mean |log return| per unit of dollar volume
+    - roll_spread: 2 * sqrt(-cov(dp_t, dp_{t-1})), 0 when the covariance is positive
+
+    Covariances are population ones, so the streaming version matches exactly.
+
+    :param window: rolling window in bars
+    :type window: int
+    :returns: list of pl.Expr, null during the warm up
+    """
+    delta = col("buy_volume") - col("sell_volume")
+    price_change = col("close").diff()
+    serial_cov = _rolling_cov(price_change, price_change.shift(1), window)
+
+    return [
+        (
+            delta.rolling_sum(window)
+            / (col("buy_volume") + col("sell_volume")).rolling_sum(window)
+        ).alias("order_flow_imbalance"),
+        delta.cum_sum().alias("cumulative_delta"),
+        (
+            _rolling_cov(price_change, delta, window)
+            / _rolling_cov(delta, delta, window)
+        ).alias("kyle_lambda"),
+        (col("close").log().diff().abs() / col("dollar_volume"))
+        .rolling_mean(window)
+        .alias("amihud_lambda"),
+        when(serial_cov < 0)
+        .then(2 * (-serial_cov).sqrt())
+        .when(serial_cov.is_not_null())
+        .then(lit(0.0))
+        .alias("roll_spread"),
+    ]
+
+
+def get_vpin(data: LazyFrame, bucket_volume: float, n_buckets: int = 50) -> LazyFrame:
+    """
+    Volume synchronized probability of informed trading: bars are grouped into
+    buckets of bucket_volume, VPIN = sum |buy - sell| / sum volume of the last
+    n_buckets buckets.
+
+    A bar belongs to the bucket its first unit of volume falls into and the bar
+    crossing the bucket boundary closes it, so the value is known at that bar and
+    carried forward until the next bucket closes. Bars are not split between
+    buckets, use bars much smaller than the bucket (or volume bars of that size).
+
+    :param data: frame with buy_volume, sell_volume and volume
+    :type data: pl.LazyFrame
+    :param bucket_volume: volume of one bucket
+    :type bucket_volume: float
+    :param n_buckets: amount of buckets in the window
+    :type n_buckets: int
+    :returns: data with `vpin`, null until n_buckets buckets are closed
+    """
+    volume_to_date = col("volume").cum_sum()
+    data = data.with_columns(
+        ((volume_to_date - col("volume")) / bucket_volume).floor().alias("_bucket"),
+        (volume_to_date / bucket_volume).floor().alias("_closing_bucket"),
+    )
+    buckets = (
+        data.group_by("_bucket", maintain_order=True)
+        .agg(
+            (col("buy_volume") - col("sell_volume")).sum().abs().alias("_imbalance"),
+            col("volume").sum().alias("_bucket_volume"),
+            (col("_closing_bucket") > col("_bucket")).any().alias("_closed"),
+        )
+        .filter(col("_closed"))
+        .select(
+            "_bucket",
+            (
+                col("_imbalance").rolling_sum(n_buckets)
+                / col("_bucket_volume").rolling_sum(n_buckets)
+            ).alias("vpin"),
+        )
+    )
+    closing = col("_closing_bucket") > col("_bucket")
+    return (
+        data.with_columns(when(closing).then(col("_bucket")).alias("_bucket"))
+        .join(buckets, on="_bucket", how="left", maintain_order="left")
+        .with_columns(col("vpin").forward_fill())
+        .drop("_bucket", "_closing_bucket")
+    )
+
+
+class RollingSums:
+    """
+    Sums of the last `window` values of several streams, O(1) per update
+    """
+
+    def __init__(self, window: int, size: int):
+        self.window = window
+        self.values = deque()
+        self.sums = [0.0] * size
+
+    def update(self, values: tuple) -> list[float] | None:
+        self.values.append(values)
+        for i, value in enumerate(values):
+            self.sums[i] += value
+        if len(self.values) > self.window:
+            for i, value in enumerate(self.values.popleft()):
+                self.sums[i] -= value
+        return self.sums if len(self.values) == self.window else None
+
+
+class MicrostructureStream:
+    def __init__(
+        self,
+        window: int = 50,
+        bucket_volume: float | None = None,
+        n_buckets: int = 50,
+    ):
+        """
+        Incremental version of get_microstructure_expressions and get_vpin for live
+        use, every bar updates running window sums in O(1)
+
+        :param window: rolling window in bars
+        :type window: int
+        :param bucket_volume: volume of one VPIN bucket, no VPIN if None
+        :type bucket_volume: float | None
+        :param n_buckets: amount of buckets of VPIN
+        :type n_buckets: int
+        """
+        self.window = window
+        self.previous_close = None
+        self.previous_change = None
+        self.cumulative_delta = 0.0
+
+        self.bucket_volume = bucket_volume
+        self.volume_to_date = 0.0
+        self.bucket_imbalance = 0.0
+        self.bucket_total = 0.0
+        self.last_vpin = None
+
+        self.flow = RollingSums(window, 2)
+        self.vpin = RollingSums(n_buckets, 2)
+        self.kyle = RollingSums(window, 4)
+        self.amihud = RollingSums(window, 1)
+        self.roll = RollingSums(window, 3)
+
+    def update(self, bar: dict) -> dict:
+        """
+        :param bar: one row of trade based bars or klines, e.g. from iter_rows
+        :type bar: dict
+        :returns: {feature: value or None during the warm up}
+        """
+        n = self.window
+        buy, sell, volume, dollar_volume = get_bar_flow(bar)
+        delta = buy - sell
+        self.cumulative_delta += delta
+        features = dict.fromkeys(MICROSTRUCTURE_FEATURES)
+        features["cumulative_delta"] = self.cumulative_delta
+
+        flow = self.flow.update((delta, buy + sell))
+        if flow is not None:
+            features["order_flow_imbalance"] = flow[0] / flow[1]
+
+        if self.bucket_volume is not None:
+            features["vpin"] = self._update_vpin(delta, volume)
+
+        close = bar["close"]
+        if self.previous_close is not None:
+            change = close - self.previous_close
+            kyle = self.kyle.update((change, delta, change * delta, delta * delta))
+            if kyle is not None:
+                covariance = kyle[2] / n - kyle[0] / n * kyle[1] / n
+                variance = kyle[3] / n - (kyle[1] / n) ** 2
+                features["kyle_lambda"] = covariance / variance
+
+            ratio = abs(log(close / self.previous_close)) / dollar_volume
+            amihud = self.amihud.update((ratio,))
+            if amihud is not None:
+                features["amihud_lambda"] = amihud[0] / n
+
+            if self.previous_change is not None:
+                roll = self.roll.update(
+                    (change * self.previous_change, change, self.previous_change)
+                )
+                if roll is not None:
+                    covariance = roll[0] / n - roll[1] / n * roll[2] / n
+                    features["roll_spread"] = (
+                        2 * sqrt(-covariance) if covariance < 0 else 0.0
+                    )
+            self.previous_change = change
+        self.previous_close = close
+        return features
+
+    # ---=== HELPER METHODS ===---
+    def _update_vpin(self, delta: float, volume: float) -> float | None:
+        bucket = floor(self.volume_to_date / self.bucket_volume)
+        self.volume_to_date += volume
+        self.bucket_imbalance += delta
+        self.bucket_total += volume
+        if floor(self.volume_to_date / self.bucket_volume) > bucket:
+            vpin = self.vpin.update((abs(self.bucket_imbalance), self.bucket_total))
+            if vpin is not None:
+                self.last_vpin = vpin[0] / vpin[1]
+            self.bucket_imbalance = 0.0
+            self.bucket_total = 0.0
+        return self.last_vpin
+
+
+class Microstructure:
+    def __init__(self, log_level: int = 10):
+        self.logger = LoggerWrapper(name="Microstructure Module", level=log_level)
+
+    @log_execution
+    def transform(
+        self,
+        data: DataFrame,
+        window: int = 50,
+        bucket_volume: float | None = None,
+        n_buckets: int = 50,
+    ) -> DataFrame:
+        """
+        Add microstructure features to trade based bars or klines in one lazy query
+
+        :param data: bars with buy/sell volume or klines
+        :type data: pl.DataFrame
+        :param window: rolling window in bars
+        :type window: int
+        :param bucket_volume: volume of one VPIN bucket, 1 / n_buckets of the mean
+            daily volume is the usual choice. No VPIN if None
+        :type bucket_volume: float | None
+        :param n_buckets: amount of buckets of VPIN
+        :type n_buckets: int
+        :returns: data with MICROSTRUCTURE_FEATURES columns
+        """
+        query = (
+            data.lazy()
+            .with_columns(get_flow_columns(data))
+            .with_columns(get_microstructure_expressions(window))
+        )
+        if bucket_volume is not None:
+            query = get_vpin(query, bucket_volume, n_buckets)
+        helpers = [
+            name
+            for name in ("buy_volume", "sell_volume", "volume", "dollar_volume")
+            if name not in data.columns
+        ]
+        return query.drop(helpers).collect()
+
+    @staticmethod
+    def get_stream(
+        window: int = 50, bucket_volume: float | None = None, n_buckets: int = 50
+    ) -> MicrostructureStream:
+        """
+        Streaming counterpart of transform, feed it one bar dict at a time
+        """
+        return MicrostructureStream(window, bucket_volume, n_buckets)
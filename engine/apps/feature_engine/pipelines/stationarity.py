@@ -0,0 +1,49 @@
+from numpy import asarray, column_stack, diff, float64, isnan, ndarray, ones, sqrt
+from numpy.lib.stride_tricks import sliding_window_view
+from numpy.linalg import lstsq, pinv
+
+# MacKinnon asymptotic critical values of the ADF test with a constant
+ADF_CRITICAL_VALUES = {0.01: -3.43, 0.05: -2.86, 0.1: -2.57}
+
+
+def get_adf_statistic(series: ndarray, lags: int = 1) -> float:
+    """
+    Augmented Dickey-Fuller t-statistic of the lagged level, regression with a
+    constant: dy_t = a + b * y_{t-1} + sum(c_i * dy_{t-i}) + e_t.
+
+    :param series: series to test, NaNs are dropped
+    :type series: np.ndarray
+    :param lags: amount of lagged differences
+    :type lags: int
+    :returns: t-statistic of b, more negative means more stationary
+    """
+    series = asarray(series, dtype=float64)
+    series = series[~isnan(series)]
+    if series.size < lags + 10:
+        raise ValueError(f"Series of {series.size} values is too short for ADF")
+
+    delta = diff(series)
+    target = delta[lags:]
+    columns = [ones(target.size), series[lags:-1]]
+    if lags:
+        lagged = sliding_window_view(delta[:-1], lags)[:, ::-1]
+        columns.extend(lagged.T)
+    X = column_stack(columns)
+
+    beta, _, _, _ = lstsq(X, target, rcond=None)
+    errors = target - X @ beta
+    variance = errors @ errors / (target.size - X.shape[1])
+    standard_error = sqrt(variance * pinv(X.T @ X)[1, 1])
+    return float(beta[1] / standard_error)
+
+
+def is_stationary(series: ndarray, significance: float = 0.05, lags: int = 1) -> bool:
+    """
+    ADF test at one of the tabulated significance levels (0.01, 0.05, 0.1)
+    """
+    if significance not in ADF_CRITICAL_VALUES:
+        raise ValueError(
+            f"significance must be one of {list(ADF_CRITICAL_VALUES)}, "
+            f"got {significance}"
+        )
+    return get_adf_statistic(series, lags) < ADF_CRITICAL_VALUES[significance]
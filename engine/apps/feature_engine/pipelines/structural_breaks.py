@@ -0,0 +1,328 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from numpy import (
+    arange,
+    array_split,
+    asarray,
+    column_stack,
+    cumsum,
+    diff,
+    einsum,
+    float64,
+    full,
+    int64,
+    log,
+    maximum,
+    minimum,
+    ndarray,
+    ones,
+    repeat,
+    sqrt,
+    zeros,
+)
+from numpy.lib.stride_tricks import sliding_window_view
+from numpy.linalg import solve
+from polars import DataFrame, Series
+from tqdm import tqdm
+from utils.logger.logger import LoggerWrapper, log_execution
+
+# (start, end) regressions solved per batch, bounds the memory of a worker
+PAIRS_PER_BATCH = 500_000
+
+
+def get_adf_prefix_sums(
+    values: ndarray, lags: int = 1
+) -> tuple[ndarray, ndarray, ndarray]:
+    """
+    Prefix sums of X'X, X'y and y'y of the ADF regression
+    dy_t = a + b * y_{t-1} + sum(c_i * dy_{t-i}) + e_t.
+
+    The sums of any window of rows are a difference of two prefix entries, which
+    is what recursive least squares accumulates, but available for every start
+    and end at once instead of refitting each window.
+
+    :param values: series, usually log prices
+    :type values: np.ndarray
+    :param lags: amount of lagged differences
+    :type lags: int
+    :returns: (xx of shape (rows + 1, k, k), xy (rows + 1, k), yy (rows + 1,)),
+        row r is the regression of values[r + lags + 1]
+    """
+    values = asarray(values, dtype=float64)
+    values = values - values.mean()
+
+    delta = diff(values)
+    target = delta[lags:]
+    columns = [ones(target.size), values[lags:-1]]
+    if lags:
+        columns.extend(sliding_window_view(delta[:-1], lags)[:, ::-1].T)
+    X = column_stack(columns)
+
+    k = X.shape[1]
+    xx = zeros((target.size + 1, k, k))
+    xy = zeros((target.size + 1, k))
+    yy = zeros(target.size + 1)
+    xx[1:] = cumsum(einsum("ni,nj->nij", X, X), axis=0)
+    xy[1:] = cumsum(X * target[:, None], axis=0)
+    yy[1:] = cumsum(target * target)
+    return xx, xy, yy
+
+
+def get_sadf_for_rows(
+    prefix: tuple[ndarray, ndarray, ndarray],
+    rows: ndarray,
+    min_window: int,
+    max_window: int | None = None,
+    start_step: int = 1,
+) -> ndarray:
+    """
+    SADF of the windows ending at the given regression rows: the sup of the ADF
+    t-statistic over all window starts (AFML 17.4.2).
+
+    :param prefix: output of get_adf_prefix_sums
+    :type prefix: tuple[np.ndarray, np.ndarray, np.ndarray]
+    :param rows: last regression row of every window
+    :type rows: np.ndarray
+    :param min_window: shortest window in rows
+    :type min_window: int
+    :param max_window: longest window in rows, unbounded if None
+    :type max_window: int | None
+    :param start_step: only every start_step-th start is tested
+    :type start_step: int
+    :returns: np.ndarray, NaN where no window fits
+    """
+    xx, xy, yy = prefix
+    k = xy.shape[1]
+    result = full(rows.size, float("nan"))
+
+    first_start = zeros(rows.size, dtype=int64)
+    if max_window is not None:
+        first_start = maximum(rows + 1 - max_window, 0)
+    last_start = rows + 1 - min_window
+    counts = (last_start - first_start) // start_step + 1
+    counts[last_start < first_start] = 0
+
+    batches = array_split(
+        arange(rows.size), max(int(counts.sum()) // PAIRS_PER_BATCH, 1)
+    )
+    for batch in batches:
+        batch = batch[counts[batch] > 0]
+        if not batch.size:
+            continue
+        batch_counts = counts[batch]
+        offsets = arange(batch_counts.sum()) - repeat(
+            cumsum(batch_counts) - batch_counts, batch_counts
+        )
+        ends = repeat(rows[batch] + 1, batch_counts)
+        starts = repeat(first_start[batch], batch_counts) + offsets * start_step
+
+        window_xx = xx[ends] - xx[starts]
+        window_xy = xy[ends] - xy[starts]
+        window_yy = yy[ends] - yy[starts]
+
+        # one solve gives beta and the column of the inverse needed for the
+        # standard error of the lagged level, cheaper than a full inverse
+        right_hand = zeros((starts.size, k, 2))
+        right_hand[:, :, 0] = window_xy
+        right_hand[:, 1, 1] = 1.0
+        solution = solve(window_xx, right_hand)
+        beta = solution[:, :, 0]
+        residual = window_yy - einsum("ni,ni->n", beta, window_xy)
+        variance = maximum(residual, 0) / (ends - starts - k)
+        statistic = beta[:, 1] / sqrt(variance * solution[:, 1, 1])
+
+        group_starts = cumsum(batch_counts) - batch_counts
+        result[batch] = maximum.reduceat(statistic, group_starts)
+    return result
+
+
+SADF_CONTEXT = {}
+
+
+def share_prefixes(
+    prefixes: dict[str, tuple],
+) -> tuple[SharedMemory, dict[str, list[tuple[int, tuple]]]]:
+    """
+    Copy the prefix sums of all symbols into one shared memory block, so workers
+    map them instead of holding a private copy each
+
+    :param prefixes: {symbol: output of get_adf_prefix_sums}
+    :type prefixes: dict[str, tuple]
+    :returns: shared memory (the caller unlinks it), {symbol: [(offset, shape)]}
+    """
+    total_size = sum(array.nbytes for arrays in prefixes.values() for array in arrays)
+    shared_memory = SharedMemory(create=True, size=max(total_size, 1))
+
+    layout = {}
+    offset = 0
+    for symbol, arrays in prefixes.items():
+        layout[symbol] = []
+        for array in arrays:
+            view = ndarray(
+                array.shape, dtype=float64, buffer=shared_memory.buf, offset=offset
+            )
+            view[...] = array
+            layout[symbol].append((offset, array.shape))
+            offset += array.nbytes
+    return shared_memory, layout
+
+
+def init_sadf_worker(name: str, layout: dict[str, list[tuple[int, tuple]]]):
+    """
+    Pool initializer. Attaches to the prefix sums placed by share_prefixes, pages
+    are shared by all workers and read only for the symbols a worker gets.
+    """
+    shared_memory = SharedMemory(name=name, track=False)
+    SADF_CONTEXT["shared_memory"] = shared_memory
+    SADF_CONTEXT["prefixes"] = {
+        symbol: tuple(
+            ndarray(shape, dtype=float64, buffer=shared_memory.buf, offset=offset)
+            for offset, shape in arrays
+        )
+        for symbol, arrays in layout.items()
+    }
+
+
+def run_sadf_task(task: tuple) -> tuple[str, ndarray, ndarray]:
+    """
+    Pool task. SADF of one chunk of window ends of one symbol.
+
+    :param task: (symbol, rows, min_window, max_window, start_step)
+    :type task: tuple
+    :returns: (symbol, rows, sadf)
+    """
+    symbol, rows, min_window, max_window, start_step = task
+    sadf = get_sadf_for_rows(
+        SADF_CONTEXT["prefixes"][symbol], rows, min_window, max_window, start_step
+    )
+    return symbol, rows, sadf
+
+
+class StructuralBreaks:
+    def __init__(self, n_jobs: int | None = None, log_level: int = 10):
+        """
+        Supremum ADF explosiveness test as a per bar feature
+
+        :param n_jobs: amount of worker processes, cpu count if None
+        :type n_jobs: int | None
+        """
+        self.logger = LoggerWrapper(name="Structural Breaks Module", level=log_level)
+        self.n_jobs = n_jobs
+
+    @log_execution
+    def get_sadf(
+        self,
+        data: DataFrame,
+        column: str = "close",
+        lags: int = 1,
+        min_window: int = 50,
+        max_window: int | None = None,
+        start_step: int = 1,
+        use_log: bool = True,
+        chunks_per_symbol: int = 64,
+    ) -> DataFrame:
+        """
+        Add a `sadf` column to klines or any Bars output
+
+        :param data: frame with `column`
+        :type data: pl.DataFrame
+        :param column: series to test
+        :type column: str
+        :param lags: lagged differences of the ADF regression
+        :type lags: int
+        :param min_window: shortest window in bars
+        :type min_window: int
+        :param max_window: longest window in bars, the whole history if None. Bounds
+            the cost, which is quadratic without it
+        :type max_window: int | None
+        :param start_step: test every start_step-th window start only
+        :type start_step: int
+        :param use_log: test log values (prices)
+        :type use_log: bool
+        :param chunks_per_symbol: tasks per symbol handed to the pool
+        :type chunks_per_symbol: int
+        :returns: data with `sadf`, null where no window fits
+        """
+        return self.get_sadf_symbols(
+            {"": data},
+            column=column,
+            lags=lags,
+            min_window=min_window,
+            max_window=max_window,
+            start_step=start_step,
+            use_log=use_log,
+            chunks_per_symbol=chunks_per_symbol,
+        )[""]
+
+    @log_execution
+    def get_sadf_symbols(
+        self,
+        data: dict[str, DataFrame],
+        column: str = "close",
+        lags: int = 1,
+        min_window: int = 50,
+        max_window: int | None = None,
+        start_step: int = 1,
+        use_log: bool = True,
+        chunks_per_symbol: int = 64,
+    ) -> dict[str, DataFrame]:
+        """
+        SADF of many symbols, chunks of window ends of all symbols share one pool.
+        See get_sadf for params.
+
+        :param data: {symbol: frame}
+        :type data: dict[str, pl.DataFrame]
+        :returns: {symbol: frame with `sadf`}
+        """
+        prefixes = {}
+        tasks = []
+        for symbol, df in data.items():
+            values = df[column].to_numpy().astype(float64)
+            prefixes[symbol] = get_adf_prefix_sums(
+                log(values) if use_log else values, lags
+            )
+            rows = arange(prefixes[symbol][2].size - 1)
+            # cost of a window end grows with the amount of starts, so chunks are
+            # cut by cumulative cost rather than by count
+            cost = cumsum(
+                rows + 1 if max_window is None else minimum(rows + 1, max_window)
+            )
+            bounds = cost.searchsorted(
+                arange(1, chunks_per_symbol) * cost[-1] / chunks_per_symbol
+            )
+            for chunk in array_split(rows, bounds):
+                if chunk.size:
+                    tasks.append((symbol, chunk, min_window, max_window, start_step))
+
+        sadf = {symbol: full(df.height, float("nan")) for symbol, df in data.items()}
+        shared_memory, layout = share_prefixes(prefixes)
+        del prefixes
+        try:
+            with ProcessPoolExecutor(
+                max_workers=self.n_jobs,
+                mp_context=get_context("spawn"),
+                initializer=init_sadf_worker,
+                initargs=(shared_memory.name, layout),
+            ) as executor:
+                for symbol, rows, values in tqdm(
+                    executor.map(run_sadf_task, tasks), total=len(tasks), desc="SADF"
+                ):
+                    # regression row r ends at bar r + lags + 1
+                    sadf[symbol][rows + lags + 1] = values
+        finally:
+            shared_memory.close()
+            shared_memory.unlink()
+
+        return {
+            symbol: df.with_columns(Series("sadf", sadf[symbol]).fill_nan(None))
+            for symbol, df in data.items()
+        }
+
+    # ---=== STATIC METHODS ===---
+    @staticmethod
+    def get_gsadf(data: DataFrame, column: str = "sadf") -> float:
+        """
+        GSADF statistic of the sample, the sup of the per bar SADF over all ends
+        """
+        return float(data[column].max())
@@ -1,2 +1,141 @@
-# TODO: on the example of this file, in feature_engine package will be a features that we want to extract from data.
-# TODO: these features will be ingested into our strategies, or dataframes.
+from engine.apps.feature_engine.pipelines.feature_pipeline import FeaturePipeline
+from polars import col, Expr, int_range, len as length, max_horizontal, when
+
+# Basic technical features as polars expressions. Every function returns an
+# expression over the kline columns (or over other registered features), so they
+# can be registered in a FeaturePipeline and share intermediate columns.
+
+
+def returns(column: str = "close", periods: int = 1) -> Expr:
+    return col(column).pct_change(periods)
+
+
+def log_returns(column: str = "close", periods: int = 1) -> Expr:
+    return col(column).log().diff(periods)
+
+
+def sma(column: str = "close", window: int = 20) -> Expr:
+    return col(column).rolling_mean(window)
+
+
+def ema(column: str = "close", span: int = 20) -> Expr:
+    """
+    Exponential moving average seeded at the first value, like pandas
+    ewm(span, adjust=False)
+    """
+    return col(column).ewm_mean(span=span, adjust=False, min_samples=span)
+
+
+def rolling_std(column: str = "close", window: int = 20, ddof: int = 1) -> Expr:
+    return col(column).rolling_std(window, ddof=ddof)
+
+
+def rsi(column: str = "close", window: int = 14) -> Expr:
+    """
+    Relative strength index with Wilder smoothing, same values as
+    ta.momentum.RSIIndicator over the full history
+    """
+    change = col(column).diff().fill_null(0.0)
+    up = change.clip(lower_bound=0).ewm_mean(
+        alpha=1 / window, adjust=False, min_samples=window
+    )
+    down = (
+        (-change)
+        .clip(lower_bound=0)
+        .ewm_mean(alpha=1 / window, adjust=False, min_samples=window)
+    )
+    return when(down == 0).then(100.0).otherwise(100 - 100 / (1 + up / down))
+
+
+def true_range() -> Expr:
+    previous_close = col("close").shift(1)
+    return max_horizontal(
+        col("high") - col("low"),
+        (col("high") - previous_close).abs(),
+        (col("low") - previous_close).abs(),
+    )
+
+
+def wilder_mean(values: Expr, window: int) -> Expr:
+    """
+    Wilder smoothing seeded with the mean of the first window values,
+    m_t = (m_{t-1} * (window - 1) + x_t) / window
+    """
+    position = int_range(length())
+    seeded = (
+        when(position == window - 1)
+        .then(values.head(window).mean())
+        .when(position >= window)
+        .then(values)
+    )
+    return seeded.ewm_mean(alpha=1 / window, adjust=False)
+
+
+def atr(window: int = 14, true_range_column: str | None = None) -> Expr:
+    """
+    Average true range with Wilder smoothing, same values as
+    ta.volatility.AverageTrueRange after the warm up
+
+    :param true_range_column: registered true range feature to reuse, computed
+        inline if None
+    :type true_range_column: str | None
+    """
+    values = col(true_range_column) if true_range_column else true_range()
+    return wilder_mean(values, window)
+
+
+def bollinger_band(
+    mean_column: str, std_column: str, column: str = "close", width: float = 2.0
+) -> Expr:
+    """
+    Position of the column inside the Bollinger band, 0 at the lower and 1 at the
+    upper band, from registered rolling mean and std features. The std feature
+    should be the population std (ddof=0), as in ta.volatility.BollingerBands
+    """
+    lower = col(mean_column) - width * col(std_column)
+    return (col(column) - lower) / (2 * width * col(std_column))
+
+
+def macd(fast_column: str, slow_column: str) -> Expr:
+    return col(fast_column) - col(slow_column)
+
+
+def macd_signal(macd_column: str, span: int = 9) -> Expr:
+    return ema(macd_column, span)
+
+
+def get_basic_pipeline(
+    symbol_column: str | None = "symbol",
+    time_column: str = "open_time",
+    log_level: int = 10,
+) -> FeaturePipeline:
+    """
+    Default set of basic features. Moving averages, EMAs and the rolling std are
+    registered once as intermediate features and reused by Bollinger and MACD.
+
+    :param symbol_column: column separating symbols, None for one symbol
+    :type symbol_column: str | None
+    :param time_column: column the rows of every symbol are ordered by
+    :type time_column: str
+    :returns: FeaturePipeline
+    """
+    pipeline = FeaturePipeline(
+        symbol_column=symbol_column, time_column=time_column, log_level=log_level
+    )
+    pipeline.add("returns", returns())
+    pipeline.add("log_returns", log_returns())
+    pipeline.add("volatility_20", rolling_std("log_returns", 20))
+    pipeline.add("rsi_14", rsi(window=14))
+    pipeline.add("true_range", true_range(), keep=False)
+    pipeline.add("atr_14", atr(14, "true_range"))
+
+    pipeline.add("sma_20", sma(window=20))
+    pipeline.add("std_20", rolling_std(window=20, ddof=0), keep=False)
+    pipeline.add("bollinger_20", bollinger_band("sma_20", "std_20"))
+
+    pipeline.add("ema_12", ema(span=12), keep=False)
+    pipeline.add("ema_26", ema(span=26), keep=False)
+    pipeline.add("macd", macd("ema_12", "ema_26"))
+    pipeline.add("macd_signal", macd_signal("macd"))
+    pipeline.add("macd_histogram", col("macd") - col("macd_signal"))
+    return pipeline
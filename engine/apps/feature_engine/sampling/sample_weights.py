@@ -0,0 +1,220 @@
+from math import ceil, sqrt
+from numpy import (
+    abs as absolute,
+    add,
+    arange,
+    argsort,
+    asarray,
+    bincount,
+    clip,
+    concatenate,
+    cumsum,
+    float64,
+    int64,
+    maximum,
+    ndarray,
+    ones,
+    searchsorted,
+    zeros,
+)
+from numpy.random import default_rng
+from polars import DataFrame, Series
+from utils.logger.logger import LoggerWrapper, log_execution
+
+
+def get_concurrency(starts: ndarray, ends: ndarray, size: int | None = None) -> ndarray:
+    """
+    Amount of events alive at every bar, from a difference array in O(T + N).
+    Events span [start, end], both inclusive.
+
+    :param starts: first bar of every event
+    :type starts: np.ndarray
+    :param ends: last bar of every event (e.g. `exit` of the labeller)
+    :type ends: np.ndarray
+    :param size: amount of bars, max(ends) + 1 if None
+    :type size: int | None
+    :returns: np.ndarray of counts per bar
+    """
+    starts = asarray(starts, dtype=int64)
+    ends = asarray(ends, dtype=int64)
+    if size is None:
+        size = int(ends.max()) + 1 if ends.size else 0
+
+    changes = bincount(starts, minlength=size + 1) - bincount(
+        ends + 1, minlength=size + 1
+    )
+    return cumsum(changes[:size])
+
+
+def get_average_uniqueness(
+    starts: ndarray, ends: ndarray, concurrency: ndarray | None = None
+) -> ndarray:
+    """
+    Average uniqueness of every event, mean of 1 / concurrency over its lifespan
+    (AFML 4.2), from prefix sums in O(T + N).
+
+    :returns: np.ndarray in (0, 1], one value per event
+    """
+    starts = asarray(starts, dtype=int64)
+    ends = asarray(ends, dtype=int64)
+    if concurrency is None:
+        concurrency = get_concurrency(starts, ends)
+
+    prefix = concatenate(([0.0], cumsum(1.0 / maximum(concurrency, 1))))
+    return (prefix[ends + 1] - prefix[starts]) / (ends - starts + 1)
+
+
+def get_return_weights(
+    starts: ndarray,
+    ends: ndarray,
+    returns: ndarray,
+    concurrency: ndarray | None = None,
+) -> ndarray:
+    """
+    Sample weights by absolute return attribution (AFML 4.10): |sum of r_t / c_t|
+    over the lifespan of every event, scaled to sum to the amount of events.
+
+    :param returns: log return of every bar
+    :type returns: np.ndarray
+    :returns: np.ndarray, one weight per event
+    """
+    starts = asarray(starts, dtype=int64)
+    ends = asarray(ends, dtype=int64)
+    if concurrency is None:
+        concurrency = get_concurrency(starts, ends, size=len(returns))
+
+    attributed = asarray(returns, dtype=float64)[: concurrency.size] / maximum(
+        concurrency, 1
+    )
+    prefix = concatenate(([0.0], cumsum(attributed)))
+    weights = absolute(prefix[ends + 1] - prefix[starts])
+    total = weights.sum()
+    return weights * weights.size / total if total > 0 else ones(weights.size)
+
+
+def sequential_bootstrap(
+    starts: ndarray,
+    ends: ndarray,
+    n_samples: int | None = None,
+    seed: int | None = None,
+) -> ndarray:
+    """
+    Sequential bootstrap (AFML 4.5): every draw picks an event with probability
+    proportional to its average uniqueness given the events drawn so far.
+
+    No T x N indicator matrix is built. Every event keeps a running sum of
+    1 / (c_t + 1) over its lifespan; a draw only touches the bars of the drawn
+    event and the events overlapping them, which are a contiguous range once
+    events are sorted by start. Sampling goes through sqrt(N) block sums, so a
+    draw costs O(sqrt(N) + overlap) instead of O(T * N).
+
+    :param starts: first bar of every event
+    :type starts: np.ndarray
+    :param ends: last bar of every event
+    :type ends: np.ndarray
+    :param n_samples: amount of draws, amount of events if None
+    :type n_samples: int | None
+    :param seed: seed of the random generator
+    :type seed: int | None
+    :returns: np.ndarray of drawn event indexes (positions in starts)
+    """
+    starts = asarray(starts, dtype=int64)
+    ends = asarray(ends, dtype=int64)
+    size = starts.size
+    if n_samples is None:
+        n_samples = size
+    if size == 0:
+        return zeros(0, dtype=int64)
+
+    order = argsort(starts, kind="stable")
+    offset = starts.min()
+    start = starts[order] - offset
+    end = ends[order] - offset
+    lengths = end - start + 1
+    max_length = int(lengths.max())
+
+    counts = zeros(int(end.max()) + 1, dtype=int64)
+    score = lengths.astype(float64)
+    weights = ones(size)
+
+    block = max(int(ceil(sqrt(size))), 1)
+    block_starts = arange(0, size, block)
+    block_sums = add.reduceat(weights, block_starts)
+
+    rng = default_rng(seed)
+    draws = rng.random(n_samples)
+    sample = zeros(n_samples, dtype=int64)
+    for k in range(n_samples):
+        block_cumsum = cumsum(block_sums)
+        target = draws[k] * block_cumsum[-1]
+        b = min(
+            int(searchsorted(block_cumsum, target, side="right")), block_sums.size - 1
+        )
+        target -= block_cumsum[b - 1] if b > 0 else 0.0
+        low = b * block
+        high = min(low + block, size)
+        i = low + int(searchsorted(cumsum(weights[low:high]), target, side="right"))
+        i = min(i, high - 1)
+        sample[k] = order[i]
+
+        # 1 / (c + 1) -> 1 / (c + 2) on the bars of the drawn event
+        first, last = start[i], end[i]
+        alive = counts[first : last + 1]
+        prefix = concatenate(([0.0], cumsum(1.0 / (alive + 2) - 1.0 / (alive + 1))))
+        alive += 1
+
+        low = int(searchsorted(start, first - max_length + 1, side="left"))
+        high = int(searchsorted(start, last, side="right"))
+        overlap_start = clip(start[low:high] - first, 0, last - first + 1)
+        overlap_end = clip(end[low:high] - first + 1, 0, last - first + 1)
+        score[low:high] += (
+            prefix[maximum(overlap_end, overlap_start)] - prefix[overlap_start]
+        )
+        weights[low:high] = score[low:high] / lengths[low:high]
+
+        first_block = low // block
+        last_block = (high - 1) // block + 1
+        block_sums[first_block:last_block] = add.reduceat(
+            weights[first_block * block : min(last_block * block, size)],
+            block_starts[first_block:last_block] - first_block * block,
+        )
+
+    return sample
+
+
+class SampleWeights:
+    def __init__(self, log_level: int = 10):
+        self.logger = LoggerWrapper(name="Sample Weights Module", level=log_level)
+
+    @log_execution
+    def get_uniqueness(
+        self, labels: DataFrame, start: str = "event", end: str = "exit"
+    ) -> DataFrame:
+        """
+        Concurrency based weights of labelled events, e.g. TripleBarrierLabeller output
+
+        :param labels: frame with first and last bar index of every event
+        :type labels: pl.DataFrame
+        :returns: labels with an `uniqueness` column
+        """
+        uniqueness = get_average_uniqueness(
+            labels[start].to_numpy(), labels[end].to_numpy()
+        )
+        return labels.with_columns(Series("uniqueness", uniqueness))
+
+    @log_execution
+    def get_bootstrap(
+        self,
+        labels: DataFrame,
+        n_samples: int | None = None,
+        seed: int | None = None,
+        start: str = "event",
+        end: str = "exit",
+    ) -> DataFrame:
+        """
+        Rows of labels drawn by the sequential bootstrap, with repetitions
+        """
+        sample = sequential_bootstrap(
+            labels[start].to_numpy(), labels[end].to_numpy(), n_samples, seed
+        )
+        return labels[sample]
@@ -0,0 +1,238 @@
+from numpy import (
+    arange,
+    asarray,
+    broadcast_to,
+    float64,
+    full,
+    inf,
+    int64,
+    maximum,
+    minimum,
+    ndarray,
+    where,
+)
+from polars import DataFrame
+from utils.logger.logger import LoggerWrapper, log_execution
+
+
+def build_range_table(values: ndarray, levels: int, upper: bool) -> list[ndarray]:
+    """
+    Sparse table of range extremes: table[k][i] is the max (upper=True) or the min of
+    values[i : i + 2**k]. Positions past the end are padded with -inf / inf, so they
+    never count as a touch.
+
+    :param values: highs for the upper table, lows for the lower one
+    :type values: np.ndarray
+    :param levels: amount of levels, ranges up to 2**(levels - 1) long
+    :type levels: int
+    :param upper: max table if True, min table otherwise
+    :type upper: bool
+    :returns: list of arrays of len(values)
+    """
+    reduce = maximum if upper else minimum
+    padding = -inf if upper else inf
+
+    table = [asarray(values, dtype=float64)]
+    for k in range(1, levels):
+        previous = table[-1]
+        step = 1 << (k - 1)
+        level = full(previous.size, padding)
+        level[:-step] = reduce(previous[:-step], previous[step:])
+        table.append(level)
+    return table
+
+
+def find_first_touch(
+    table: list[ndarray],
+    start: ndarray,
+    stop: ndarray,
+    level: ndarray,
+    upper: bool,
+) -> ndarray:
+    """
+    First index in [start, stop) where the series crosses `level` (high > level for
+    the upper barrier, low < level for the lower one), for all entries at once.
+
+    Binary lifting over the sparse table: from the largest range down, the cursor
+    jumps over every range that stays on the safe side of the barrier. Costs
+    O(len(table)) vectorized steps, independent of how far the touch is.
+
+    :param table: output of build_range_table
+    :type table: list[np.ndarray]
+    :param start: first index to check per entry
+    :type start: np.ndarray
+    :param stop: end of the search per entry, exclusive
+    :type stop: np.ndarray
+    :param level: barrier price per entry
+    :type level: np.ndarray
+    :param upper: upper barrier if True
+    :type upper: bool
+    :returns: np.ndarray of indexes, -1 where the barrier is not touched
+    """
+    size = table[0].size
+    position = start.copy()
+    for k in range(len(table) - 1, -1, -1):
+        step = 1 << k
+        extreme = table[k][minimum(position, size - 1)]
+        safe = extreme <= level if upper else extreme >= level
+        position = where((position + step <= stop) & safe, position + step, position)
+    return where(position < stop, position, -1)
+
+
+class FirstTouchIndex:
+    def __init__(
+        self,
+        high: ndarray,
+        low: ndarray,
+        close: ndarray,
+        max_horizon: int | None = None,
+        start_offset: int = 1,
+        log_level: int = 10,
+    ):
+        """
+        First touch of the upper and lower barriers for every possible entry of one
+        price series. Entries are filled at close[i] and barriers are checked from
+        candle i + start_offset on, with the same strict comparisons as Portfolio.
+        Portfolio also checks the entry candle itself, so its exits are reproduced
+        with start_offset=0; the default skips that candle, whose range lies before
+        the fill, as labelling needs.
+
+        :param high: high prices
+        :type high: np.ndarray
+        :param low: low prices
+        :type low: np.ndarray
+        :param close: close prices, entry prices for width based barriers
+        :type close: np.ndarray
+        :param max_horizon: longest search in candles (vertical barrier), the whole
+            series if None
+        :type max_horizon: int | None
+        :param start_offset: candles between the entry and the first checked candle,
+            0 to match Portfolio
+        :type start_offset: int
+        """
+        self.logger = LoggerWrapper(name="First Touch Module", level=log_level)
+
+        self.high = asarray(high, dtype=float64)
+        self.low = asarray(low, dtype=float64)
+        self.close = asarray(close, dtype=float64)
+        if not self.high.size == self.low.size == self.close.size:
+            raise ValueError("high, low and close must have the same length")
+
+        self.size = self.close.size
+        self.max_horizon = max_horizon or max(self.size, 1)
+        self.start_offset = start_offset
+
+        levels = max(int(self.max_horizon).bit_length(), 1)
+        self.upper_table = build_range_table(self.high, levels, upper=True)
+        self.lower_table = build_range_table(self.low, levels, upper=False)
+
+        self.upper_touches = {}
+        self.lower_touches = {}
+
+    @classmethod
+    def from_frame(cls, data: DataFrame, **kwargs) -> "FirstTouchIndex":
+        """
+        Build from klines or any Bars output with high, low and close columns
+        """
+        return cls(
+            high=data["high"].to_numpy(),
+            low=data["low"].to_numpy(),
+            close=data["close"].to_numpy(),
+            **kwargs,
+        )
+
+    @log_execution
+    def first_touch(
+        self,
+        entries: ndarray,
+        upper: ndarray | float,
+        lower: ndarray | float,
+        horizon: ndarray | int | None = None,
+    ) -> tuple[ndarray, ndarray]:
+        """
+        First touch indexes for arbitrary entries and absolute barrier prices
+
+        :param entries: entry indexes
+        :type entries: np.ndarray
+        :param upper: upper barrier price per entry, inf to disable
+        :type upper: np.ndarray | float
+        :param lower: lower barrier price per entry, -inf to disable
+        :type lower: np.ndarray | float
+        :param horizon: vertical barrier in candles per entry, capped by max_horizon
+        :type horizon: np.ndarray | int | None
+        :returns: (upper touch indexes, lower touch indexes), -1 if not touched
+        """
+        entries = asarray(entries, dtype=int64)
+        start, stop = self._get_search_range(entries, horizon)
+        upper = broadcast_to(asarray(upper, dtype=float64), entries.shape)
+        lower = broadcast_to(asarray(lower, dtype=float64), entries.shape)
+
+        return (
+            find_first_touch(self.upper_table, start, stop, upper, upper=True),
+            find_first_touch(self.lower_table, start, stop, lower, upper=False),
+        )
+
+    @log_execution
+    def precompute(self, widths: list[float]):
+        """
+        First touches of close * (1 + width) and close * (1 - width) for all entries,
+        so exits can be looked up in O(1) afterwards
+
+        :param widths: barrier widths as fractions of the entry price, e.g. 0.02
+        :type widths: list[float]
+        """
+        entries = arange(self.size, dtype=int64)
+        start, stop = self._get_search_range(entries, None)
+        for width in widths:
+            if width not in self.upper_touches:
+                self.upper_touches[width] = find_first_touch(
+                    self.upper_table, start, stop, self.close * (1 + width), True
+                )
+                self.lower_touches[width] = find_first_touch(
+                    self.lower_table, start, stop, self.close * (1 - width), False
+                )
+
+    def get_exit(
+        self, entry: int, take_profit: float, stop_loss: float, direction: str
+    ) -> tuple[int, str | None]:
+        """
+        Exit of a position opened at close[entry], using precomputed widths.
+        Take profit wins when both barriers are touched by the same candle, as in
+        Portfolio (see start_offset for the entry candle).
+
+        :param entry: entry index
+        :type entry: int
+        :param take_profit: take profit width, must be precomputed
+        :type take_profit: float
+        :param stop_loss: stop loss width, must be precomputed
+        :type stop_loss: float
+        :param direction: "BUY" or "SELL"
+        :type direction: str
+        :returns: (exit index, "TP" | "SL"), (-1, None) if no barrier is touched
+        """
+        if direction == "BUY":
+            tp_index = self.upper_touches[take_profit][entry]
+            sl_index = self.lower_touches[stop_loss][entry]
+        elif direction == "SELL":
+            tp_index = self.lower_touches[take_profit][entry]
+            sl_index = self.upper_touches[stop_loss][entry]
+        else:
+            raise ValueError(f"Invalid direction: {direction}")
+
+        if tp_index >= 0 and (sl_index < 0 or tp_index <= sl_index):
+            return int(tp_index), "TP"
+        if sl_index >= 0:
+            return int(sl_index), "SL"
+        return -1, None
+
+    # ---=== HELPER METHODS ===---
+    def _get_search_range(
+        self, entries: ndarray, horizon: ndarray | int | None
+    ) -> tuple[ndarray, ndarray]:
+        if horizon is None:
+            horizon = self.max_horizon
+        horizon = minimum(asarray(horizon, dtype=int64), self.max_horizon)
+
+        start = entries + self.start_offset
+        stop = minimum(start + horizon, self.size)
+        return minimum(start, self.size), stop
@@ -0,0 +1,131 @@
+from engine.core.buffers.ring_buffer import RingBuffer
+from numpy import int64, ndarray, stack
+from polars import DataFrame
+
+CANDLE_COLUMNS = ("open", "high", "low", "close", "volume")
+
+
+class CandleHistory:
+    def __init__(
+        self,
+        capacity: int = 1000,
+        columns: tuple[str, ...] = CANDLE_COLUMNS,
+        time_column: str = "open_time",
+    ):
+        """
+        Last `capacity` candles of one symbol in ring buffers, float columns in one
+        buffer and the timestamps in an int64 one
+
+        :param capacity: amount of candles kept
+        :type capacity: int
+        :param columns: float columns kept
+        :type columns: tuple[str, ...]
+        :param time_column: timestamp column
+        :type time_column: str
+        """
+        self.columns = columns
+        self.column_index = {name: i for i, name in enumerate(columns)}
+        self.time_column = time_column
+        self.values = RingBuffer(capacity, width=len(columns))
+        self.times = RingBuffer(capacity, dtype=int64)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def append(self, open_time: int, values):
+        """
+        :param open_time: timestamp of the candle
+        :type open_time: int
+        :param values: one value per column, in the order of columns
+        """
+        self.values.append(values)
+        self.times.append(open_time)
+
+    def extend(self, data: DataFrame):
+        """
+        Add many candles at once, e.g. to warm up from history
+        """
+        self.values.extend(data.select(self.columns).to_numpy().T)
+        self.times.extend(data[self.time_column].to_numpy())
+
+    def get(self, column: str, length: int | None = None) -> ndarray:
+        """
+        Zero copy, read only view of the last `length` values of a column, oldest
+        first. The view is into the ring buffer and later appends overwrite it, copy
+        it to keep the values.
+        """
+        if column == self.time_column:
+            return self.times.get_window(length)[0]
+        return self.values.get_window(length)[self.column_index[column]]
+
+    def last(self, column: str):
+        if column == self.time_column:
+            return self.times.last()[0]
+        return self.values.last()[self.column_index[column]]
+
+    def to_frame(self, length: int | None = None) -> DataFrame:
+        """
+        Copy of the last `length` candles as a polars frame
+        """
+        window = self.values.get_window(length)
+        data = {self.time_column: self.times.get_window(length)[0]}
+        data.update({name: window[i] for i, name in enumerate(self.columns)})
+        return DataFrame(data)
+
+
+class MarketHistory:
+    def __init__(
+        self,
+        capacity: int = 1000,
+        columns: tuple[str, ...] = CANDLE_COLUMNS,
+        time_column: str = "open_time",
+    ):
+        """
+        CandleHistory per symbol, created on the first candle of a symbol. Filled by
+        the backtest engine (and the paper trader) before the strategy is called.
+        """
+        self.capacity = capacity
+        self.columns = columns
+        self.time_column = time_column
+        self.symbols = {}
+
+    def __getitem__(self, symbol: str) -> CandleHistory:
+        return self.symbols[symbol]
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.symbols
+
+    def get_history(self, symbol: str) -> CandleHistory:
+        if symbol not in self.symbols:
+            self.symbols[symbol] = CandleHistory(
+                self.capacity, self.columns, self.time_column
+            )
+        return self.symbols[symbol]
+
+    def update(self, candles: dict[str, ndarray]):
+        """
+        Append the candles of one timestamp. The columns are stacked once and every
+        symbol's buffers get one column of that matrix, without building a row per
+        symbol.
+
+        :param candles: aligned arrays of symbol, time column and the columns, as
+            CandleFeed.get_batch returns
+        :type candles: dict[str, np.ndarray]
+        """
+        times = candles[self.time_column]
+        values = stack([candles[name] for name in self.columns])
+        for i, symbol in enumerate(candles["symbol"]):
+            self.get_history(symbol).append(times[i], values[:, i])
+
+    def update_symbol(self, symbol: str, candle: DataFrame):
+        """
+        Append the last row of a candle frame, e.g. a live kline
+        """
+        row = candle.row(-1, named=True)
+        self.get_history(symbol).append(
+            row[self.time_column], [row[name] for name in self.columns]
+        )
+
+    def extend(self, data: dict[str, DataFrame]):
+        for symbol, df in data.items():
+            self.get_history(symbol).extend(df)
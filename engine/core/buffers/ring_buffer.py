@@ -0,0 +1,96 @@
+from numpy import arange, asarray, dtype as to_dtype, float64, ndarray, zeros
+
+
+class RingBuffer:
+    def __init__(self, capacity: int, width: int = 1, dtype=float64):
+        """
+        Fixed capacity history of `width` parallel series. Storage is allocated once
+        and mirrored: every value is written at i and at i + capacity of a buffer of
+        2 * capacity, so the last n values are always one contiguous slice and
+        windows are views, never copies.
+
+        :param capacity: amount of values kept per series
+        :type capacity: int
+        :param width: amount of series, e.g. OHLCV columns
+        :type width: int
+        :param dtype: numpy dtype of the values
+        """
+        if capacity < 1:
+            raise ValueError(f"capacity must be positive, got {capacity}")
+        self.capacity = capacity
+        self.width = width
+        self.dtype = to_dtype(dtype)
+        self.data = zeros((width, 2 * capacity), dtype=self.dtype)
+        self.start = 0
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def full(self) -> bool:
+        return self.size == self.capacity
+
+    def append(self, values):
+        """
+        Add one value per series, no allocation
+
+        :param values: scalar if width is 1, else a sequence of width values
+        """
+        end = (self.start + self.size) % self.capacity
+        self.data[:, end] = values
+        self.data[:, end + self.capacity] = values
+        if self.size < self.capacity:
+            self.size += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+
+    def extend(self, values: ndarray):
+        """
+        Add many values at once
+
+        :param values: array of shape (width, n), or (n,) if width is 1
+        :type values: np.ndarray
+        """
+        values = asarray(values, dtype=self.dtype).reshape(self.width, -1)
+        count = values.shape[1]
+        if count >= self.capacity:
+            self.data[:, : self.capacity] = values[:, -self.capacity :]
+            self.data[:, self.capacity :] = values[:, -self.capacity :]
+            self.start = 0
+            self.size = self.capacity
+            return
+        positions = (self.start + self.size + arange(count)) % self.capacity
+        self.data[:, positions] = values
+        self.data[:, positions + self.capacity] = values
+        overflow = self.size + count - self.capacity
+        if overflow > 0:
+            self.start = (self.start + overflow) % self.capacity
+        self.size = min(self.size + count, self.capacity)
+
+    def get_window(self, length: int | None = None) -> ndarray:
+        """
+        Read only view of the last `length` values of every series. It is not a
+        snapshot: once the buffer wraps, later appends write into it.
+
+        :param length: amount of values, everything kept if None or larger
+        :type length: int | None
+        :returns: np.ndarray of shape (width, length), oldest first
+        """
+        length = self.size if length is None else min(length, self.size)
+        end = self.start + self.size
+        window = self.data[:, end - length : end]
+        window.flags.writeable = False
+        return window
+
+    def last(self) -> ndarray:
+        """
+        Latest value of every series
+        """
+        if not self.size:
+            raise IndexError("RingBuffer is empty")
+        return self.data[:, self.start + self.size - 1]
+
+    def clear(self):
+        self.start = 0
+        self.size = 0
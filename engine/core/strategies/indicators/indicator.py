@@ -0,0 +1,92 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from numpy import asarray, float64, ndarray
+from polars import Float64, Series
+
+
+class Indicator(ABC):
+    """
+    Abstract base class of an incremental indicator. update() takes one new value
+    and costs O(1), initialize() builds the same state from a history in one
+    vectorized pass.
+    """
+
+    def __init__(self):
+        self.value = None
+        self.count = 0
+
+    @abstractmethod
+    def update(self, *values: float) -> float | None:
+        """
+        Add one observation
+
+        :returns: current value, None during the warm up
+        """
+        pass
+
+    @abstractmethod
+    def initialize(self, *history: ndarray) -> float | None:
+        """
+        Replace the state with the one after updating with every value of history
+        """
+        pass
+
+    @property
+    def ready(self) -> bool:
+        return self.value is not None
+
+
+class RollingWindow:
+    def __init__(self, window: int):
+        """
+        Last `window` values with their sum and sum of squares. The sums are
+        recomputed from the window every `window` updates, so rounding errors do
+        not accumulate and the cost stays O(1) amortized.
+        """
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.total = 0.0
+        self.total_squares = 0.0
+        self.updates = 0
+
+    def update(self, value: float):
+        if len(self.values) == self.window:
+            oldest = self.values[0]
+            self.total -= oldest
+            self.total_squares -= oldest * oldest
+        self.values.append(value)
+        self.total += value
+        self.total_squares += value * value
+
+        self.updates += 1
+        if self.updates == self.window:
+            self._resum()
+
+    def initialize(self, history: ndarray):
+        history = asarray(history, dtype=float64)[-self.window :]
+        self.values = deque(history.tolist(), maxlen=self.window)
+        self._resum()
+
+    @property
+    def full(self) -> bool:
+        return len(self.values) == self.window
+
+    def mean(self) -> float:
+        return self.total / len(self.values)
+
+    def std(self) -> float:
+        mean = self.mean()
+        return max(self.total_squares / len(self.values) - mean * mean, 0.0) ** 0.5
+
+    # ---=== HELPER METHODS ===---
+    def _resum(self):
+        self.total = sum(self.values)
+        self.total_squares = sum(value * value for value in self.values)
+        self.updates = 0
+
+
+def get_last_ewm(values: ndarray, alpha: float) -> float:
+    """
+    Last value of m_t = m_{t-1} + alpha * (x_t - m_{t-1}) seeded with m_0 = x_0
+    """
+    return Series(values, dtype=Float64).ewm_mean(alpha=alpha, adjust=False)[-1]
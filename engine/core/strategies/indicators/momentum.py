@@ -0,0 +1,43 @@
+from engine.core.strategies.indicators.indicator import Indicator
+from engine.core.strategies.indicators.moving_averages import EMA
+from numpy import asarray, diff, float64, maximum, ndarray
+
+
+class RSI(Indicator):
+    def __init__(self, window: int = 14):
+        """
+        Relative strength index over the full history, same values as
+        ta.momentum.RSIIndicator and ta_basic.rsi
+        """
+        super().__init__()
+        self.up = EMA(alpha=1 / window, min_samples=window)
+        self.down = EMA(alpha=1 / window, min_samples=window)
+        self.previous = None
+
+    def update(self, value: float) -> float | None:
+        self.count += 1
+        change = 0.0 if self.previous is None else value - self.previous
+        self.previous = value
+        up = self.up.update(max(change, 0.0))
+        down = self.down.update(max(-change, 0.0))
+        self.value = self._get_rsi(up, down)
+        return self.value
+
+    def initialize(self, history: ndarray) -> float | None:
+        history = asarray(history, dtype=float64)
+        self.count = history.size
+        self.previous = float(history[-1]) if history.size else None
+        changes = diff(history, prepend=history[:1])
+        up = self.up.initialize(maximum(changes, 0.0))
+        down = self.down.initialize(maximum(-changes, 0.0))
+        self.value = self._get_rsi(up, down)
+        return self.value
+
+    # ---=== STATIC METHODS ===---
+    @staticmethod
+    def _get_rsi(up: float | None, down: float | None) -> float | None:
+        if up is None or down is None:
+            return None
+        if down == 0:
+            return 100.0
+        return 100 - 100 / (1 + up / down)
@@ -0,0 +1,102 @@
+from engine.core.strategies.indicators.indicator import (
+    get_last_ewm,
+    Indicator,
+    RollingWindow,
+)
+from numpy import asarray, concatenate, float64, ndarray
+
+
+class SMA(Indicator):
+    def __init__(self, window: int = 20):
+        """
+        Simple moving average of the last `window` values
+        """
+        super().__init__()
+        self.window = RollingWindow(window)
+
+    def update(self, value: float) -> float | None:
+        self.count += 1
+        self.window.update(value)
+        self.value = self.window.mean() if self.window.full else None
+        return self.value
+
+    def initialize(self, history: ndarray) -> float | None:
+        self.count = len(history)
+        self.window.initialize(history)
+        self.value = self.window.mean() if self.window.full else None
+        return self.value
+
+
+class EMA(Indicator):
+    def __init__(
+        self,
+        span: int | None = None,
+        alpha: float | None = None,
+        min_samples: int | None = None,
+    ):
+        """
+        Exponential moving average seeded at the first value, like pandas
+        ewm(adjust=False) and ta_basic.ema
+
+        :param span: span, alpha = 2 / (span + 1)
+        :type span: int | None
+        :param alpha: smoothing factor, used if span is None
+        :type alpha: float | None
+        :param min_samples: values needed before the average is reported, span by
+            default
+        :type min_samples: int | None
+        """
+        super().__init__()
+        if span is None and alpha is None:
+            raise ValueError("EMA needs span or alpha")
+        self.alpha = 2 / (span + 1) if span is not None else alpha
+        self.min_samples = min_samples if min_samples is not None else span or 1
+        self.mean = None
+
+    def update(self, value: float) -> float | None:
+        self.count += 1
+        if self.mean is None:
+            self.mean = value
+        else:
+            self.mean += self.alpha * (value - self.mean)
+        self.value = self.mean if self.count >= self.min_samples else None
+        return self.value
+
+    def initialize(self, history: ndarray) -> float | None:
+        self.count = len(history)
+        self.mean = get_last_ewm(history, self.alpha) if self.count else None
+        self.value = self.mean if self.count >= self.min_samples else None
+        return self.value
+
+
+class WilderAverage(Indicator):
+    def __init__(self, window: int = 14):
+        """
+        Wilder smoothing seeded with the mean of the first `window` values,
+        m_t = (m_{t-1} * (window - 1) + x_t) / window, like ta_basic.wilder_mean
+        """
+        super().__init__()
+        self.window = window
+        self.total = 0.0
+
+    def update(self, value: float) -> float | None:
+        self.count += 1
+        if self.count < self.window:
+            self.total += value
+        elif self.count == self.window:
+            self.value = (self.total + value) / self.window
+        else:
+            self.value += (value - self.value) / self.window
+        return self.value
+
+    def initialize(self, history: ndarray) -> float | None:
+        history = asarray(history, dtype=float64)
+        self.count = history.size
+        self.total = float(history[: self.window - 1].sum())
+        self.value = None
+        if self.count >= self.window:
+            seed = history[: self.window].mean()
+            self.value = get_last_ewm(
+                concatenate([[seed], history[self.window :]]), 1 / self.window
+            )
+        return self.value
@@ -0,0 +1,52 @@
+from engine.core.strategies.indicators.indicator import Indicator
+from engine.core.strategies.indicators.moving_averages import EMA
+from numpy import asarray, float64, ndarray
+from polars import Series
+
+
+class MACD(Indicator):
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        """
+        Moving average convergence divergence, same values as ta.trend.MACD and
+        ta_basic.macd. value is the MACD line, signal and histogram are set
+        alongside. The signal EMA starts with the first MACD value.
+        """
+        super().__init__()
+        self.fast = EMA(span=fast)
+        self.slow = EMA(span=slow)
+        self.signal_average = EMA(span=signal)
+        self.signal = None
+        self.histogram = None
+
+    def update(self, value: float) -> float | None:
+        self.count += 1
+        fast = self.fast.update(value)
+        slow = self.slow.update(value)
+        if fast is None or slow is None:
+            return None
+        self.value = fast - slow
+        self.signal = self.signal_average.update(self.value)
+        self.histogram = None if self.signal is None else self.value - self.signal
+        return self.value
+
+    def initialize(self, history: ndarray) -> float | None:
+        history = asarray(history, dtype=float64)
+        self.count = history.size
+        self.fast.initialize(history)
+        self.slow.initialize(history)
+        self.value = self.signal = self.histogram = None
+        if self.fast.value is None or self.slow.value is None:
+            self.signal_average.initialize(history[:0])
+            return None
+
+        # MACD history is needed for the signal, taken from full EMA series
+        prices = Series(history)
+        start = max(self.fast.min_samples, self.slow.min_samples) - 1
+        line = (
+            prices.ewm_mean(alpha=self.fast.alpha, adjust=False)
+            - prices.ewm_mean(alpha=self.slow.alpha, adjust=False)
+        )[start:]
+        self.value = self.fast.value - self.slow.value
+        self.signal = self.signal_average.initialize(line.to_numpy())
+        self.histogram = None if self.signal is None else self.value - self.signal
+        return self.value
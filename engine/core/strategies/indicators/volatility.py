@@ -0,0 +1,86 @@
+from engine.core.strategies.indicators.indicator import Indicator, RollingWindow
+from engine.core.strategies.indicators.moving_averages import WilderAverage
+from numpy import abs as absolute, asarray, float64, maximum, ndarray
+
+
+class ATR(Indicator):
+    def __init__(self, window: int = 14):
+        """
+        Average true range with Wilder smoothing, same values as
+        ta.volatility.AverageTrueRange and ta_basic.atr after the warm up
+        """
+        super().__init__()
+        self.average = WilderAverage(window)
+        self.previous_close = None
+
+    def update(self, high: float, low: float, close: float) -> float | None:
+        self.count += 1
+        true_range = high - low
+        if self.previous_close is not None:
+            true_range = max(
+                true_range,
+                abs(high - self.previous_close),
+                abs(low - self.previous_close),
+            )
+        self.previous_close = close
+        self.value = self.average.update(true_range)
+        return self.value
+
+    def initialize(self, high: ndarray, low: ndarray, close: ndarray) -> float | None:
+        high, low, close = (asarray(x, dtype=float64) for x in (high, low, close))
+        self.count = close.size
+        self.previous_close = float(close[-1]) if close.size else None
+
+        true_range = high - low
+        previous_close = close[:-1]
+        true_range[1:] = maximum(
+            true_range[1:],
+            maximum(
+                absolute(high[1:] - previous_close), absolute(low[1:] - previous_close)
+            ),
+        )
+        self.value = self.average.initialize(true_range)
+        return self.value
+
+
+class BollingerBands(Indicator):
+    def __init__(self, window: int = 20, width: float = 2.0):
+        """
+        Moving average with bands `width` population standard deviations away, like
+        ta.volatility.BollingerBands. value is the middle band, upper and lower are
+        set alongside.
+        """
+        super().__init__()
+        self.window = RollingWindow(window)
+        self.width = width
+        self.upper = None
+        self.lower = None
+
+    def update(self, value: float) -> float | None:
+        self.count += 1
+        self.window.update(value)
+        return self._set_bands()
+
+    def initialize(self, history: ndarray) -> float | None:
+        self.count = len(history)
+        self.window.initialize(history)
+        return self._set_bands()
+
+    def get_position(self, value: float) -> float | None:
+        """
+        Position of value inside the bands, 0 at the lower and 1 at the upper band
+        """
+        if not self.ready or self.upper == self.lower:
+            return None
+        return (value - self.lower) / (self.upper - self.lower)
+
+    # ---=== HELPER METHODS ===---
+    def _set_bands(self) -> float | None:
+        if not self.window.full:
+            self.value = self.upper = self.lower = None
+            return None
+        self.value = self.window.mean()
+        deviation = self.width * self.window.std()
+        self.upper = self.value + deviation
+        self.lower = self.value - deviation
+        return self.value
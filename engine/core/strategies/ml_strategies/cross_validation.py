@@ -0,0 +1,351 @@
+from collections.abc import Callable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from math import comb
+from multiprocessing import get_context
+from numpy import (
+    argsort,
+    array_split,
+    asarray,
+    concatenate,
+    flatnonzero,
+    int64,
+    maximum,
+    minimum,
+    ndarray,
+    searchsorted,
+    zeros,
+)
+from polars import DataFrame
+from tqdm import tqdm
+from utils.logger.logger import LoggerWrapper, log_execution
+
+
+def get_train_mask(
+    starts: ndarray, ends: ndarray, test_starts: ndarray, test_ends: ndarray
+) -> ndarray:
+    """
+    Events that overlap none of the forbidden intervals [test_start, test_end].
+
+    Intervals are sorted and merged once, then every event looks up the first
+    interval ending at or after its start with a binary search, so the cost is
+    O((N + G) log G) instead of comparing all event pairs.
+
+    :param starts: start of every event
+    :type starts: np.ndarray
+    :param ends: end of every event
+    :type ends: np.ndarray
+    :param test_starts: start of every forbidden interval
+    :type test_starts: np.ndarray
+    :param test_ends: end of every forbidden interval (embargo included)
+    :type test_ends: np.ndarray
+    :returns: boolean np.ndarray, True for events usable for training
+    """
+    order = argsort(test_starts)
+    interval_starts = asarray(test_starts)[order]
+    interval_ends = maximum.accumulate(asarray(test_ends)[order])
+
+    # merged intervals: a new one begins where the start passes all previous ends
+    new = interval_starts[1:] > interval_ends[:-1]
+    first = flatnonzero([True, *new])
+    last = [*(first[1:] - 1), interval_starts.size - 1]
+    merged_starts = interval_starts[first]
+    merged_ends = interval_ends[last]
+
+    position = searchsorted(merged_ends, starts, side="left")
+    inside = position < merged_ends.size
+    overlapping = inside & (
+        merged_starts[minimum(position, merged_ends.size - 1)] <= ends
+    )
+    return ~overlapping
+
+
+class PurgedKFold:
+    def __init__(self, n_splits: int = 5, embargo: float = 0.0):
+        """
+        K-fold over events sorted by start, without shuffling. Training events whose
+        [start, end] overlaps the time span of the test fold are purged, and the
+        span is extended by an embargo after the fold (AFML ch. 7).
+
+        :param n_splits: amount of folds
+        :type n_splits: int
+        :param embargo: embargo as a fraction of the whole time span of the events
+        :type embargo: float
+        """
+        if n_splits < 2:
+            raise ValueError(f"n_splits must be at least 2, got {n_splits}")
+        self.n_splits = n_splits
+        self.embargo = embargo
+
+    def get_n_splits(self) -> int:
+        return self.n_splits
+
+    def split(
+        self, starts: ndarray, ends: ndarray
+    ) -> Iterator[tuple[ndarray, ndarray]]:
+        """
+        :param starts: start of every event (e.g. `event` or `t0` of the labeller),
+            sorted ascending
+        :type starts: np.ndarray
+        :param ends: end of every event (e.g. `exit` or `t1`)
+        :type ends: np.ndarray
+        :returns: iterator of (train indexes, test indexes)
+        """
+        starts, ends, embargo = self._prepare(starts, ends)
+        for test in array_split(range(starts.size), self.n_splits):
+            test = asarray(test, dtype=int64)
+            train_mask = get_train_mask(
+                starts,
+                ends,
+                starts[test[:1]],
+                asarray([ends[test].max() + embargo]),
+            )
+            yield flatnonzero(train_mask), test
+
+    def _prepare(
+        self, starts: ndarray, ends: ndarray
+    ) -> tuple[ndarray, ndarray, float]:
+        starts = asarray(starts)
+        ends = asarray(ends)
+        if starts.size < self.get_n_groups():
+            raise ValueError(
+                f"Got {starts.size} events for {self.get_n_groups()} folds"
+            )
+        if (starts[1:] < starts[:-1]).any():
+            raise ValueError("Events must be sorted by start")
+        embargo = self.embargo * (ends.max() - starts.min())
+        return starts, ends, embargo
+
+    def get_n_groups(self) -> int:
+        return self.n_splits
+
+
+class CombinatorialPurgedKFold(PurgedKFold):
+    def __init__(self, n_groups: int = 6, n_test_groups: int = 2, embargo: float = 0.0):
+        """
+        Combinatorial purged CV (AFML ch. 12). Events are cut into n_groups
+        contiguous groups and every combination of n_test_groups groups is a test
+        set, purged and embargoed like PurgedKFold. The test sets recombine into
+        get_n_paths() full backtest paths.
+
+        :param n_groups: amount of groups
+        :type n_groups: int
+        :param n_test_groups: groups in every test set
+        :type n_test_groups: int
+        :param embargo: embargo as a fraction of the whole time span of the events
+        :type embargo: float
+        """
+        if not 0 < n_test_groups < n_groups:
+            raise ValueError(
+                f"n_test_groups must be in (0, {n_groups}), got {n_test_groups}"
+            )
+        super().__init__(n_splits=n_groups, embargo=embargo)
+        self.n_groups = n_groups
+        self.n_test_groups = n_test_groups
+        self.combinations = list(combinations(range(n_groups), n_test_groups))
+
+    def get_n_splits(self) -> int:
+        return len(self.combinations)
+
+    def get_n_groups(self) -> int:
+        return self.n_groups
+
+    def get_n_paths(self) -> int:
+        return comb(self.n_groups - 1, self.n_test_groups - 1)
+
+    def split(
+        self, starts: ndarray, ends: ndarray
+    ) -> Iterator[tuple[ndarray, ndarray]]:
+        starts, ends, embargo = self._prepare(starts, ends)
+        groups = [
+            asarray(group, dtype=int64)
+            for group in array_split(range(starts.size), self.n_groups)
+        ]
+        for test_groups in self.combinations:
+            test = [groups[g] for g in test_groups]
+            train_mask = get_train_mask(
+                starts,
+                ends,
+                asarray([starts[group[0]] for group in test]),
+                asarray([ends[group].max() + embargo for group in test]),
+            )
+            yield flatnonzero(train_mask), concatenate(test)
+
+    def get_paths(self) -> list[list[tuple[int, int]]]:
+        """
+        Backtest paths: every path is a list of (split index, group) covering all
+        groups once, the j-th path of a group takes the j-th split testing it
+        """
+        splits_by_group = [[] for _ in range(self.n_groups)]
+        for split_index, test_groups in enumerate(self.combinations):
+            for group in test_groups:
+                splits_by_group[group].append(split_index)
+        return [
+            [(splits_by_group[group][path], group) for group in range(self.n_groups)]
+            for path in range(self.get_n_paths())
+        ]
+
+
+def accuracy(y_true: ndarray, y_pred: ndarray) -> float:
+    return float((asarray(y_true) == asarray(y_pred)).mean())
+
+
+WORKER_CONTEXT = {}
+
+
+def init_validation_worker(
+    model_factory: Callable,
+    scoring: Callable,
+    X: ndarray,
+    y: ndarray,
+    sample_weight: ndarray | None,
+):
+    """
+    Pool initializer. The data is sent to every worker once, tasks only carry
+    indexes.
+    """
+    WORKER_CONTEXT.update(
+        model_factory=model_factory,
+        scoring=scoring,
+        X=X,
+        y=y,
+        sample_weight=sample_weight,
+    )
+
+
+def evaluate_split(task: tuple) -> dict:
+    """
+    Pool task. Fits a fresh model on the train indexes and scores it on the test
+    indexes.
+
+    :param task: (split index, train indexes, test indexes)
+    :type task: tuple
+    :returns: {"split", "train size", "test size", "score", "test", "prediction"}
+    """
+    split_index, train, test = task
+    X, y = WORKER_CONTEXT["X"], WORKER_CONTEXT["y"]
+    sample_weight = WORKER_CONTEXT["sample_weight"]
+
+    model = WORKER_CONTEXT["model_factory"]()
+    if sample_weight is None:
+        model.fit(X[train], y[train])
+    else:
+        model.fit(X[train], y[train], sample_weight=sample_weight[train])
+
+    prediction = asarray(model.predict(X[test]))
+    return {
+        "split": split_index,
+        "train size": train.size,
+        "test size": test.size,
+        "score": WORKER_CONTEXT["scoring"](y[test], prediction),
+        "test": test,
+        "prediction": prediction,
+    }
+
+
+class ModelValidator:
+    def __init__(
+        self,
+        model_factory: Callable,
+        scoring: Callable[[ndarray, ndarray], float] = accuracy,
+        n_jobs: int | None = None,
+        log_level: int = 10,
+    ):
+        """
+        Trains and evaluates a model on every split of a purged splitter in a process
+        pool
+
+        :param model_factory: picklable callable returning an unfitted model with
+            fit(X, y[, sample_weight]) and predict(X), e.g. a model class
+        :type model_factory: Callable
+        :param scoring: score(y_true, y_pred), accuracy by default
+        :type scoring: Callable[[np.ndarray, np.ndarray], float]
+        :param n_jobs: amount of worker processes, cpu count if None
+        :type n_jobs: int | None
+        """
+        self.logger = LoggerWrapper(name="Model Validation Module", level=log_level)
+        self.model_factory = model_factory
+        self.scoring = scoring
+        self.n_jobs = n_jobs
+        self.results = []
+        self.n_events = 0
+
+    @log_execution
+    def cross_validate(
+        self,
+        X: ndarray,
+        y: ndarray,
+        starts: ndarray,
+        ends: ndarray,
+        splitter: PurgedKFold,
+        sample_weight: ndarray | None = None,
+    ) -> DataFrame:
+        """
+        :param X: features, one row per event sorted by start
+        :type X: np.ndarray
+        :param y: labels
+        :type y: np.ndarray
+        :param starts: start of every event
+        :type starts: np.ndarray
+        :param ends: end of every event
+        :type ends: np.ndarray
+        :param splitter: PurgedKFold or CombinatorialPurgedKFold
+        :type splitter: PurgedKFold
+        :param sample_weight: e.g. average uniqueness of the events
+        :type sample_weight: np.ndarray | None
+        :returns: pl.DataFrame with one row per split
+        """
+        X, y = asarray(X), asarray(y)
+        self.n_events = y.size
+        if sample_weight is not None:
+            sample_weight = asarray(sample_weight)
+
+        tasks = [
+            (split_index, train, test)
+            for split_index, (train, test) in enumerate(splitter.split(starts, ends))
+        ]
+
+        with ProcessPoolExecutor(
+            max_workers=self.n_jobs,
+            mp_context=get_context("spawn"),
+            initializer=init_validation_worker,
+            initargs=(self.model_factory, self.scoring, X, y, sample_weight),
+        ) as executor:
+            self.results = list(
+                tqdm(
+                    executor.map(evaluate_split, tasks),
+                    total=len(tasks),
+                    desc="Cross validating",
+                )
+            )
+
+        return DataFrame(
+            [
+                {
+                    key: result[key]
+                    for key in ("split", "train size", "test size", "score")
+                }
+                for result in self.results
+            ]
+        )
+
+    @log_execution
+    def get_path_predictions(self, splitter: CombinatorialPurgedKFold) -> ndarray:
+        """
+        Out of sample predictions of every CPCV backtest path, from the last
+        cross_validate run
+
+        :returns: np.ndarray of shape (n_paths, n_events)
+        """
+        n_events = self.n_events
+        predictions = zeros(
+            (splitter.get_n_paths(), n_events),
+            dtype=self.results[0]["prediction"].dtype,
+        )
+        groups = array_split(range(n_events), splitter.n_groups)
+        for path_index, path in enumerate(splitter.get_paths()):
+            for split_index, group in path:
+                result = self.results[split_index]
+                position = searchsorted(result["test"], asarray(groups[group]))
+                predictions[path_index, groups[group]] = result["prediction"][position]
+        return predictions
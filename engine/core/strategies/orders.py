@@ -0,0 +1,55 @@
+from numpy import asarray, full, ndarray
+from polars import DataFrame
+from utils.global_variables.SCHEMAS import ORDER_HISTORY_SCHEMA
+
+
+def build_orders(
+    symbols: ndarray,
+    directions: ndarray,
+    volumes: ndarray | float,
+    entry_prices: ndarray,
+    take_profits: ndarray,
+    stop_losses: ndarray,
+    order_time: int,
+    strategy: str,
+    order_type: str = "MARKET",
+) -> DataFrame:
+    """
+    Columnar block of pending orders, one row per symbol, for
+    Strategy.generate_orders. Order ids are assigned by the Portfolio.
+
+    :param symbols: symbol of every order
+    :type symbols: np.ndarray
+    :param directions: "BUY" or "SELL" per order
+    :type directions: np.ndarray
+    :param volumes: volume per order, or one volume for all
+    :type volumes: np.ndarray | float
+    :param entry_prices: expected entry price per order
+    :type entry_prices: np.ndarray
+    :param take_profits: take profit price per order
+    :type take_profits: np.ndarray
+    :param stop_losses: stop loss price per order
+    :type stop_losses: np.ndarray
+    :param order_time: timestamp of the candle generating the orders
+    :type order_time: int
+    :param strategy: strategy name
+    :type strategy: str
+    :returns: pl.DataFrame with ORDER_HISTORY_SCHEMA
+    """
+    size = len(symbols)
+    return DataFrame(
+        {
+            "order_id": full(size, 0),
+            "symbol": asarray(symbols),
+            "volume": full(size, volumes, dtype=float),
+            "direction": asarray(directions),
+            "order_type": full(size, order_type),
+            "order_time": full(size, order_time),
+            "strategy": full(size, strategy),
+            "status": full(size, "PENDING"),
+            "entry_price": asarray(entry_prices),
+            "take_profit": asarray(take_profits),
+            "stop_loss": asarray(stop_losses),
+        },
+        schema=ORDER_HISTORY_SCHEMA,
+    )
@@ -0,0 +1,87 @@
+from engine.core.strategies.strategy import Strategy
+from numpy import ndarray
+from polars import DataFrame
+
+
+class PrecomputedData:
+    def __init__(self, data: dict[str, DataFrame]):
+        """
+        Columns computed by Strategy.prepare over the full history, read step by
+        step. The engine moves the current row of every symbol forward as the
+        backtest goes and every accessor only reaches rows up to it, so values from
+        the future can not leak into a signal.
+
+        :param data: {symbol: frame}, rows aligned with the backtest klines
+        :type data: dict[str, pl.DataFrame]
+        """
+        self.frames = data
+        self.columns = {}
+        for symbol, df in data.items():
+            self.columns[symbol] = {}
+            for name in df.columns:
+                values = df[name].to_numpy()
+                values.setflags(write=False)
+                self.columns[symbol][name] = values
+        self.rows = dict.fromkeys(data, -1)
+
+    def set_row(self, symbol: str, row: int):
+        if symbol in self.rows:
+            self.rows[symbol] = row
+
+    def get_row(self, symbol: str) -> int:
+        return self.rows[symbol]
+
+    def get(self, symbol: str, column: str, lag: int = 0):
+        """
+        :param symbol: symbol
+        :type symbol: str
+        :param column: precomputed column
+        :type column: str
+        :param lag: 0 for the current candle, 1 for the previous one and so on
+        :type lag: int
+        :returns: value, None before the first row
+        """
+        if lag < 0:
+            raise ValueError(f"Negative lag {lag} would read future rows")
+        row = self.rows[symbol] - lag
+        if row < 0:
+            return None
+        return self.columns[symbol][column][row]
+
+    def get_window(self, symbol: str, column: str, length: int) -> ndarray:
+        """
+        Read only view of the last `length` values up to the current row, shorter
+        at the start of the history
+        """
+        end = self.rows[symbol] + 1
+        return self.columns[symbol][column][max(end - length, 0) : end]
+
+    def get_frame(self, symbol: str) -> DataFrame:
+        """
+        All precomputed rows of a symbol up to the current one, zero copy
+        """
+        return self.frames[symbol].head(self.rows[symbol] + 1)
+
+
+def prepare_strategy(
+    strategy: Strategy, data: dict[str, DataFrame]
+) -> PrecomputedData | None:
+    """
+    Runs Strategy.prepare and attaches its output to the strategy
+
+    :returns: PrecomputedData for the engine to move forward, None if the strategy
+        precomputes nothing
+    """
+    prepared = strategy.prepare(data)
+    if prepared is None:
+        strategy.set_precomputed(None)
+        return None
+
+    for symbol, df in prepared.items():
+        if symbol not in data or df.height != data[symbol].height:
+            raise ValueError(
+                f"Prepared frame of {symbol} must keep the rows of the backtest data"
+            )
+    precomputed = PrecomputedData(prepared)
+    strategy.set_precomputed(precomputed)
+    return precomputed
@@ -1,4 +1,11 @@
-from abc import ABC, abstractmethod
+from abc import ABC
+from numpy import ndarray
+from polars import DataFrame
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from engine.core.buffers.candle_history import CandleHistory, MarketHistory
+    from engine.core.strategies.precomputed import PrecomputedData
 
 
 class Strategy(ABC):
@@ -6,13 +13,124 @@ class Strategy(ABC):
     Abstract base class for a single trading strategy.
     """
 
+    # candles of history per symbol kept by the engine in ring buffers, see
+    # get_history; no history is kept if None
+    history_capacity: int | None = None
+    # set by the engine before the candle loop, see prepare and history_capacity
+    precomputed: "PrecomputedData | None" = None
+    history: "MarketHistory | None" = None
+
+    def __new__(cls, *args, **kwargs):
+        # generate_order is not abstract since a strategy implements one of the two
+        # methods, check at instantiation what the abstract method used to, so
+        # intermediate base classes may still implement neither
+        if (
+            cls.generate_order is Strategy.generate_order
+            and cls.generate_orders is Strategy.generate_orders
+        ):
+            raise TypeError(
+                f"Can't instantiate {cls.__name__}, it implements neither "
+                "generate_order nor generate_orders"
+            )
+        return super().__new__(cls)
+
     def __init__(self):
         pass
 
-    @abstractmethod
-    def generate_order(self, market_data: dict):
+    def generate_order(self, symbol: str, new_series: DataFrame):
         """
         Should return an Order if the strategy wants to trade,
-        or None if no signal.
+        or None if no signal. Called once per symbol and candle.
+
+        A strategy implements either this method or generate_orders.
         """
-        pass
+        raise NotImplementedError(
+            f"{self.__class__.__name__} implements neither generate_order nor "
+            "generate_orders"
+        )
+
+    def generate_orders(
+        self, timestamp: int, candles: dict[str, ndarray]
+    ) -> DataFrame | None:
+        """
+        Batch API for cross-sectional strategies, called once per timestamp with the
+        candles of all symbols instead of generate_order per symbol.
+
+        :param timestamp: open time of the candles
+        :type timestamp: int
+        :param candles: aligned arrays, "symbol" plus every numeric kline column
+            ("open", "close", ...), one element per symbol with a candle
+        :type candles: dict[str, np.ndarray]
+        :returns: columnar block of orders with ORDER_HISTORY_SCHEMA (see
+            build_orders), None if no signal
+
+        A strategy implements either this method or generate_order, the engine
+        calls this one only if it is overridden (see uses_batch_orders).
+        """
+        raise NotImplementedError(
+            f"{self.__class__.__name__} implements generate_order, the engine calls "
+            "generate_orders only for strategies that override it"
+        )
+
+    def uses_batch_orders(self) -> bool:
+        return type(self).generate_orders is not Strategy.generate_orders
+
+    def prepare(self, data: dict[str, DataFrame]) -> dict[str, DataFrame] | None:
+        """
+        Optional hook called by the engine before the candle loop. A strategy may
+        compute its indicator columns here over the full frames, vectorized, and
+        return them; they are read during the loop with get_feature. The returned
+        frames must keep the rows of data.
+
+        :param data: {symbol: klines} of the whole backtest
+        :type data: dict[str, pl.DataFrame]
+        :returns: {symbol: frame with the indicator columns}, None if nothing to
+            precompute
+        """
+        return None
+
+    def set_precomputed(self, precomputed: "PrecomputedData | None"):
+        self.precomputed = precomputed
+
+    def get_feature(self, symbol: str, column: str, lag: int = 0):
+        """
+        Precomputed value at the current candle (or `lag` candles before it), the
+        engine never exposes later rows
+        """
+        if self.precomputed is None:
+            raise ValueError(
+                f"{self.__class__.__name__} has no precomputed data, prepare must "
+                "return frames and the strategy must run inside a backtest engine"
+            )
+        return self.precomputed.get(symbol, column, lag)
+
+    def set_history(self, history: "MarketHistory | None"):
+        self.history = history
+
+    def get_history(self, symbol: str) -> "CandleHistory":
+        """
+        Last history_capacity candles of a symbol up to the current one, windows
+        of it are zero copy views
+        """
+        if self.history is None:
+            raise ValueError(
+                f"{self.__class__.__name__} has no candle history, set "
+                "history_capacity and run the strategy inside a backtest engine"
+            )
+        return self.history.get_history(symbol)
+
+    def get_state(self) -> dict:
+        """
+        State saved into backtest checkpoints. By default every attribute except
+        the logger, the precomputed data and the candle history, which the engine
+        rebuilds, override if a strategy holds unpicklable objects.
+        """
+        return {
+            key: value
+            for key, value in vars(self).items()
+            if key not in ("logger", "precomputed", "history")
+        }
+
+    def set_state(self, state: dict):
+        """Restore a state returned by get_state."""
+        self.__dict__.update(state)
@@ -1,6 +1,6 @@
+from engine.core.strategies.indicators.momentum import RSI
 from engine.core.strategies.strategy import Strategy
-from polars import concat, DataFrame, Series
-from ta import momentum
+from polars import DataFrame
 from utils.global_variables.SCHEMAS import ORDER_HISTORY_SCHEMA
 from utils.logger.logger import LoggerWrapper
 
@@ -9,23 +9,32 @@ class RSIStrategy(Strategy):
     def __init__(self, rsi_period: int = 14, move: float = 0.05, log_level: int = 10):
         self.logger = LoggerWrapper(name="RSI Strategy Module", level=log_level)
 
-        self.candles_for_indicators = rsi_period
-        self.candles_for_signal = 1
-        self.data = {}
+        self.rsi_period = rsi_period
+        self.indicators = {}
         self.move = move
         self.strategy_name = "RSI Continuation Strategy"
 
-    def generate_order(self, symbol: str, new_series: Series):
-        self._update_data(symbol=symbol, new_series=new_series)
-        order = self._process_signal(symbol)
+    def generate_order(self, symbol: str, new_series: DataFrame):
+        last_rsi = self._update_rsi(symbol=symbol, close=new_series["close"][-1])
+        order = self._process_signal(symbol, new_series, last_rsi)
         return order
 
-    def _process_signal(self, symbol: str):
-        data = self.data[symbol].tail(self.candles_for_signal)
+    def warm_up(self, data: dict[str, DataFrame]):
+        """
+        Initialize the RSI of every symbol from candle history, e.g. before live
+        trading, instead of waiting rsi_period candles
+
+        :param data: {symbol: klines}
+        :type data: dict[str, pl.DataFrame]
+        """
+        for symbol, df in data.items():
+            self.indicators[symbol] = RSI(window=self.rsi_period)
+            self.indicators[symbol].initialize(df["close"].to_numpy())
+
+    def _process_signal(self, symbol: str, data: DataFrame, last_rsi: float | None):
         order = None
-        if "rsi" not in data.columns:
+        if last_rsi is None:
             return order
-        last_rsi = data["rsi"][-1]
         if last_rsi > 85.0:
             take_profit = data["close"] + data["close"] * self.move
             stop_loss = data["close"] - data["close"] * self.move
@@ -64,23 +73,7 @@ class RSIStrategy(Strategy):
 
         return order
 
-    def _update_data(self, symbol: str, new_series: Series):
-        if symbol not in self.data.keys():
-            new_df = DataFrame(new_series)
-            self.data.update({symbol: new_df})
-        else:
-            df = self.data[symbol]
-            df = df.tail(self.candles_for_signal + self.candles_for_indicators - 1)
-            if "rsi" in df.columns:
-                df = df.drop("rsi")
-            new_df = concat([df, new_series])
-            if new_df.height == self.candles_for_signal + self.candles_for_indicators:
-                new_df = self._calculate_rsi(symbol, new_df)
-            self.data.update({symbol: new_df})
-
-    def _calculate_rsi(self, symbol: str, df: DataFrame):
-        close_pd = df["close"].to_pandas()
-        rsi = momentum.RSIIndicator(
-            close=close_pd, window=self.candles_for_indicators
-        ).rsi()
-        return df.with_columns(Series("rsi", rsi.values))
+    def _update_rsi(self, symbol: str, close: float) -> float | None:
+        if symbol not in self.indicators:
+            self.indicators[symbol] = RSI(window=self.rsi_period)
+        return self.indicators[symbol].update(close)
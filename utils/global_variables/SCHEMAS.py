@@ -76,6 +76,9 @@ ORDER_HISTORY_SCHEMA = {
     "stop_loss": Float64,
 }
 
+# orders kept by the Portfolio, filled_volume is in the units of volume
+PORTFOLIO_ORDER_HISTORY_SCHEMA = ORDER_HISTORY_SCHEMA | {"filled_volume": Float64}
+
 POSITIONS_SCHEMA = {
     "order_id": Int64,
     "symbol": String,
@@ -89,4 +92,24 @@ POSITIONS_SCHEMA = {
     "realized_pnl": Float64,
     "take_profit": Float64,
     "stop_loss": Float64,
+    "liquidation_price": Float64,
+    "entry_fee": Float64,
+}
+
+ORDER_BOOK_SCHEMA = {
+    "timestamp": Int64,
+    "side": String,
+    "price": Float64,
+    "quantity": Float64,
+}
+
+FILL_SCHEMA = {
+    "order_id": Int64,
+    "symbol": String,
+    "status": String,
+    "fill_time": Int64,
+    "fill_price": Float64,
+    "filled_volume": Float64,
+    "liquidity": String,
+    "fee": Float64,
 }